@@ -0,0 +1,46 @@
+"""add composite indexes for keyset pagination
+
+The timestamp columns are Text and are indexed as such: their ISO 8601
+values sort like the dates they represent.
+
+Revision ID: 0109b5890910
+Revises: 58eb28405704
+Create Date: 2017-09-11 15:42:08.120374
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '0109b5890910'
+down_revision = '58eb28405704'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+indexes = [('task_run_project_id_id_idx', 'task_run', ['project_id', 'id']),
+           ('task_run_project_id_created_idx', 'task_run',
+            ['project_id', 'created', 'id']),
+           ('task_run_project_id_finish_time_idx', 'task_run',
+            ['project_id', 'finish_time', 'id']),
+           ('task_project_id_id_idx', 'task', ['project_id', 'id']),
+           ('task_project_id_created_idx', 'task',
+            ['project_id', 'created', 'id']),
+           ('task_project_id_priority_0_idx', 'task',
+            ['project_id', 'priority_0', 'id']),
+           ('result_project_id_id_idx', 'result', ['project_id', 'id'])]
+
+
+def upgrade():
+    # The indexes are built concurrently, so that task and task_run are not
+    # locked against writes while they are built. CREATE INDEX CONCURRENTLY
+    # cannot run inside a transaction block, so the one of the migration is
+    # committed first. If a build fails, the index is left INVALID and must
+    # be dropped before running the migration again.
+    op.execute('COMMIT')
+    for name, table, columns in indexes:
+        op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    for name, _, _ in indexes:
+        op.drop_index(name)
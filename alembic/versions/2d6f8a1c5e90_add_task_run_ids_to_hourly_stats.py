@@ -0,0 +1,27 @@
+"""add the recently counted task run ids to project_hourly_stats
+
+Revision ID: 2d6f8a1c5e90
+Revises: 5b7e9c2a4f13
+Create Date: 2017-09-22 09:41:12.215406
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2d6f8a1c5e90'
+down_revision = '5b7e9c2a4f13'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+
+
+def upgrade():
+    op.add_column('project_hourly_stats',
+                  sa.Column('task_run_ids', ARRAY(sa.Integer)))
+    # Stats counted without the ids could count some task runs twice, so
+    # they are rebuilt on their next update.
+    op.execute('DELETE FROM project_hourly_stats')
+
+
+def downgrade():
+    op.drop_column('project_hourly_stats', 'task_run_ids')
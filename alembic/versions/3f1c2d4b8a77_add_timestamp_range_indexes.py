@@ -0,0 +1,36 @@
+"""add indexes for time range stats queries
+
+Revision ID: 3f1c2d4b8a77
+Revises: 7c3b5a9d2e41
+Create Date: 2017-09-14 09:31:12.857301
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2d4b8a77'
+down_revision = '7c3b5a9d2e41'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+indexes = [('task_run_finish_time_idx', 'task_run', ['finish_time']),
+           ('task_created_idx', 'task', ['created'])]
+
+# Dashboard views that filter task and task_run by date. They are
+# recreated with the new range filters by the next dashboard jobs.
+views = ['dashboard_week_users', 'dashboard_week_anon',
+         'dashboard_week_new_task', 'dashboard_week_new_task_run',
+         'dashboard_week_returning_users']
+
+
+def upgrade():
+    for name, table, columns in indexes:
+        op.create_index(name, table, columns)
+    for view in views:
+        op.execute('DROP MATERIALIZED VIEW IF EXISTS %s' % view)
+
+
+def downgrade():
+    for name, _, _ in indexes:
+        op.drop_index(name)
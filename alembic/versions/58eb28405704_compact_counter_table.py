@@ -0,0 +1,48 @@
+"""compact counter table to a single row per task
+
+Revision ID: 58eb28405704
+Revises: b56c34fc4beb
+Create Date: 2017-09-04 10:12:31.402518
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '58eb28405704'
+down_revision = 'b56c34fc4beb'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Roll up the counter history into the oldest row of each task. Large
+    # installations can run `python cli.py compact_counters` beforehand so
+    # that this is a no-op.
+    op.execute('''
+               UPDATE counter SET n_task_runs = totals.n_task_runs
+               FROM (SELECT MIN(id) AS id, SUM(n_task_runs) AS n_task_runs
+                     FROM counter GROUP BY task_id HAVING COUNT(id) > 1)
+               AS totals
+               WHERE counter.id = totals.id;
+               ''')
+    op.execute('''
+               DELETE FROM counter USING
+               (SELECT task_id, MIN(id) AS id FROM counter
+                GROUP BY task_id HAVING COUNT(id) > 1) AS kept
+               WHERE counter.task_id = kept.task_id AND counter.id != kept.id;
+               ''')
+    # Counters are now updated in place, so every task needs one.
+    op.execute('''
+               INSERT INTO counter (created, project_id, task_id, n_task_runs)
+               SELECT NOW() AT TIME ZONE 'utc', task.project_id, task.id,
+               COUNT(task_run.id)
+               FROM task LEFT JOIN task_run ON (task.id = task_run.task_id)
+               WHERE NOT EXISTS
+               (SELECT 1 FROM counter WHERE counter.task_id = task.id)
+               GROUP BY task.id;
+               ''')
+    op.create_unique_constraint('counter_task_id_key', 'counter', ['task_id'])
+
+
+def downgrade():
+    op.drop_constraint('counter_task_id_key', 'counter', type_='unique')
@@ -0,0 +1,32 @@
+"""recreate dashboard views with unique indexes
+
+Revision ID: 5b7e9c2a4f13
+Revises: 8e1f6b3c9d52
+Create Date: 2017-09-19 10:22:37.604118
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5b7e9c2a4f13'
+down_revision = '8e1f6b3c9d52'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# Dashboard views without the unique index needed to refresh them
+# concurrently. They are recreated with it by the next dashboard jobs.
+views = ['dashboard_week_users', 'dashboard_week_anon',
+         'dashboard_week_project_draft', 'dashboard_week_project_published',
+         'dashboard_week_project_update', 'dashboard_week_new_task',
+         'dashboard_week_new_task_run', 'dashboard_week_new_users',
+         'dashboard_week_returning_users']
+
+
+def upgrade():
+    for view in views:
+        op.execute('DROP MATERIALIZED VIEW IF EXISTS %s' % view)
+
+
+def downgrade():
+    pass
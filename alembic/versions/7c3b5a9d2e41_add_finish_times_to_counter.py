@@ -0,0 +1,27 @@
+"""add first and last finish times to counter
+
+Revision ID: 7c3b5a9d2e41
+Revises: 0109b5890910
+Create Date: 2017-09-13 11:20:45.603118
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7c3b5a9d2e41'
+down_revision = '0109b5890910'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # The new columns are filled in project by project with
+    # `python cli.py backfill_counters`, which can run while the server is
+    # up.
+    op.add_column('counter', sa.Column('first_finish_time', sa.Text))
+    op.add_column('counter', sa.Column('last_finish_time', sa.Text))
+
+
+def downgrade():
+    op.drop_column('counter', 'last_finish_time')
+    op.drop_column('counter', 'first_finish_time')
@@ -0,0 +1,24 @@
+"""drop users_rank materialized view
+
+Revision ID: 8e1f6b3c9d52
+Revises: d4e8a2c61b09
+Create Date: 2017-09-18 11:05:43.219853
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8e1f6b3c9d52'
+down_revision = 'd4e8a2c61b09'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # The leaderboard is kept in Redis sorted sets
+    op.execute('DROP MATERIALIZED VIEW IF EXISTS users_rank')
+
+
+def downgrade():
+    # The leaderboard job of the previous version recreates the view
+    pass
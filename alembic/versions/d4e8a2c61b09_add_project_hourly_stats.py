@@ -0,0 +1,39 @@
+"""add project hourly stats table
+
+Revision ID: d4e8a2c61b09
+Revises: 3f1c2d4b8a77
+Create Date: 2017-09-15 12:04:51.229716
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd4e8a2c61b09'
+down_revision = '3f1c2d4b8a77'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSON
+
+
+def upgrade():
+    op.create_table(
+        'project_hourly_stats',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('project_id', sa.Integer,
+                  sa.ForeignKey('project.id', ondelete='CASCADE'),
+                  nullable=False),
+        sa.Column('hour', sa.Text, nullable=False),
+        sa.Column('n_anon', sa.Integer, nullable=False, default=0),
+        sa.Column('n_auth', sa.Integer, nullable=False, default=0),
+        sa.Column('anon_users', JSON),
+        sa.Column('auth_users', JSON),
+        sa.Column('last_task_run_id', sa.Integer, nullable=False, default=0),
+        sa.UniqueConstraint('project_id', 'hour'))
+    # Completed tasks per day are read from the task counters.
+    op.create_index('counter_project_id_last_finish_time_idx', 'counter',
+                    ['project_id', 'last_finish_time'])
+
+
+def downgrade():
+    op.drop_index('counter_project_id_last_finish_time_idx')
+    op.drop_table('project_hourly_stats')
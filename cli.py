@@ -629,15 +629,120 @@ def update_counters():
 
     for project in projects:
         print "Working on project: %s" % project.id
-        sql = text('''select task.project_id as project_id, task.id as task_id, count(task_run.task_id) as n_task_runs from task left outer join task_run on (task_run.task_id=task.id) where task.project_id=:project_id group by task.project_id, task.id, task_run.task_id''')
+        sql = text('''select task.project_id as project_id, task.id as task_id, count(task_run.task_id) as n_task_runs, min(task_run.finish_time) as first_finish_time, max(task_run.finish_time) as last_finish_time from task left outer join task_run on (task_run.task_id=task.id) where task.project_id=:project_id group by task.project_id, task.id''')
         results = db.engine.execute(sql, project_id=project.id)
         for result in results:
             db.session.add(Counter(project_id=result.project_id,
                                    task_id=result.task_id,
-                                   n_task_runs=result.n_task_runs))
+                                   n_task_runs=result.n_task_runs,
+                                   first_finish_time=result.first_finish_time,
+                                   last_finish_time=result.last_finish_time))
         db.session.commit()
 
 
+def compact_counters():
+    """Rolls up the counters history into a single counter per task."""
+    from pybossa.core import db
+    from sqlalchemy import inspect as inspect_db
+
+    update = text('''
+                  UPDATE counter SET n_task_runs = totals.n_task_runs
+                  FROM (SELECT MIN(id) AS id, SUM(n_task_runs) AS n_task_runs
+                        FROM counter WHERE project_id=:project_id
+                        GROUP BY task_id HAVING COUNT(id) > 1) AS totals
+                  WHERE counter.id = totals.id''')
+    delete = text('''
+                  DELETE FROM counter USING
+                  (SELECT task_id, MIN(id) AS id FROM counter
+                   WHERE project_id=:project_id
+                   GROUP BY task_id HAVING COUNT(id) > 1) AS kept
+                  WHERE counter.task_id = kept.task_id
+                  AND counter.id != kept.id''')
+    # This can run before the upgrade, when counter has no finish time
+    # columns yet, or after it.
+    insert_with_finish_times = text('''
+                  INSERT INTO counter (created, project_id, task_id,
+                                       n_task_runs, first_finish_time,
+                                       last_finish_time)
+                  SELECT NOW() AT TIME ZONE 'utc', task.project_id, task.id,
+                  COUNT(task_run.id), MIN(task_run.finish_time),
+                  MAX(task_run.finish_time)
+                  FROM task LEFT JOIN task_run ON (task.id = task_run.task_id)
+                  WHERE task.project_id=:project_id AND NOT EXISTS
+                  (SELECT 1 FROM counter WHERE counter.task_id = task.id)
+                  GROUP BY task.id''')
+    insert_counts_only = text('''
+                  INSERT INTO counter (created, project_id, task_id,
+                                       n_task_runs)
+                  SELECT NOW() AT TIME ZONE 'utc', task.project_id, task.id,
+                  COUNT(task_run.id)
+                  FROM task LEFT JOIN task_run ON (task.id = task_run.task_id)
+                  WHERE task.project_id=:project_id AND NOT EXISTS
+                  (SELECT 1 FROM counter WHERE counter.task_id = task.id)
+                  GROUP BY task.id''')
+
+    with app.app_context():
+        project_ids = [row.id for row in
+                       db.session.execute('select id from project order by id')]
+        columns = [column['name'] for column in
+                   inspect_db(db.engine).get_columns('counter')]
+        if 'last_finish_time' in columns:
+            insert = insert_with_finish_times
+        else:
+            insert = insert_counts_only
+        print "Compacting counters of %s projects" % len(project_ids)
+        for project_id in project_ids:
+            params = dict(project_id=project_id)
+            db.session.execute(update, params)
+            removed = db.session.execute(delete, params).rowcount
+            added = db.session.execute(insert, params).rowcount
+            db.session.commit()
+            if removed or added:
+                print ("Project %s: %s counter rows removed, %s added"
+                       % (project_id, removed, added))
+
+
+
+def backfill_counters():
+    """Recomputes the task run count and finish times of every counter."""
+    from pybossa.core import db
+
+    update = text('''
+                  UPDATE counter SET n_task_runs = coalesce(totals.n, 0),
+                  first_finish_time = totals.first_finish_time,
+                  last_finish_time = totals.last_finish_time
+                  FROM counter AS c LEFT JOIN
+                  (SELECT task_id, COUNT(id) AS n,
+                   MIN(finish_time) AS first_finish_time,
+                   MAX(finish_time) AS last_finish_time
+                   FROM task_run WHERE project_id=:project_id
+                   GROUP BY task_id) AS totals
+                  ON (c.task_id = totals.task_id)
+                  WHERE c.project_id=:project_id AND counter.id = c.id''')
+
+    with app.app_context():
+        project_ids = [row.id for row in
+                       db.session.execute('select id from project order by id')]
+        print "Backfilling counters of %s projects" % len(project_ids)
+        for project_id in project_ids:
+            updated = db.session.execute(
+                update, dict(project_id=project_id)).rowcount
+            db.session.commit()
+            print "Project %s: %s counters updated" % (project_id, updated)
+
+
+def warm_cache(processes=None):
+    """Warms the cache of the most visited pages."""
+    from pybossa.cache.warm import warm_cache as warm
+    from pybossa.util import with_cache_disabled
+
+    if processes is not None:
+        processes = int(processes)
+    with app.app_context():
+        phases = with_cache_disabled(warm)(processes)
+        print "Cache warmed in %.2f seconds" % sum(
+            phase['seconds'] for phase in phases.values())
+
 ## ==================================================
 ## Misc stuff for setting up a command line interface
 
@@ -121,6 +121,26 @@ register_api(CompletedTaskRunAPI, 'api_completedtaskrun', '/completedtaskrun', p
 register_api(ProjectCoownerAPI, 'api_projectcoowner', '/projectcoowner', pk='oid', pk_type='int')
 
 
+def _bulk_size():
+    """Return the number of task runs posted in bulk, at least 1."""
+    try:
+        data = json.loads(request.form.get('request_json') or request.data)
+    except ValueError:
+        return 1
+    if not isinstance(data, list):
+        return 1
+    return max(min(len(data), TaskRunAPI.MAX_BULK_SIZE), 1)
+
+
+@csrf.exempt
+@blueprint.route('/taskrun/bulk', methods=['POST'])
+@ratelimit(limit=ratelimits.get('LIMIT'), per=ratelimits.get('PER'),
+           hits_func=_bulk_size)
+def bulk_taskrun():
+    """Save a list of task runs at once."""
+    return TaskRunAPI().post_bulk()
+
+
 @jsonpify
 @blueprint.route('/project/<project_id>/newtask')
 @ratelimit(limit=ratelimits.get('LIMIT'), per=ratelimits.get('PER'))
@@ -136,15 +156,7 @@ def new_task(project_id):
         # If there is a task for the user, return it
         if tasks is not None:
             guard = ContributionsGuard(sentinel.master, timeout=timeout)
-            for task in tasks:
-                guard.stamp(task, get_user_id_or_ip())
-                if not guard.check_task_presented_timestamp(task, get_user_id_or_ip()):
-                    guard.stamp_presented_time(task, get_user_id_or_ip())
-                else:
-                    # user returning back for the same task
-                    # original presented time has not expired yet
-                    # to continue original presented time, extend expiry
-                    guard.extend_task_presented_timestamp_expiry(task, get_user_id_or_ip())
+            guard.stamp_tasks(tasks, get_user_id_or_ip())
 
             data = [task.dictize() for task in tasks]
             if len(data) == 0:
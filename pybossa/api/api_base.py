@@ -27,14 +27,16 @@ This package adds GET, POST, PUT and DELETE methods for any class:
 
 """
 import json
+import base64
 from flask import request, abort, Response, current_app
 from flask.ext.login import current_user
 from flask.views import MethodView
-from werkzeug.exceptions import NotFound, Unauthorized, Forbidden
+from werkzeug.exceptions import NotFound, BadRequest
+from werkzeug.urls import url_encode
 from werkzeug.exceptions import MethodNotAllowed
 from pybossa.util import jsonpify, fuzzyboolean, get_avatar_url
 from pybossa.core import ratelimits, uploader
-from pybossa.auth import ensure_authorized_to
+from pybossa.auth import ensure_authorized_to, filter_authorized
 from pybossa.hateoas import Hateoas
 from pybossa.ratelimit import ratelimit
 from pybossa.error import ErrorStatus
@@ -85,6 +87,10 @@ class APIBase(MethodView):
 
     allowed_classes_upload = ['blogpost', 'helpingmaterial']
 
+    def __init__(self):
+        super(APIBase, self).__init__()
+        self._related = None
+
     def valid_args(self):
         """Check if the domain object args are valid."""
         for k in request.args.keys():
@@ -112,7 +118,10 @@ class APIBase(MethodView):
             ensure_authorized_to('read', self.__class__)
             query = self._db_query(oid)
             json_response = self._create_json_response(query, oid)
-            return Response(json_response, mimetype='application/json')
+            response = Response(json_response, mimetype='application/json')
+            if oid is None:
+                self._add_next_link(response, query)
+            return response
         except Exception as e:
             return error.format_exception(
                 e,
@@ -123,30 +132,33 @@ class APIBase(MethodView):
         if len(query_result) == 1 and query_result[0] is None:
             raise abort(404)
         items = []
+        self._related = None
+        if request.args.get('related'):
+            self._related = self._load_related(query_result)
+        rows = []
         for result in query_result:
             # This is for n_favs orderby case
             if not isinstance(result, DomainObject):
                 result = result[0]
-            try:
-                if (result.__class__ != self.__class__):
-                    (item, headline, rank) = result
-                else:
-                    item = result
-                    headline = None
-                    rank = None
-                datum = self._create_dict_from_model(item)
-                if headline:
-                    datum['headline'] = headline
-                if rank:
-                    datum['rank'] = rank
-                ensure_authorized_to('read', item)
-                items.append(datum)
-            except (Forbidden, Unauthorized):
-                # Remove last added item, as it is 401 or 403
-                if len(items) > 0:
-                    items.pop()
-            except Exception:  # pragma: no cover
-                raise
+            if (result.__class__ != self.__class__):
+                (item, headline, rank) = result
+            else:
+                item = result
+                headline = None
+                rank = None
+            rows.append((item, headline, rank))
+        authorized = filter_authorized(current_user, 'read',
+                                       [row[0] for row in rows])
+        authorized = set(id(obj) for obj in authorized)
+        for item, headline, rank in rows:
+            if id(item) not in authorized:
+                continue
+            datum = self._create_dict_from_model(item)
+            if headline:
+                datum['headline'] = headline
+            if rank:
+                datum['rank'] = rank
+            items.append(datum)
         if oid is not None:
             ensure_authorized_to('read', query_result[0])
             items = items[0]
@@ -155,38 +167,56 @@ class APIBase(MethodView):
     def _create_dict_from_model(self, model):
         return self._select_attributes(self._add_hateoas_links(model))
 
+    def _load_related(self, query_result):
+        """Return the task runs, tasks and last results related to a page of
+        items, fetched with a query for each kind, by task id."""
+        related = dict(task_runs={}, tasks={}, results={})
+        cls = self.__class__.__name__
+        if cls not in ('Task', 'TaskRun', 'Result'):
+            return related
+        task_ids = set()
+        for result in query_result:
+            if result is None:
+                continue
+            if not isinstance(result, DomainObject):
+                result = result[0]
+            task_ids.add(result.id if cls == 'Task' else result.task_id)
+        task_ids = list(task_ids)
+        if cls in ('Task', 'Result'):
+            for task_run in task_repo.get_task_runs_of_tasks(task_ids):
+                related['task_runs'].setdefault(task_run.task_id,
+                                                []).append(task_run)
+        if cls in ('TaskRun', 'Result'):
+            for task in task_repo.get_tasks(task_ids):
+                related['tasks'][task.id] = task
+        if cls in ('Task', 'TaskRun'):
+            for result in result_repo.get_last_versions(task_ids):
+                related['results'][result.task_id] = result
+        return related
+
     def _add_hateoas_links(self, item):
         obj = item.dictize()
         related = request.args.get('related')
         if related:
+            related = self._related or self._load_related([item])
             if item.__class__.__name__ == 'Task':
-                obj['task_runs'] = []
-                obj['result'] = None
-                task_runs = task_repo.filter_task_runs_by(task_id=item.id)
-                results = result_repo.filter_by(task_id=item.id, last_version=True)
-                for tr in task_runs:
-                    obj['task_runs'].append(tr.dictize())
-                for r in results:
-                    obj['result'] = r.dictize()
+                task_runs = related['task_runs'].get(item.id, [])
+                result = related['results'].get(item.id)
+                obj['task_runs'] = [tr.dictize() for tr in task_runs]
+                obj['result'] = result.dictize() if result else None
 
             if item.__class__.__name__ == 'TaskRun':
-                tasks = task_repo.filter_tasks_by(id=item.task_id)
-                results = result_repo.filter_by(task_id=item.task_id, last_version=True)
-                obj['task'] = None
-                obj['result'] = None
-                for t in tasks:
-                    obj['task'] = t.dictize()
-                for r in results:
-                    obj['result'] = r.dictize()
+                task = related['tasks'].get(item.task_id)
+                result = related['results'].get(item.task_id)
+                obj['task'] = task.dictize() if task else None
+                obj['result'] = result.dictize() if result else None
 
             if item.__class__.__name__ == 'Result':
-                tasks = task_repo.filter_tasks_by(id=item.task_id)
-                task_runs = task_repo.filter_task_runs_by(task_id=item.task_id)
-                obj['task_runs'] = []
-                for t in tasks:
-                    obj['task'] = t.dictize()
-                for tr in task_runs:
-                    obj['task_runs'].append(tr.dictize())
+                task = related['tasks'].get(item.task_id)
+                task_runs = related['task_runs'].get(item.task_id, [])
+                if task:
+                    obj['task'] = task.dictize()
+                obj['task_runs'] = [tr.dictize() for tr in task_runs]
 
         links, link = self.hateoas.create_links(item)
         if links:
@@ -218,7 +248,8 @@ class APIBase(MethodView):
         filters = {}
         for k in request.args.keys():
             if k not in ['limit', 'offset', 'api_key', 'last_id', 'all',
-                         'fulltextsearch', 'desc', 'orderby', 'related']:
+                         'fulltextsearch', 'desc', 'orderby', 'related',
+                         'cursor']:
                 # Raise an error if the k arg is not a column
                 getattr(self.__class__, k)
                 filters[k] = request.args[k]
@@ -230,7 +261,15 @@ class APIBase(MethodView):
         fulltextsearch = request.args.get('fulltextsearch')
         desc = request.args.get('desc') if request.args.get('desc') else False
         desc = fuzzyboolean(desc)
-        if last_id:
+        cursor = request.args.get('cursor')
+        if cursor:
+            cursor = self._decode_cursor(cursor, orderby, desc)
+            results = getattr(repo, query_func)(limit=limit, cursor=cursor,
+                                                fulltextsearch=fulltextsearch,
+                                                desc=desc,
+                                                orderby=orderby,
+                                                **filters)
+        elif last_id:
             results = getattr(repo, query_func)(limit=limit, last_id=last_id,
                                                 fulltextsearch=fulltextsearch,
                                                 desc=False,
@@ -244,6 +283,50 @@ class APIBase(MethodView):
                                                 **filters)
         return results
 
+    def _supports_cursor(self, orderby):
+        return (orderby != 'fav_user_ids' and
+                not request.args.get('fulltextsearch') and
+                hasattr(self.__class__, 'id'))
+
+    def _decode_cursor(self, cursor, orderby, desc):
+        """Return the (orderby value, id) pair of the last item of the
+        previous page, encoded in the cursor."""
+        try:
+            data = json.loads(base64.urlsafe_b64decode(str(cursor)))
+            cursor_orderby, cursor_desc, value, oid = data
+        except (TypeError, ValueError):
+            raise BadRequest('Invalid cursor')
+        if (not self._supports_cursor(orderby) or
+                (cursor_orderby, cursor_desc) != (orderby, desc)):
+            raise BadRequest('Cursor does not match the orderby and desc '
+                             'arguments')
+        return value, oid
+
+    def _add_next_link(self, response, results):
+        """Add a Link header with the cursor of the next page, if the
+        current one is full."""
+        limit, _, orderby = self._set_limit_and_offset()
+        if not results or len(results) < limit:
+            return
+        if not self._supports_cursor(orderby):
+            return
+        item = results[-1]
+        if not isinstance(item, DomainObject):
+            return
+        value = getattr(item, orderby)
+        if (value is not None and
+                not isinstance(value, (basestring, int, long, float))):
+            return
+        desc = fuzzyboolean(request.args.get('desc') or False)
+        cursor = base64.urlsafe_b64encode(
+            json.dumps([orderby, desc, value, item.id]))
+        args = request.args.copy()
+        for arg in ['offset', 'last_id', 'api_key']:
+            args.pop(arg, None)
+        args['cursor'] = cursor
+        response.headers['Link'] = '<%s?%s>; rel="next"' % (
+            request.base_url, url_encode(args))
+
     def _set_limit_and_offset(self):
         try:
             limit = min(100, int(request.args.get('limit')))
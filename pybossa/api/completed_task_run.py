@@ -27,7 +27,7 @@ from flask.ext.login import current_user
 from api_base import APIBase
 from pybossa.auth import ensure_authorized_to
 from pybossa.model.task_run import TaskRun
-from pybossa.core import user_repo
+from pybossa.cache import users as cached_users
 from pybossa.error import ErrorStatus
 from pybossa.core import task_repo
 from werkzeug.exceptions import BadRequest, MethodNotAllowed
@@ -58,8 +58,8 @@ class CompletedTaskRunAPI(APIBase):
             # check admin access
             if 'api_key' in request.args.keys():
                 apikey = request.args['api_key']
-                user = user_repo.get_by(api_key=apikey)
-                if not user or user.admin is False:
+                user = cached_users.get_api_key_owner(apikey)
+                if not user or user['admin'] is False:
                     raise BadRequest("Insufficient privilege to the request")
             else:
                 raise BadRequest("Insufficient privilege to the request")
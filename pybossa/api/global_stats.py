@@ -53,6 +53,7 @@ class GlobalStatsAPI(APIBase):
                     n_task_runs=stats.n_task_runs_site(),
                     n_pending_tasks=n_pending_tasks,
                     n_results=stats.n_results_site(),
+                    n_active_users=stats.n_active_users_24_hours(),
                     categories=[])
         # Add Categories
         categories = cached_categories.get_used()
@@ -29,15 +29,18 @@ from flask.ext.login import current_user
 from pybossa.model.task_run import TaskRun
 from werkzeug.exceptions import Forbidden, BadRequest
 
-from api_base import APIBase
+from api_base import APIBase, error
 from pybossa.util import get_user_id_or_ip
 from pybossa.core import task_repo, sentinel
+from pybossa.auth import ensure_authorized_to
 from pybossa.uploader.s3_uploader import s3_upload_from_string
 from pybossa.uploader.s3_uploader import s3_upload_file_storage
 from pybossa.contributions_guard import ContributionsGuard
 from pybossa.auth import jwt_authorize_project
 from datetime import datetime
 from pybossa.sched import can_post, after_save
+from pybossa.sched import (get_project_scheduler_and_timeout, has_locks,
+                           release_locks, Schedulers)
 
 from pybossa.model.completion_event import mark_if_complete
 
@@ -51,6 +54,7 @@ class TaskRunAPI(APIBase):
 
     __class__ = TaskRun
     reserved_keys = set(['id', 'created', 'finish_time'])
+    MAX_BULK_SIZE = 500
 
     def _preprocess_post_data(self, data):
         task_id = data['task_id']
@@ -116,12 +120,16 @@ class TaskRunAPI(APIBase):
         mark_if_complete(instance.task_id, instance.project_id)
 
     def _add_timestamps(self, taskrun, task, guard):
+        presented = guard.retrieve_presented_timestamp(task, get_user_id_or_ip())
+        self._set_timestamps(taskrun, presented)
+
+    def _set_timestamps(self, taskrun, presented):
         finish_time = datetime.utcnow().isoformat()
 
         # /cachePresentedTime API only caches when there is a user_id
         # otherwise it returns an arbitrary valid timestamp so that answer can be submitted
-        if guard.retrieve_presented_timestamp(task, get_user_id_or_ip()):
-            created = self._validate_datetime(guard.retrieve_presented_timestamp(task, get_user_id_or_ip()))
+        if presented:
+            created = self._validate_datetime(presented)
         else:
             created = datetime.strptime(self.DEFAULT_DATETIME, self.DATETIME_FORMAT).isoformat()
 
@@ -135,6 +143,139 @@ class TaskRunAPI(APIBase):
             taskrun.created = created.isoformat()
             taskrun.finish_time = finish_time
 
+    def post_bulk(self):
+        """Save a list of task runs within a single transaction.
+
+        Each task run is checked as in a POST of a single one. Returns the
+        status of each of them, in the order they were posted.
+        """
+        try:
+            self.valid_args()
+            data = self._parse_request_data()
+            if not isinstance(data, list) or len(data) > self.MAX_BULK_SIZE:
+                raise BadRequest("Payload must be a list of at most %s "
+                                 "task runs" % self.MAX_BULK_SIZE)
+            statuses = [None] * len(data)
+            items = []
+            for index, item in enumerate(data):
+                try:
+                    self._forbidden_attributes(item)
+                    item = self.hateoas.remove_links(item)
+                    items.append((index, TaskRun(**item)))
+                except Exception as e:
+                    statuses[index] = self._bulk_error(e)
+            items = self._validate_bulk(items, statuses)
+            task_runs = [task_run for _, task_run, _ in items]
+            task_repo.save_task_runs(task_runs)
+            task_repo.after_save_task_runs(task_runs)
+            self._after_save_bulk(items)
+            for index, task_run, _ in items:
+                statuses[index] = dict(status='ok', id=task_run.id,
+                                       task_id=task_run.task_id)
+            return Response(json.dumps(statuses), mimetype='application/json')
+        except Exception as e:
+            return error.format_exception(e, target='taskrun', action='POST')
+
+    def _validate_bulk(self, items, statuses):
+        """Return the (index, task run, task) of the valid items, setting
+        the status of the others.
+        """
+        tasks = task_repo.get_tasks(list(set(task_run.task_id
+                                             for _, task_run in items)))
+        tasks = dict((task.id, task) for task in tasks)
+        user_ip = None
+        for _, task_run in items:
+            self._add_user_info(task_run)
+            user_ip = task_run.user_ip
+        answered = task_repo.get_answered_tasks(tasks.keys(), self._user_id(),
+                                                user_ip)
+        authorized = set()
+        valid = []
+        seen = set()
+        for index, task_run in items:
+            try:
+                task = tasks.get(task_run.task_id)
+                self._validate_project_and_task(task_run, task)
+                if task.id in seen:
+                    raise Forbidden('You must request a task first!')
+                seen.add(task.id)
+                # The user can only be authorized to create task runs per
+                # project: the task runs already posted are checked at once.
+                if task_run.project_id not in authorized:
+                    ensure_authorized_to('create', task_run)
+                    authorized.add(task_run.project_id)
+                elif (task.id, task_run.external_uid) in answered:
+                    raise Forbidden()
+                self._validate_instance(task_run)
+                valid.append((index, task_run, task))
+            except Exception as e:
+                statuses[index] = self._bulk_error(e)
+
+        valid = self._filter_locked(valid, statuses)
+        guard = ContributionsGuard(sentinel.master)
+        user = get_user_id_or_ip()
+        stamps = guard.retrieve_timestamps([valid_task for _, _, valid_task
+                                            in valid], user)
+        checked = []
+        for item, (requested, presented) in zip(valid, stamps):
+            index, task_run, task = item
+            try:
+                if requested is None:
+                    raise Forbidden('You must request a task first!')
+                self._set_timestamps(task_run, presented)
+                path = "{0}/{1}/{2}".format(task_run.project_id,
+                                            task_run.task_id,
+                                            task_run.user_id)
+                _upload_files_from_json(task_run.info, path)
+                checked.append(item)
+            except Exception as e:
+                statuses[index] = self._bulk_error(e)
+        return checked
+
+    def _filter_locked(self, items, statuses):
+        """Check the locks of the items of projects using a locked scheduler,
+        with a single round trip per project.
+        """
+        self._bulk_locks = {}
+        by_project = {}
+        for item in items:
+            by_project.setdefault(item[1].project_id, []).append(item)
+        valid = []
+        for project_id, project_items in by_project.iteritems():
+            scheduler, timeout = get_project_scheduler_and_timeout(project_id)
+            if scheduler not in (Schedulers.locked, Schedulers.user_pref):
+                valid.extend(project_items)
+                continue
+            task_ids = [task.id for _, _, task in project_items]
+            locks = has_locks(project_id, task_ids, self._user_id(), timeout)
+            for item, locked in zip(project_items, locks):
+                if locked:
+                    valid.append(item)
+                else:
+                    e = Forbidden("You must request a task first!")
+                    statuses[item[0]] = self._bulk_error(e)
+            self._bulk_locks[project_id] = timeout
+        return sorted(valid, key=lambda item: item[0])
+
+    def _after_save_bulk(self, items):
+        """Release the locks of the tasks answered."""
+        for project_id, timeout in self._bulk_locks.iteritems():
+            task_ids = [task_run.task_id for _, task_run, _ in items
+                        if task_run.project_id == project_id]
+            if task_ids:
+                release_locks(project_id, task_ids, self._user_id(), timeout)
+
+    def _user_id(self):
+        return None if current_user.is_anonymous() else current_user.id
+
+    def _bulk_error(self, e):
+        exception_cls = e.__class__.__name__
+        message = getattr(e, 'description', None) or str(e)
+        return dict(status="failed",
+                    status_code=error.error_status.get(exception_cls, 500),
+                    exception_cls=exception_cls,
+                    exception_msg=message)
+
     def _validate_datetime(self, timestamp):
         try:
             timestamp = datetime.strptime(timestamp, self.DATETIME_FORMAT)
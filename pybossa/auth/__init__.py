@@ -17,7 +17,7 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
 import inspect
-from flask import abort
+from flask import abort, _request_ctx_stack
 from flask.ext.login import current_user
 from pybossa.core import announcement_repo, task_repo, project_repo, result_repo
 from pybossa.core import projectcoowner_repo
@@ -26,6 +26,7 @@ from pybossa.auth.errcodes import *
 import jwt
 from flask import jsonify
 from jwt import exceptions
+from werkzeug.exceptions import Forbidden, Unauthorized
 
 import project
 import task
@@ -70,16 +71,12 @@ _auth_classes = {'project': project.ProjectAuth,
                  'projectcoowner': project_coowner.ProjectCoownerAuth}
 
 
+_authorizers = {}
+
+
 def is_authorized(user, action, resource, **kwargs):
-    is_class = inspect.isclass(resource)
-    name = resource.__name__ if is_class else resource.__class__.__name__
-    if resource == 'token':
-        name = resource
-    resource = None if is_class else resource
-    auth = _authorizer_for(name.lower())
-    actions = _actions + auth.specific_actions
-    assert action in actions, "%s is not a valid action" % action
-    return auth.can(user, action, resource, **kwargs)
+    return _is_authorized(user, action, resource, _request_decisions(),
+                          **kwargs)
 
 
 def ensure_authorized_to(action, resource, **kwargs):
@@ -92,7 +89,69 @@ def ensure_authorized_to(action, resource, **kwargs):
     return authorized
 
 
+def filter_authorized(user, action, items):
+    """Return the items the user is authorized to perform the action on.
+
+    Decisions that only depend on the project of the items are taken once
+    per project. Items raising Unauthorized or Forbidden are left out too.
+    """
+    decisions = _request_decisions()
+    if decisions is None:
+        decisions = {}
+    authorized = []
+    for item in items:
+        try:
+            if _is_authorized(user, action, item, decisions) is not False:
+                authorized.append(item)
+        except (Forbidden, Unauthorized):
+            pass
+    return authorized
+
+
+def _is_authorized(user, action, resource, decisions, **kwargs):
+    is_class = inspect.isclass(resource)
+    name = resource.__name__ if is_class else resource.__class__.__name__
+    if resource == 'token':
+        name = resource
+    resource = None if is_class else resource
+    auth = _authorizer_for(name.lower())
+    actions = _actions + auth.specific_actions
+    assert action in actions, "%s is not a valid action" % action
+    key = _decision_key(auth, name, user, action, resource, kwargs)
+    if key is None or decisions is None:
+        return auth.can(user, action, resource, **kwargs)
+    if key not in decisions:
+        decisions[key] = auth.can(user, action, resource, **kwargs)
+    return decisions[key]
+
+
+def _decision_key(auth, name, user, action, resource, kwargs):
+    """Return the key of a decision that only depends on the user and the
+    project of the resource, as listed by the project_scoped_actions of
+    its authorizer, or None."""
+    if action not in getattr(auth, 'project_scoped_actions', ()):
+        return None
+    project_id = getattr(resource, 'project_id', None) or \
+        kwargs.get('project_id')
+    if project_id is None:
+        return None
+    user_id = None if user.is_anonymous() else user.id
+    return (name, action, user_id, project_id)
+
+
+def _request_decisions():
+    """Return the decisions taken during the current request, if any."""
+    ctx = _request_ctx_stack.top
+    if ctx is None:
+        return None
+    if not hasattr(ctx, 'authorization_decisions'):
+        ctx.authorization_decisions = {}
+    return ctx.authorization_decisions
+
+
 def _authorizer_for(resource_name):
+    if resource_name in _authorizers:
+        return _authorizers[resource_name]
     kwargs = {}
     if resource_name in ('project', 'taskrun'):
         kwargs.update({'task_repo': task_repo})
@@ -102,7 +161,8 @@ def _authorizer_for(resource_name):
         kwargs.update({'project_repo': project_repo})
     if resource_name in ('project', 'task', 'taskrun'):
         kwargs.update({'result_repo': result_repo})
-    return _auth_classes[resource_name](**kwargs)
+    _authorizers[resource_name] = _auth_classes[resource_name](**kwargs)
+    return _authorizers[resource_name]
 
 
 def handle_error(error):
@@ -20,6 +20,7 @@ from pybossa.core import is_coowner
 
 class BlogpostAuth(object):
     _specific_actions = []
+    project_scoped_actions = ['read']
 
     def __init__(self, project_repo):
         self.project_repo = project_repo
@@ -19,6 +19,7 @@
 
 class HelpingMaterialAuth(object):
     _specific_actions = []
+    project_scoped_actions = ['create', 'read', 'update', 'delete']
 
     def __init__(self, project_repo):
         self.project_repo = project_repo
@@ -20,6 +20,7 @@ from pybossa.core import is_coowner
 
 class ResultAuth(object):
     _specific_actions = []
+    project_scoped_actions = ['update']
 
     def __init__(self, project_repo):
         self.project_repo = project_repo
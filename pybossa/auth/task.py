@@ -22,6 +22,7 @@ from werkzeug.exceptions import NotFound
 
 class TaskAuth(object):
     _specific_actions = []
+    project_scoped_actions = ['create', 'update']
 
     def __init__(self, project_repo, result_repo):
         self.project_repo = project_repo
@@ -25,11 +25,24 @@ It exports:
     * delete_cached: to remove a cached value
     * delete_memoized: to remove a cached value from the memoize decorator
 
+Memoized values are registered in a tag set of their function, and of
+their group of essential arguments, so that they can be removed together
+without scanning the keyspace. Tag sets are sorted by the expiration time
+of the values, and the expired ones are pruned whenever a value is stored.
+
+Decorators called with local=True also keep the values in an in-process
+cache, see pybossa.cache.local_cache. It is disabled unless
+LOCAL_CACHE_SIZE is set.
+
 """
 import os
+import time
 import hashlib
+import threading
 from functools import wraps
 from pybossa.core import sentinel
+from pybossa.cache.local_cache import (LocalCache, InvalidationListener,
+                                       KEY_MESSAGE, PREFIX_MESSAGE)
 
 try:
     import cPickle as pickle
@@ -48,6 +61,11 @@ HALF_HOUR = 30 * 60
 FIVE_MINUTES = 5 * 60
 ONE_WEEK = 7 * ONE_DAY
 
+INVALIDATION_CHANNEL = '%s:invalidations' % settings.REDIS_KEYPREFIX
+
+_local = dict(pid=None, cache=None, listener=None)
+_local_lock = threading.Lock()
+
 
 def get_key_to_hash(*args, **kwargs):
     """Return key to hash for *args and **kwargs."""
@@ -68,11 +86,105 @@ def get_hash_key(prefix, key_to_hash):
     return key
 
 
-def cache(key_prefix, timeout=300):
+def get_tag_key(function, *essential_args, **essential_kwargs):
+    """
+    Return the key of the set tracking the memoized values of a function.
+
+    If essential arguments are given, return the key of the set tracking
+    only the values memoized for them.
+
+    """
+    key = "%s:%s_tags:" % (settings.REDIS_KEYPREFIX, function.__name__)
+    if essential_args or essential_kwargs:
+        key += get_key_to_hash(*essential_args, **essential_kwargs) + ":"
+    return key
+
+
+def _store(key, output, timeout, tags=()):
+    """Cache a value and register its key in the given tag sets, dropping
+    the keys already expired from them.
+
+    A tag set never expires before the values it tracks.
+    """
+    now = time.time()
+    pipeline = sentinel.master.pipeline(transaction=False)
+    pipeline.setex(key, timeout, pickle.dumps(output))
+    for tag in tags:
+        pipeline.zadd(tag, now + timeout, key)
+        pipeline.zremrangebyscore(tag, '-inf', now)
+        pipeline.expire(tag, timeout)
+    pipeline.execute()
+
+
+def get_local_cache():
+    """
+    Return the in-process cache of this worker.
+
+    Returns None if it is disabled or not yet listening to invalidations.
+
+    """
+    size = getattr(settings, 'LOCAL_CACHE_SIZE', 0)
+    if not size:
+        return None
+    if _local['pid'] != os.getpid():
+        with _local_lock:
+            if _local['pid'] != os.getpid():
+                timeout = getattr(settings, 'LOCAL_CACHE_TIMEOUT', 30)
+                local_cache = LocalCache(size, timeout)
+                listener = InvalidationListener(sentinel.master,
+                                                INVALIDATION_CHANNEL,
+                                                local_cache)
+                listener.start()
+                _local.update(pid=os.getpid(), cache=local_cache,
+                              listener=listener)
+    if not _local['listener'].subscribed:
+        return None
+    return _local['cache']
+
+
+def _get(key, timeout, local=False):
+    """Return the pickled value of key, from the local cache if possible."""
+    local_cache = get_local_cache() if local else None
+    if local_cache is None:
+        return sentinel.slave.get(key)
+    output = local_cache.get(key)
+    if output is None:
+        generation = local_cache.generation
+        output = sentinel.slave.get(key)
+        if output:
+            local_cache.set(key, output, timeout, generation)
+    return output
+
+
+def _invalidate_local(message):
+    """Drop values from the local cache of every worker."""
+    if getattr(settings, 'LOCAL_CACHE_SIZE', 0):
+        if _local['pid'] == os.getpid():
+            _local['cache'].invalidate(message)
+        sentinel.master.publish(INVALIDATION_CHANNEL, message)
+
+
+def _delete_tagged(tag):
+    """Delete all the values registered in a tag set.
+
+    Returns True if any value was deleted.
+    """
+    pipeline = sentinel.master.pipeline()
+    pipeline.zrange(tag, 0, -1)
+    pipeline.delete(tag)
+    keys = list(pipeline.execute()[0])
+    deleted = 0
+    for i in xrange(0, len(keys), 1000):
+        deleted += sentinel.master.delete(*keys[i:i + 1000])
+    return bool(deleted)
+
+
+def cache(key_prefix, timeout=300, local=False):
     """
     Decorator for caching functions.
 
-    Returns the function value from cache, or the function if cache disabled
+    Returns the function value from cache, or the function if cache disabled.
+    If local is True, the value is also kept in the in-process cache.
 
     """
     if timeout is None:
@@ -82,7 +194,7 @@ def cache(key_prefix, timeout=300):
         def wrapper(*args, **kwargs):
             key = "%s::%s" % (settings.REDIS_KEYPREFIX, key_prefix)
             if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
-                output = sentinel.slave.get(key)
+                output = _get(key, timeout, local)
                 if output:
                     return pickle.loads(output)
                 output = f(*args, **kwargs)
@@ -95,11 +207,12 @@ def cache(key_prefix, timeout=300):
     return decorator
 
 
-def memoize(timeout=300):
+def memoize(timeout=300, local=False):
     """
     Decorator for caching functions using its arguments as part of the key.
 
-    Returns the cached value, or the function if the cache is disabled
+    Returns the cached value, or the function if the cache is disabled.
+    If local is True, the value is also kept in the in-process cache.
 
     """
     if timeout is None:
@@ -110,16 +223,18 @@ def memoize(timeout=300):
             key = "%s:%s_args:" % (settings.REDIS_KEYPREFIX, f.__name__)
             key_to_hash = get_key_to_hash(*args, **kwargs)
             key = get_hash_key(key, key_to_hash)
+            tags = [get_tag_key(f)]
             if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
-                output = sentinel.slave.get(key)
+                output = _get(key, timeout, local)
                 if output:
                     return pickle.loads(output)
                 output = f(*args, **kwargs)
-                sentinel.master.setex(key, timeout, pickle.dumps(output))
+                _store(key, output, timeout, tags)
                 return output
             output = f(*args, **kwargs)
-            sentinel.master.setex(key, timeout, pickle.dumps(output))
+            _store(key, output, timeout, tags)
             return output
+        wrapper.timeout = timeout
         return wrapper
     return decorator
 
@@ -145,15 +260,16 @@ def memoize_essentials(timeout=300, essentials=None):
             key += get_key_to_hash(*essential_args) + ":"
             key_to_hash = get_key_to_hash(*args, **kwargs)
             key = get_hash_key(key, key_to_hash)
+            tags = [get_tag_key(f, *essential_args)]
             if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
                 output = sentinel.slave.get(key)
                 if output:
                     return pickle.loads(output)
                 output = f(*args, **kwargs)
-                sentinel.master.setex(key, timeout, pickle.dumps(output))
+                _store(key, output, timeout, tags)
                 return output
             output = f(*args, **kwargs)
-            sentinel.master.setex(key, timeout, pickle.dumps(output))
+            _store(key, output, timeout, tags)
             return output
         return wrapper
     return decorator
@@ -168,7 +284,9 @@ def delete_cached(key):
     """
     if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
         key = "%s::%s" % (settings.REDIS_KEYPREFIX, key)
-        return bool(sentinel.master.delete(key))
+        deleted = bool(sentinel.master.delete(key))
+        _invalidate_local(KEY_MESSAGE + key)
+        return deleted
     return True
 
 
@@ -184,14 +302,33 @@ def delete_memoized(function, *args, **kwargs):
         if args or kwargs:
             key_to_hash = get_key_to_hash(*args, **kwargs)
             key = get_hash_key(key, key_to_hash)
-            return bool(sentinel.master.delete(key))
-        keys_to_delete = sentinel.slave.keys(pattern=key + '*')
-        if not keys_to_delete:
-            return False
-        return bool(sentinel.master.delete(*keys_to_delete))
+            pipeline = sentinel.master.pipeline(transaction=False)
+            pipeline.delete(key)
+            pipeline.zrem(get_tag_key(function), key)
+            deleted = bool(pipeline.execute()[0])
+            _invalidate_local(KEY_MESSAGE + key)
+            return deleted
+        deleted = _delete_tagged(get_tag_key(function))
+        _invalidate_local(PREFIX_MESSAGE + key)
+        return deleted
     return True
 
 
+def set_memoized(function, output, *args, **kwargs):
+    """
+    Store the value of a memoized function for the given arguments.
+
+    Lets a value computed in bulk be cached as if the function had been
+    called with each set of arguments.
+
+    """
+    key = "%s:%s_args:" % (settings.REDIS_KEYPREFIX, function.__name__)
+    key_to_hash = get_key_to_hash(*args, **kwargs)
+    key = get_hash_key(key, key_to_hash)
+    _store(key, output, function.timeout, [get_tag_key(function)])
+    _invalidate_local(KEY_MESSAGE + key)
+
+
 def delete_memoized_essential(function, *args, **kwargs):
     """
     Use the essential arguments list to delete all matching memoized values from the cache.
@@ -200,11 +337,5 @@ def delete_memoized_essential(function, *args, **kwargs):
 
     """
     if os.environ.get('PYBOSSA_REDIS_CACHE_DISABLED') is None:
-        key = "%s:%s_args:" % (settings.REDIS_KEYPREFIX, function.__name__)
-        if args or kwargs:
-            key += get_key_to_hash(*args, **kwargs)
-        keys_to_delete = sentinel.slave.keys(pattern=key + '*')
-        if not keys_to_delete:
-            return False
-        return bool(sentinel.master.delete(*keys_to_delete))
+        return _delete_tagged(get_tag_key(function, *args, **kwargs))
     return True
\ No newline at end of file
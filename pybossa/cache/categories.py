@@ -25,7 +25,7 @@ import pybossa.model as model
 session = db.slave_session
 
 @cache(key_prefix="categories_all",
-       timeout=timeouts.get('CATEGORY_TIMEOUT'))
+       timeout=timeouts.get('CATEGORY_TIMEOUT'), local=True)
 def get_all():
     """Return all categories"""
     data = session.query(model.category.Category).all()
@@ -33,7 +33,7 @@ def get_all():
 
 
 @cache(key_prefix="categories_used",
-       timeout=timeouts.get('CATEGORY_TIMEOUT'))
+       timeout=timeouts.get('CATEGORY_TIMEOUT'), local=True)
 def get_used():
     """Return categories only used by projects"""
     sql = text('''
@@ -0,0 +1,139 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""
+In-process cache sitting in front of the Redis cache.
+
+Every worker keeps a small LRU of the pickled values it read from Redis.
+Entries are dropped when they are deleted from Redis, through messages
+published on a Redis channel, or after a short timeout.
+
+"""
+import threading
+import time
+from collections import OrderedDict
+
+KEY_MESSAGE = 'key:'
+PREFIX_MESSAGE = 'prefix:'
+
+
+class LocalCache(object):
+
+    """Thread safe LRU cache with a time to live for its entries."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value stored for key, or None."""
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                return None
+            self._data[key] = item
+            return value
+
+    def set(self, key, value, timeout, generation=None):
+        """Store a value for at most timeout seconds.
+
+        If generation is given, the value is only stored if nothing was
+        invalidated since, as it might have been read before an invalidation
+        it missed.
+        """
+        timeout = min(timeout, self.timeout)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._data.pop(key, None)
+            self._data[key] = (time.time() + timeout, value)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+            return True
+
+    def delete(self, key):
+        """Drop the value stored for key."""
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        """Drop the values stored for all the keys starting with prefix."""
+        with self._lock:
+            self.generation += 1
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        """Drop all the values."""
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def invalidate(self, message):
+        """Apply an invalidation message published by other workers."""
+        if message.startswith(KEY_MESSAGE):
+            self.delete(message[len(KEY_MESSAGE):])
+        elif message.startswith(PREFIX_MESSAGE):
+            self.delete_prefix(message[len(PREFIX_MESSAGE):])
+        else:
+            self.clear()
+
+
+class InvalidationListener(threading.Thread):
+
+    """Thread applying the invalidation messages of a channel to a cache.
+
+    The cache must not be read while the listener is not subscribed, as
+    messages published meanwhile are lost.
+    """
+
+    RETRY_DELAY = 1
+
+    def __init__(self, connection, channel, local_cache):
+        super(InvalidationListener, self).__init__()
+        self.daemon = True
+        self.connection = connection
+        self.channel = channel
+        self.local_cache = local_cache
+        self.subscribed = False
+
+    def run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                pass
+            self.subscribed = False
+            self.local_cache.clear()
+            time.sleep(self.RETRY_DELAY)
+
+    def _listen(self):
+        pubsub = self.connection.pubsub()
+        pubsub.subscribe(self.channel)
+        for message in pubsub.listen():
+            if message['type'] == 'subscribe':
+                self.local_cache.clear()
+                self.subscribed = True
+            elif message['type'] == 'message':
+                self.local_cache.invalidate(message['data'])
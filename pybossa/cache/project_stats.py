@@ -16,23 +16,30 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 """Cache module for project stats."""
-from flask import current_app
 from sqlalchemy.sql import text
 from pybossa.core import db
 from pybossa.cache import memoize, ONE_DAY, FIVE_MINUTES, ONE_HOUR
 import pybossa.cache.projects as cached_projects
 from pybossa.model.project_stats import ProjectStats
+from pybossa.model.project_hourly_stats import ProjectHourlyStats
+from pybossa.geolocation import get_locator
 from flask.ext.babel import gettext
 
-import pygeoip
+import json
 import operator
+from collections import Counter
 import time
 import datetime
-import os
 
 
 session = db.slave_session
 
+#: Task runs finished before this period are not kept in the hourly stats
+HOURLY_STATS_PERIOD = '1 month'
+#: Task runs finished within this period are read again by the hourly stats
+#: update, as they may have been committed after a higher ID was counted
+HOURLY_STATS_RESCAN = datetime.timedelta(hours=1)
+
 
 @memoize(timeout=ONE_HOUR)
 def n_tasks(project_id):
@@ -44,9 +51,173 @@ def n_tasks(project_id):
     return projects.n_tasks(project_id)
 
 
+def update_hourly_stats(project_id):
+    """Add the task runs saved since the last update to the hourly stats
+    of a project, and drop the hours older than HOURLY_STATS_PERIOD.
+
+    IDs are assigned on insert, not on commit, so the task runs finished
+    within HOURLY_STATS_RESCAN are read again as well. The buckets keep the
+    IDs of those they counted, which are skipped.
+    """
+    since = (datetime.datetime.utcnow() - HOURLY_STATS_RESCAN).isoformat()
+    params = dict(project_id=project_id, period=HOURLY_STATS_PERIOD,
+                  since=since)
+    # Concurrent updates of a project would count the same task runs twice
+    sql = text('''SELECT pg_advisory_xact_lock(
+               hashtext('project_hourly_stats'), :project_id)''')
+    db.session.execute(sql, params)
+    sql = text('''SELECT COALESCE(MAX(last_task_run_id), 0)
+               FROM project_hourly_stats WHERE project_id=:project_id''')
+    params['last_id'] = db.session.execute(sql, params).scalar()
+
+    sql = text('''WITH counted AS (
+               SELECT unnest(task_run_ids) AS id FROM project_hourly_stats
+               WHERE project_id=:project_id
+               AND task_run_ids <> '{}'::INTEGER[])
+               SELECT to_char(TO_TIMESTAMP(finish_time,
+               'YYYY-MM-DD"T"HH24:MI:SS.US'), 'YYYY-MM-DD"T"HH24') AS hour,
+               user_id, user_ip, COUNT(id) AS n_task_runs, MAX(id) AS last_id,
+               array_agg(CASE WHEN finish_time >= :since THEN id END)
+               AS recent_ids
+               FROM task_run WHERE project_id=:project_id
+               AND (id > :last_id OR finish_time >= :since)
+               AND id NOT IN (SELECT id FROM counted)
+               AND finish_time >= to_char(NOW() - :period ::INTERVAL,
+                                          'YYYY-MM-DD')
+               GROUP BY hour, user_id, user_ip''')
+    rows = db.session.execute(sql, params).fetchall()
+    hours = set(row.hour for row in rows)
+    buckets = dict()
+    if hours:
+        buckets = dict((bucket.hour, bucket) for bucket in
+                       db.session.query(ProjectHourlyStats)
+                       .filter(ProjectHourlyStats.project_id == project_id)
+                       .filter(ProjectHourlyStats.hour.in_(hours)))
+    for hour in hours - set(buckets):
+        buckets[hour] = ProjectHourlyStats(project_id=project_id, hour=hour,
+                                           n_anon=0, n_auth=0,
+                                           anon_users={}, auth_users={},
+                                           last_task_run_id=0,
+                                           task_run_ids=[])
+        db.session.add(buckets[hour])
+    anon_users = dict((hour, dict(buckets[hour].anon_users)) for hour in hours)
+    auth_users = dict((hour, dict(buckets[hour].auth_users)) for hour in hours)
+    task_run_ids = dict((hour, list(buckets[hour].task_run_ids or []))
+                        for hour in hours)
+    for row in rows:
+        bucket = buckets[row.hour]
+        if row.user_id is not None:
+            bucket.n_auth += row.n_task_runs
+            users, user = auth_users[row.hour], str(row.user_id)
+        else:
+            bucket.n_anon += row.n_task_runs
+            users, user = anon_users[row.hour], row.user_ip
+        users[user] = users.get(user, 0) + row.n_task_runs
+        bucket.last_task_run_id = max(bucket.last_task_run_id, row.last_id)
+        task_run_ids[row.hour].extend(task_run_id for task_run_id
+                                      in row.recent_ids
+                                      if task_run_id is not None)
+    for hour in hours:
+        buckets[hour].anon_users = anon_users[hour]
+        buckets[hour].auth_users = auth_users[hour]
+        buckets[hour].task_run_ids = task_run_ids[hour]
+
+    sql = text('''DELETE FROM project_hourly_stats
+               WHERE project_id=:project_id
+               AND hour < to_char(NOW() - :period ::INTERVAL, 'YYYY-MM-DD')
+               AND last_task_run_id < :last_id''')
+    params['last_id'] = max([params['last_id']] +
+                            [row.last_id for row in rows])
+    db.session.flush()
+    db.session.execute(sql, params)
+    # The task runs finished before the rescan period are not read again
+    sql = text('''UPDATE project_hourly_stats SET task_run_ids = ARRAY(
+               SELECT id FROM task_run
+               WHERE id = ANY(project_hourly_stats.task_run_ids)
+               AND finish_time >= :since)
+               WHERE project_id=:project_id
+               AND task_run_ids <> '{}'::INTEGER[]''')
+    db.session.execute(sql, params)
+    db.session.commit()
+
+
+def recount_hourly_stats(conn, project_id, hours):
+    """Count again the task runs of some hours of the hourly stats of a
+    project, after task runs of those hours were deleted.
+
+    Only the task runs that update_hourly_stats counted are counted again:
+    those up to the last ID counted that are either kept in the task_run_ids
+    of their hour or finished before HOURLY_STATS_RESCAN. The hours not kept
+    in the hourly stats are ignored.
+    """
+    since = (datetime.datetime.utcnow() - HOURLY_STATS_RESCAN).isoformat()
+    sql = text('''SELECT hour, task_run_ids,
+               (SELECT COALESCE(MAX(last_task_run_id), 0)
+                FROM project_hourly_stats WHERE project_id=:project_id)
+               AS last_id
+               FROM project_hourly_stats
+               WHERE project_id=:project_id AND hour = ANY(:hours)''')
+    buckets = conn.execute(sql, dict(project_id=project_id,
+                                     hours=list(hours))).fetchall()
+    for bucket in buckets:
+        end = (datetime.datetime.strptime(bucket.hour, '%Y-%m-%dT%H') +
+               datetime.timedelta(hours=1)).strftime('%Y-%m-%dT%H')
+        params = dict(project_id=project_id, hour=bucket.hour, end=end,
+                      since=since, last_id=bucket.last_id,
+                      task_run_ids=bucket.task_run_ids or [])
+        sql = text('''SELECT id, user_id, user_ip FROM task_run
+                   WHERE project_id=:project_id
+                   AND finish_time >= :hour AND finish_time < :end
+                   AND id <= :last_id
+                   AND (finish_time < :since OR id = ANY(:task_run_ids))''')
+        task_runs = conn.execute(sql, params).fetchall()
+        anon_users = Counter(task_run.user_ip for task_run in task_runs
+                             if task_run.user_id is None)
+        auth_users = Counter(str(task_run.user_id) for task_run in task_runs
+                             if task_run.user_id is not None)
+        task_run_ids = set(params['task_run_ids'])
+        params.update(n_anon=sum(anon_users.values()),
+                      n_auth=sum(auth_users.values()),
+                      anon_users=json.dumps(anon_users),
+                      auth_users=json.dumps(auth_users),
+                      task_run_ids=[task_run.id for task_run in task_runs
+                                    if task_run.id in task_run_ids])
+        sql = text('''UPDATE project_hourly_stats
+                   SET n_anon=:n_anon, n_auth=:n_auth,
+                   anon_users=CAST(:anon_users AS JSON),
+                   auth_users=CAST(:auth_users AS JSON),
+                   task_run_ids=CAST(:task_run_ids AS INTEGER[])
+                   WHERE project_id=:project_id AND hour=:hour''')
+        conn.execute(sql, params)
+
+
+def _hourly_stats(project_id, period):
+    """Return the hourly stats of a project for the days within a period."""
+    update_hourly_stats(project_id)
+    sql = text('''SELECT hour, n_anon, n_auth, anon_users, auth_users
+               FROM project_hourly_stats WHERE project_id=:project_id
+               AND hour >= to_char(NOW() - :period ::INTERVAL
+                                   + INTERVAL '1 day', 'YYYY-MM-DD')
+               ORDER BY hour''')
+    return db.session.execute(sql, dict(project_id=project_id,
+                                        period=period)).fetchall()
+
+
 @memoize(timeout=ONE_HOUR)
 def stats_users(project_id, period=None):
     """Return users's stats for a given project_id."""
+    if period:
+        anon = Counter()
+        auth = Counter()
+        for row in _hourly_stats(project_id, period):
+            anon.update(row.anon_users)
+            auth.update(dict((int(user_id), n_tasks) for user_id, n_tasks
+                             in row.auth_users.iteritems()))
+        users = dict(n_anon=len(anon), n_auth=len(auth))
+        anon_users = [list(user) for user in anon.most_common()]
+        auth_users = [list(user) for user in auth.most_common(10)]
+        return users, anon_users, auth_users
+
     users = {}
     auth_users = []
     anon_users = []
@@ -61,18 +232,6 @@ def stats_users(project_id, period=None):
                GROUP BY task_run.user_id ORDER BY n_tasks DESC
                LIMIT 10;''')\
         .execution_options(stream=True)
-    if period:
-        sql = text('''SELECT task_run.user_id AS user_id,
-                   COUNT(task_run.id) as n_tasks FROM task_run
-                   WHERE task_run.user_id IS NOT NULL AND
-                   task_run.user_ip IS NULL AND
-                   task_run.project_id=:project_id AND
-                   TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                   >= NOW() - :period ::INTERVAL
-                   GROUP BY task_run.user_id ORDER BY n_tasks DESC
-                   LIMIT 10;''')\
-            .execution_options(stream=True)
-        params['period'] = period
 
     results = session.execute(sql, params)
 
@@ -83,14 +242,6 @@ def stats_users(project_id, period=None):
                FROM task_run WHERE task_run.user_id IS NOT NULL AND
                task_run.user_ip IS NULL AND
                task_run.project_id=:project_id;''')
-    if period:
-        sql = text('''SELECT count(distinct(task_run.user_id)) AS user_id
-                   FROM task_run WHERE task_run.user_id IS NOT NULL AND
-                   task_run.user_ip IS NULL AND
-                   task_run.project_id=:project_id AND
-                   TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                   >= NOW() - :period ::INTERVAL
-                   ;''')
 
     results = session.execute(sql, params)
     for row in results:
@@ -105,17 +256,6 @@ def stats_users(project_id, period=None):
                GROUP BY task_run.user_ip ORDER BY n_tasks DESC;''')\
         .execution_options(stream=True)
 
-    if period:
-        sql = text('''SELECT task_run.user_ip AS user_ip,
-                   COUNT(task_run.id) as n_tasks FROM task_run
-                   WHERE task_run.user_ip IS NOT NULL AND
-                   task_run.user_id IS NULL AND
-                   task_run.project_id=:project_id AND
-                   TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                   >= NOW() - :period ::INTERVAL
-                   GROUP BY task_run.user_ip ORDER BY n_tasks DESC;''')\
-            .execution_options(stream=True)
-
     results = session.execute(sql, params)
 
     for row in results:
@@ -125,14 +265,6 @@ def stats_users(project_id, period=None):
                FROM task_run WHERE task_run.user_ip IS NOT NULL AND
                task_run.user_id IS NULL AND
                task_run.project_id=:project_id;''')
-    if period:
-        sql = text('''SELECT COUNT(DISTINCT(task_run.user_ip)) AS user_ip
-                   FROM task_run WHERE task_run.user_ip IS NOT NULL AND
-                   task_run.user_id IS NULL AND
-                   task_run.project_id=:project_id AND
-                   TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                   >= NOW() - :period ::INTERVAL
-                   ;''')
 
     results = session.execute(sql, params)
 
@@ -171,24 +303,12 @@ def stats_dates(project_id, period='15 day'):
 
     params = dict(project_id=project_id, period=period)
 
-    # Get all completed tasks
+    # Get the tasks with answers in the period, by the day of the last one
     sql = text('''
-               WITH myquery AS (
-               SELECT task.id, coalesce(ct, 0) as n_task_runs, task.n_answers
-               FROM task LEFT OUTER JOIN
-               (SELECT task_id, COUNT(id) AS ct FROM task_run
+               SELECT last_finish_time AS day FROM counter
                WHERE project_id=:project_id AND
-               TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-               >= NOW() - :period :: INTERVAL
-               GROUP BY task_id) AS log_counts
-               ON task.id=log_counts.task_id
-               WHERE task.project_id=:project_id ORDER BY id ASC)
-               select myquery.id, max(task_run.finish_time) as day
-               from task_run, myquery where task_run.task_id=myquery.id
-               and
-               TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-               >= NOW() - :period :: INTERVAL
-               group by myquery.id order by day;
+               last_finish_time >= to_char(NOW() - :period ::INTERVAL
+               + INTERVAL '1 day', 'YYYY-MM-DD');
                ''').execution_options(stream=True)
 
     results = session.execute(sql, params)
@@ -211,42 +331,15 @@ def stats_dates(project_id, period='15 day'):
 
     dates = _fill_empty_days(dates.keys(), dates)
 
-    # Get all answers per date for auth
-    sql = text('''
-                WITH myquery AS (
-                    SELECT TO_DATE(finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    as d, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_ip IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() - :period :: INTERVAL
-                    GROUP BY d)
-                SELECT to_char(d, 'YYYY-MM-DD') as d, count from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-    for row in results:
-        dates_auth[row.d] = row.count
+    # Get all answers per date for anon and auth
+    for row in _hourly_stats(project_id, period):
+        day = row.hour[:10]
+        if row.n_auth:
+            dates_auth[day] = dates_auth.get(day, 0) + row.n_auth
+        if row.n_anon:
+            dates_anon[day] = dates_anon.get(day, 0) + row.n_anon
 
     dates_auth = _fill_empty_days(dates_auth.keys(), dates_auth)
-
-    # Get all answers per date for anon
-    sql = text('''
-                WITH myquery AS (
-                    SELECT TO_DATE(finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    as d, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_id IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() - :period :: INTERVAL
-                    GROUP BY d)
-               SELECT to_char(d, 'YYYY-MM-DD') as d, count  from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-    for row in results:
-        dates_anon[row.d] = row.count
-
     dates_anon = _fill_empty_days(dates_anon.keys(), dates_anon)
 
     return dates, dates_anon, dates_auth
@@ -258,9 +351,6 @@ def stats_hours(project_id, period='2 week'):
     hours = {}
     hours_anon = {}
     hours_auth = {}
-    max_hours = 0
-    max_hours_anon = 0
-    max_hours_auth = 0
 
     # initialize hours keys
     for i in range(0, 24):
@@ -268,127 +358,15 @@ def stats_hours(project_id, period='2 week'):
         hours_anon[str(i).zfill(2)] = 0
         hours_auth[str(i).zfill(2)] = 0
 
-    params = dict(project_id=project_id, period=period)
-    # Get hour stats for all users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT h, count from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-
-    for row in results:
-        hours[row.h] = row.count
-
-    # Get maximum stats for all users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id  AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT max(count) from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-    for row in results:
-        max_hours = row.max
-
-    # Get hour stats for Anonymous users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_id IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT h, count from myquery;
-               ''').execution_options(stream=True)
+    for row in _hourly_stats(project_id, period):
+        h = row.hour[11:13]
+        hours[h] += row.n_anon + row.n_auth
+        hours_anon[h] += row.n_anon
+        hours_auth[h] += row.n_auth
 
-    results = session.execute(sql, params)
-
-    for row in results:
-        hours_anon[row.h] = row.count
-
-    # Get maximum stats for Anonymous users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_id IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT max(count) from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-    for row in results:
-        max_hours_anon = row.max
-
-    # Get hour stats for Auth users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_ip IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT h, count from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-
-    for row in results:
-        hours_auth[row.h] = row.count
-
-    # Get hour stats for Anon users
-    sql = text('''
-               WITH myquery AS
-                (SELECT to_char(
-                    DATE_TRUNC('hour',
-                        TO_TIMESTAMP(finish_time, 'YYYY-MM-DD"T"HH24:MI:SS.US')
-                    ),
-                    'HH24') AS h, COUNT(id)
-                    FROM task_run WHERE project_id=:project_id
-                    AND user_ip IS NULL AND
-                    TO_DATE(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-                    >= NOW() - :period :: INTERVAL
-                    GROUP BY h)
-               SELECT max(count) from myquery;
-               ''').execution_options(stream=True)
-
-    results = session.execute(sql, params)
-    for row in results:
-        max_hours_auth = row.max
+    max_hours = max(hours.values())
+    max_hours_anon = max(hours_anon.values())
+    max_hours_auth = max(hours_auth.values())
 
     return hours, hours_anon, hours_auth, max_hours, max_hours_anon, \
         max_hours_auth
@@ -491,49 +469,29 @@ def stats_format_users(project_id, users, anon_users, auth_users, geo=False):
         userAuthStats['values'].append(dict(label=u[0], value=[u[1]]))
 
     # Get location for Anonymous users
-    top5_anon = []
-    top10_auth = []
     loc_anon = []
-    # Check if the GeoLiteCity.dat exists
-    geolite = current_app.root_path + '/../dat/GeoLiteCity.dat'
-    if geo:
-        if os.path.isfile(geolite) is False:
-            geo = False
-    if geo:  # pragma: no cover
-        gic = pygeoip.GeoIP(geolite)
+    locator = get_locator() if geo else None
     for u in anon_users:
-        if geo:  # pragma: no cover
-            loc = gic.record_by_addr(u[0])
+        if locator:  # pragma: no cover
+            loc = locator.locate(u[0])
         else:
-            loc = {}
-        if loc is None:  # pragma: no cover
-            loc = {}
-        if (len(loc.keys()) == 0):
-            loc['latitude'] = 0
-            loc['longitude'] = 0
-        top5_anon.append(dict(ip=u[0], loc=loc, tasks=u[1]))
-
-    for u in anon_users:
-        if geo:  # pragma: no cover
-            loc = gic.record_by_addr(u[0])
-        else:
-            loc = {}
-        if loc is None:  # pragma: no cover
-            loc = {}
-        if (len(loc.keys()) == 0):
-            loc['latitude'] = 0
-            loc['longitude'] = 0
+            loc = dict(latitude=0, longitude=0)
         loc_anon.append(dict(ip=u[0], loc=loc, tasks=u[1]))
+    top5_anon = loc_anon[0:5]
 
-    for u in auth_users:
-        sql = text('''SELECT name, fullname from "user" where id=:id;''')
-        results = session.execute(sql, dict(id=u[0]))
-        for row in results:
-            fullname = row.fullname
-            name = row.name
-        top10_auth.append(dict(name=name, fullname=fullname, tasks=u[1]))
-
-    userAnonStats['top5'] = top5_anon[0:5]
+    top10_auth = []
+    if auth_users:
+        sql = text('''SELECT id, name, fullname FROM "user"
+                   WHERE id = ANY(:ids);''')
+        results = session.execute(sql, dict(ids=[u[0] for u in auth_users]))
+        names = dict((row.id, row) for row in results)
+        for u in auth_users:
+            if u[0] in names:
+                top10_auth.append(dict(name=names[u[0]].name,
+                                       fullname=names[u[0]].fullname,
+                                       tasks=u[1]))
+
+    userAnonStats['top5'] = top5_anon
     userAnonStats['locs'] = loc_anon
     userAuthStats['top10'] = top10_auth
 
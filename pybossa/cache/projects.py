@@ -21,13 +21,14 @@ from pybossa.core import db, timeouts
 from pybossa.model.project import Project
 from pybossa.util import pretty_date, static_vars, convert_utc_to_est
 from pybossa.cache import memoize, cache, delete_memoized, delete_cached, memoize_essentials, delete_memoized_essential
-from pybossa.cache.task_browse_helpers import get_task_filters, allowed_fields
+from pybossa.cache.task_browse_helpers import (get_task_filters, allowed_fields,
+                                               get_searchable_columns)
 
 
 session = db.slave_session
 
 
-@memoize(timeout=timeouts.get('APP_TIMEOUT'))
+@memoize(timeout=timeouts.get('APP_TIMEOUT'), local=True)
 def get_project(short_name):
     """Get project by short_name."""
     project = session.query(Project).filter_by(short_name=short_name).first()
@@ -61,17 +62,26 @@ def get_top(n=4):
 
 @memoize_essentials(timeout=timeouts.get('BROWSE_TASKS_TIMEOUT'), essentials=[0])
 @static_vars(allowed_fields=allowed_fields)
-def browse_tasks(project_id, args):
-    """Cache browse tasks view for a project."""
+def browse_tasks(project_id, args, columns=None):
+    """Cache browse tasks view for a project.
+
+    The values of the given info columns are read in the same query and
+    added to each task, defaulting to an empty string.
+    """
     filters, filter_params = get_task_filters(args)
+    columns = columns or []
+    info_columns = ''.join(', task.info->:info_col_{0} AS info_col_{0}'
+                           .format(i) for i in range(len(columns)))
+    for i, col in enumerate(columns):
+        filter_params['info_col_{}'.format(i)] = col
     sql = text('''
                SELECT COUNT(*) OVER() as total_count, task.id,
                coalesce(ct, 0) as n_task_runs, task.n_answers, ft,
-               priority_0, task.created
+               priority_0, task.created''' + info_columns + '''
                FROM task LEFT OUTER JOIN
-               (SELECT task_id, CAST(COUNT(id) AS FLOAT) AS ct,
-               MAX(finish_time) as ft FROM task_run
-               WHERE project_id=:project_id GROUP BY task_id) AS log_counts
+               (SELECT task_id, CAST(n_task_runs AS FLOAT) AS ct,
+               last_finish_time as ft FROM counter
+               WHERE project_id=:project_id) AS log_counts
                ON task.id=log_counts.task_id
                WHERE task.project_id=:project_id''' + filters +
                " ORDER BY %s" % (args.get('order_by') or 'id ASC') +
@@ -101,6 +111,9 @@ def browse_tasks(project_id, args):
         if total_count == 0:
             total_count = row.total_count
         task['pct_status'] = _pct_status(row.n_task_runs, row.n_answers)
+        for i, col in enumerate(columns):
+            value = row['info_col_{}'.format(i)]
+            task[col] = value if value is not None else ''
         tasks.append(task)
     return total_count, tasks
 
@@ -113,9 +126,9 @@ def task_count(project_id, filters):
                coalesce(ct, 0) as n_task_runs, task.n_answers, ft,
                priority_0, task.created
                FROM task LEFT OUTER JOIN
-               (SELECT task_id, CAST(COUNT(id) AS FLOAT) AS ct,
-               MAX(finish_time) as ft FROM task_run
-               WHERE project_id=:project_id GROUP BY task_id) AS log_counts
+               (SELECT task_id, CAST(n_task_runs AS FLOAT) AS ct,
+               last_finish_time as ft FROM counter
+               WHERE project_id=:project_id) AS log_counts
                ON task.id=log_counts.task_id
                WHERE task.project_id=:project_id {} LIMIT 1'''
                .format(conditions))
@@ -566,6 +579,11 @@ def delete_browse_tasks(project_id):
     delete_memoized_essential(browse_tasks, project_id)
 
 
+def delete_searchable_columns(project_id):
+    """Reset get_searchable_columns value in cache"""
+    delete_memoized(get_searchable_columns, project_id)
+
+
 def delete_n_tasks(project_id):
     """Reset n_tasks value in cache"""
     delete_memoized(n_tasks, project_id)
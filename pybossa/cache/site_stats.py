@@ -21,8 +21,9 @@ import pygeoip
 from sqlalchemy.sql import text
 from flask import current_app
 
-from pybossa.core import db
+from pybossa.core import db, sentinel
 from pybossa.cache import cache, memoize, ONE_DAY, ONE_WEEK
+from pybossa.realtime_stats import RealtimeStats
 
 session = db.slave_session
 
@@ -69,14 +70,15 @@ def n_total_tasks_site():
     return total or 0
 
 
-@cache(timeout=ONE_DAY, key_prefix="site_n_task_runs")
 def n_task_runs_site():
     """Return number of task runs in the server."""
-    sql = text('''SELECT COUNT(task_run.id) AS n_task_runs FROM task_run''')
-    results = session.execute(sql)
-    for row in results:
-        n_task_runs = row.n_task_runs
-    return n_task_runs or 0
+    realtime_stats = RealtimeStats(sentinel.master)
+    n_task_runs = realtime_stats.n_task_runs()
+    if n_task_runs is None:
+        sql = text('''SELECT COUNT(task_run.id) AS n_task_runs FROM task_run''')
+        n_task_runs = session.execute(sql).scalar() or 0
+        realtime_stats.seed_task_runs(n_task_runs)
+    return n_task_runs
 
 
 @cache(timeout=ONE_DAY, key_prefix="site_n_results")
@@ -94,49 +96,53 @@ def n_results_site():
     return n_results or 0
 
 
-@cache(timeout=ONE_DAY, key_prefix="site_top5_apps_24_hours")
 def get_top5_projects_24_hours():
     """Return the top 5 projects more active in the last 24 hours."""
-    # Top 5 Most active projects in last 24 hours
-    sql = text('''SELECT project.id, project.name, project.short_name, project.info,
-               COUNT(task_run.project_id) AS n_answers FROM project, task_run
-               WHERE project.id=task_run.project_id
-               AND DATE(task_run.finish_time) > NOW() - INTERVAL '24 hour'
-               AND DATE(task_run.finish_time) <= NOW()
-               GROUP BY project.id
-               ORDER BY n_answers DESC LIMIT 5;''')
-
-    results = session.execute(sql, dict(limit=5))
+    top5 = RealtimeStats(sentinel.master).top_projects(5)
+    if not top5:
+        return []
+    sql = text('''SELECT id, name, short_name, info FROM project
+               WHERE id = ANY(:ids);''')
+    results = session.execute(sql, dict(ids=[_id for _id, _ in top5]))
+    projects = dict((row.id, row) for row in results)
     top5_apps_24_hours = []
-    for row in results:
+    for project_id, n_answers in top5:
+        row = projects.get(project_id)
+        if row is None:
+            continue
         tmp = dict(id=row.id, name=row.name, short_name=row.short_name,
-                   info=row.info, n_answers=row.n_answers)
+                   info=row.info, n_answers=n_answers)
         top5_apps_24_hours.append(tmp)
     return top5_apps_24_hours
 
 
-@cache(timeout=ONE_DAY, key_prefix="site_top5_users_24_hours")
 def get_top5_users_24_hours():
     """Return top 5 users in last 24 hours."""
-    # Top 5 Most active users in last 24 hours
-    sql = text('''SELECT "user".id, "user".fullname, "user".name,
-               COUNT(task_run.project_id) AS n_answers FROM "user", task_run
-               WHERE "user".id=task_run.user_id
-               AND DATE(task_run.finish_time) > NOW() - INTERVAL '24 hour'
-               AND DATE(task_run.finish_time) <= NOW()
-               GROUP BY "user".id
-               ORDER BY n_answers DESC LIMIT 5;''')
-
-    results = session.execute(sql, dict(limit=5))
+    top5 = RealtimeStats(sentinel.master).top_users(5)
+    if not top5:
+        return []
+    sql = text('''SELECT id, fullname, name FROM "user"
+               WHERE id = ANY(:ids);''')
+    results = session.execute(sql, dict(ids=[_id for _id, _ in top5]))
+    users = dict((row.id, row) for row in results)
     top5_users_24_hours = []
-    for row in results:
+    for user_id, n_answers in top5:
+        row = users.get(user_id)
+        if row is None:
+            continue
         user = dict(id=row.id, fullname=row.fullname,
                     name=row.name,
-                    n_answers=row.n_answers)
+                    n_answers=n_answers)
         top5_users_24_hours.append(user)
     return top5_users_24_hours
 
 
+def n_active_users_24_hours():
+    """Return number of users and anonymous IPs that contributed in the
+    last 24 hours."""
+    return RealtimeStats(sentinel.master).n_active_users()
+
+
 @cache(timeout=ONE_DAY, key_prefix="site_locs")
 def get_locs():
     """Return locations (latitude, longitude) for anonymous users."""
@@ -1,6 +1,8 @@
 from werkzeug.exceptions import BadRequest
 from collections import defaultdict
 from pybossa.util import convert_est_to_utc
+from pybossa.core import timeouts
+from pybossa.cache import memoize
 import re
 import json
 
@@ -121,6 +123,7 @@ def is_valid_searchable_column(column_name):
     return is_valid
 
 
+@memoize(timeout=timeouts.get('BROWSE_TASKS_TIMEOUT'))
 def get_searchable_columns(project_id):
     from pybossa.core import task_repo
     tasks = task_repo.filter_tasks_by(project_id=project_id,
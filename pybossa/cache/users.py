@@ -17,16 +17,16 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 """Cache module for users."""
 from sqlalchemy.sql import text
-from sqlalchemy.exc import ProgrammingError
 from pybossa.core import db, timeouts
-from pybossa.cache import cache, memoize, delete_memoized, ONE_DAY
+from pybossa.cache import (cache, memoize, delete_memoized, set_memoized,
+                           ONE_DAY)
 from pybossa.util import pretty_date
 from pybossa.model.user import User
 from pybossa.cache.projects import overall_progress, n_tasks, n_volunteers
 from pybossa.cache.projects import n_total_tasks
 from pybossa.model.project import Project
 from pybossa.leaderboard.data import get_leaderboard as gl
-from pybossa.leaderboard.jobs import leaderboard as lb
+from pybossa.leaderboard.data import get_rank_and_score
 import json
 
 session = db.slave_session
@@ -34,12 +34,7 @@ session = db.slave_session
 
 def get_leaderboard(n, user_id=None, window=0):
     """Return the top n users with their rank."""
-    try:
-        return gl(top_users=n, user_id=user_id, window=window)
-    except ProgrammingError:
-        db.session.rollback()
-        lb()
-        return gl(top_users=n, user_id=user_id, window=window)
+    return gl(top_users=n, user_id=user_id, window=window)
 
 
 @memoize(timeout=timeouts.get('USER_TIMEOUT'))
@@ -59,9 +54,8 @@ def n_projects_contributed(user_id):
     return total_projects_contributed
 
 
-@memoize(timeout=timeouts.get('USER_TIMEOUT'))
-def get_user_summary(name):
-    """Return user summary."""
+def _get_user_summaries(condition, params):
+    """Return the summaries of the users matching an SQL condition."""
     sql = text('''
                SELECT "user".id, "user".name, "user".fullname, "user".created,
                "user".api_key, "user".twitter_user_id, "user".facebook_user_id,
@@ -71,11 +65,11 @@ def get_user_summary(name):
                max(task_run.finish_time) AS last_task_submission_on
                FROM "user"
                LEFT OUTER JOIN task_run ON "user".id=task_run.user_id
-               WHERE "user".name=:name
+               WHERE {condition}
                GROUP BY "user".id;
-               ''')
-    results = session.execute(sql, dict(name=name))
-    user = dict()
+               '''.format(condition=condition))
+    results = session.execute(sql, params)
+    users = []
     for row in results:
         user = dict(id=row.id, name=row.name, fullname=row.fullname,
                     created=row.created, api_key=row.api_key,
@@ -88,16 +82,33 @@ def get_user_summary(name):
                     confirmation_email_sent=row.confirmation_email_sent,
                     registered_ago=pretty_date(row.created),
                     last_task_submission_on=row.last_task_submission_on)
-    if user:
         rank_score = rank_and_score(user['id'])
         user['rank'] = rank_score['rank']
         user['score'] = rank_score['score']
         user['total'] = get_total_users()
-        return user
+        users.append(user)
+    return users
+
+
+@memoize(timeout=timeouts.get('USER_TIMEOUT'))
+def get_user_summary(name):
+    """Return user summary."""
+    users = _get_user_summaries('"user".name=:name', dict(name=name))
+    if users:
+        return users[0]
     else:  # pragma: no cover
         return None
 
 
+def warm_user_summaries(names):
+    """Cache the summaries of several users with a single query."""
+    users = _get_user_summaries('"user".name = ANY(:names)',
+                                dict(names=list(names)))
+    for user in users:
+        set_memoized(get_user_summary, user, user['name'])
+    return users
+
+
 @memoize(timeout=timeouts.get('USER_TIMEOUT'))
 def public_get_user_summary(name):
     """Sanitize user summary for public usage"""
@@ -109,16 +120,9 @@ def public_get_user_summary(name):
     return public_user
 
 
-@memoize(timeout=timeouts.get('USER_TIMEOUT'))
 def rank_and_score(user_id):
     """Return rank and score for a user."""
-    sql = text('''SELECT * from users_rank WHERE id=:user_id''')
-    results = session.execute(sql, dict(user_id=user_id))
-    rank_and_score = dict(rank=None, score=None)
-    for row in results:
-        rank_and_score['rank'] = row.rank
-        rank_and_score['score'] = row.score
-    return rank_and_score
+    return get_rank_and_score(user_id)
 
 
 def projects_contributed(user_id):
@@ -316,7 +320,38 @@ def delete_user_metadata(name):
     delete_memoized(get_metadata, name)
 
 
-@memoize(timeout=ONE_DAY)
+class UnknownAPIKey(Exception):
+    """Raised for an API key without owner, so that it is not memoized."""
+
+
+@memoize(timeout=timeouts.get('API_KEY_TIMEOUT'), local=True)
+def _api_key_owner(api_key):
+    sql = text('''SELECT id, enabled, admin, subadmin FROM "user"
+               WHERE api_key=:api_key''')
+    row = db.session.execute(sql, dict(api_key=api_key)).first()
+    if row is None:
+        raise UnknownAPIKey(api_key)
+    return dict(id=row.id, enabled=row.enabled, admin=row.admin,
+                subadmin=row.subadmin)
+
+
+def get_api_key_owner(api_key):
+    """Return the id and flags of the user owning the API key, or None.
+
+    Unknown keys are not cached, so that guessed keys do not fill it.
+    """
+    try:
+        return _api_key_owner(api_key)
+    except UnknownAPIKey:
+        return None
+
+
+def delete_api_key_owner(api_key):
+    """Reset the cached owner of the API key."""
+    delete_memoized(_api_key_owner, api_key)
+
+
+@memoize(timeout=ONE_DAY, local=True)
 def get_user_preferences(user_id):
     assert user_id is not None or user_id > 0
 
@@ -0,0 +1,154 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""Warming of the caches read by the most visited pages.
+
+The caches are warmed in phases: the project listings of the front page and
+the categories, the projects they show, the summaries of the users of the
+leaderboard, with a single query, and then the projects of those users.
+
+The items of a phase are split across a pool of WARM_CACHE_PROCESSES worker
+processes, each with its own app and connections. The values are computed
+with the cache disabled, so they replace whatever is cached.
+"""
+import itertools
+import os
+import time
+from collections import OrderedDict
+from multiprocessing import Pool
+
+from flask import current_app
+
+import pybossa.cache.categories as cached_cat
+import pybossa.cache.projects as cached_projects
+import pybossa.cache.users as cached_users
+from pybossa.util import rank
+
+TOP = 'top'
+FEATURED = 'featured'
+CATEGORY = 'category'
+
+# Number of chunks per worker the items of a phase are split in, so that
+# progress is reported while the phase runs.
+CHUNKS_PER_PROCESS = 4
+
+
+def warm_cache(processes=None):
+    """Warm the caches.
+
+    Returns an ordered dict with the number of items warmed and the seconds
+    taken by each phase.
+    """
+    if processes is None:
+        processes = current_app.config.get('WARM_CACHE_PROCESSES', 1)
+    phases = OrderedDict()
+    pool = Pool(processes, _init_worker) if processes > 1 else None
+    try:
+        listings = [(TOP, None), (FEATURED, None)]
+        listings += [(CATEGORY, c['short_name'])
+                     for c in cached_cat.get_used()]
+        shown = _run_phase('listings', _warm_listing, listings, pool,
+                           processes, phases)
+
+        projects = OrderedDict()
+        for listing in shown:
+            for project_id, short_name in listing:
+                projects.setdefault(project_id, short_name)
+        _run_phase('projects', _warm_project, projects.items(), pool,
+                   processes, phases)
+
+        start = time.time()
+        users = cached_users.get_leaderboard(current_app.config['LEADERBOARD'])
+        summaries = cached_users.warm_user_summaries(
+            [user['name'] for user in users])
+        _report('user summaries', len(summaries), start, phases)
+
+        _run_phase('users', _warm_user, [user['id'] for user in summaries],
+                   pool, processes, phases)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return phases
+
+
+def _run_phase(name, function, items, pool, processes, phases):
+    """Apply a function to the items of a phase, in the pool if any, and
+    return its results."""
+    start = time.time()
+    if pool is None:
+        results_iter = itertools.imap(function, items)
+    else:
+        chunksize = max(1, len(items) // (processes * CHUNKS_PER_PROCESS))
+        results_iter = pool.imap(function, items, chunksize)
+    step = max(1, len(items) // 10)
+    results = []
+    for result in results_iter:
+        results.append(result)
+        if len(results) % step == 0 and len(results) < len(items):
+            print "Warming %s: %s/%s" % (name, len(results), len(items))
+    _report(name, len(results), start, phases)
+    return results
+
+
+def _report(name, n_items, start, phases):
+    seconds = time.time() - start
+    phases[name] = dict(n_items=n_items, seconds=seconds)
+    print "Warmed %s %s in %.2f seconds" % (n_items, name, seconds)
+
+
+def _init_worker():
+    """Give a worker process its own app, so that it does not share the
+    database and Redis connections of its parent."""
+    from pybossa.core import create_app
+    os.environ['PYBOSSA_REDIS_CACHE_DISABLED'] = '1'
+    app = create_app(run_as_server=False)
+    app.app_context().push()
+
+
+def _warm_listing(listing):
+    """Warm a project listing and return the (id, short_name) of the
+    projects shown in its first pages."""
+    kind, category = listing
+    to_cache = 3 * current_app.config['APPS_PER_PAGE']
+    if kind == TOP:
+        projects = cached_projects.get_top()
+    elif kind == FEATURED:
+        projects = rank(cached_projects.get_all_featured('featured'))
+    else:
+        projects = rank(cached_projects.get_all(category))
+    return [(p['id'], p['short_name']) for p in projects[:to_cache]]
+
+
+def _warm_project(project):
+    """Warm the values shown in the page and cards of a project."""
+    project_id, short_name = project
+    cached_projects.get_project(short_name)
+    cached_projects.n_tasks(project_id)
+    cached_projects.n_completed_tasks(project_id)
+    cached_projects.n_task_runs(project_id)
+    cached_projects.n_volunteers(project_id)
+    cached_projects.last_activity(project_id)
+    return project_id
+
+
+def _warm_user(user_id):
+    """Warm the projects shown in the profile of a user."""
+    cached_users.projects_contributed_cached(user_id)
+    cached_users.published_projects_cached(user_id)
+    cached_users.draft_projects_cached(user_id)
+    return user_id
@@ -49,6 +49,19 @@ class ContributionsGuard(object):
         key = self._create_key(task, user)
         return self.conn.get(key)
 
+    def retrieve_timestamps(self, tasks, user):
+        """Get the cached requested and presented timestamps of tasks for a
+        user, in a single round trip.
+
+        Returns a list of (requested, presented) pairs, in the order of tasks.
+        """
+        pipeline = self.conn.pipeline(transaction=False)
+        for task in tasks:
+            pipeline.get(self._create_key(task, user))
+            pipeline.get(self._create_presented_time_key(task, user))
+        values = pipeline.execute()
+        return zip(values[::2], values[1::2])
+
     def _create_key(self, task, user):
         """Create a Redis key for a given task and a user."""
         user_id = user['user_id'] or user['user_ip']
@@ -86,6 +99,23 @@ class ContributionsGuard(object):
         user_id = user['user_id'] or None
         return self.PRESENTED_KEY_PREFIX.format(user_id, task.id)
 
+    def stamp_tasks(self, tasks, user):
+        """Cache the time that tasks were requested by and presented to a
+        user, in a single round trip.
+
+        Presented times already cached are kept, only their expiry is
+        extended, as for a user returning to the same task.
+        """
+        timestamp = make_timestamp()
+        pipeline = self.conn.pipeline(transaction=False)
+        for task in tasks:
+            pipeline.setex(self._create_key(task, user), self.STAMP_TTL,
+                           timestamp)
+            key = self._create_presented_time_key(task, user)
+            pipeline.set(key, timestamp, ex=self.STAMP_TTL, nx=True)
+            pipeline.expire(key, self.STAMP_TTL)
+        pipeline.execute()
+
     def extend_task_presented_timestamp_expiry(self, task, user):
         """Extend expiry time for task presented time for user."""
         key = self._create_presented_time_key(task, user)
@@ -532,9 +532,12 @@ def setup_hooks(app):
         if 'Authorization' in request.headers:
             apikey = request.headers.get('Authorization')
         if apikey:
-            user = user_repo.get_by(api_key=apikey)
-            if user and user.enabled:
-                _request_ctx_stack.top.user = user
+            from pybossa.cache.users import get_api_key_owner
+            from pybossa.model.user import APIKeyUser
+            owner = get_api_key_owner(apikey)
+            if owner and owner['enabled']:
+                _request_ctx_stack.top.user = APIKeyUser(api_key=apikey,
+                                                         **owner)
         # Handle forms
         request.body = request.form
         if (request.method == 'POST' and
@@ -650,6 +653,7 @@ def setup_ratelimits(app):
     global ratelimits
     ratelimits['LIMIT'] = app.config['LIMIT']
     ratelimits['PER'] = app.config['PER']
+    ratelimits['ENDPOINTS'] = app.config.get('RATE_LIMITS', {})
 
 
 def setup_cache_timeouts(app):
@@ -672,6 +676,7 @@ def setup_cache_timeouts(app):
     timeouts['USER_TIMEOUT'] = app.config['USER_TIMEOUT']
     timeouts['USER_TOP_TIMEOUT'] = app.config['USER_TOP_TIMEOUT']
     timeouts['USER_TOTAL_TIMEOUT'] = app.config['USER_TOTAL_TIMEOUT']
+    timeouts['API_KEY_TIMEOUT'] = app.config['API_KEY_TIMEOUT']
 
 
 def setup_scheduled_jobs(app):  # pragma: no cover
@@ -18,6 +18,7 @@
 """Dashboard Jobs module for running background tasks in PYBOSSA server."""
 from sqlalchemy import text
 from pybossa.core import db
+from pybossa.util import refresh_materialized_view
 
 
 def _exists_materialized_view(view):
@@ -30,10 +31,18 @@ def _exists_materialized_view(view):
 
 
 def _refresh_materialized_view(view):
-    sql = text('REFRESH MATERIALIZED VIEW %s' % view)
+    return refresh_materialized_view(db, view)
+
+
+def _create_materialized_view(view, sql, unique_columns):
+    """Create a materialized view with the unique index it needs to be
+    refreshed concurrently, without blocking its readers."""
+    db.session.execute(sql)
+    sql = text('CREATE UNIQUE INDEX %s_idx ON %s(%s);'
+               % (view, view, unique_columns))
     db.session.execute(sql)
     db.session.commit()
-    return "Materialized view refreshed"
+    return "Materialized view created"
 
 
 def active_users_week():
@@ -47,15 +56,13 @@ def active_users_week():
                                         'YYYY-MM-DD\THH24:MI:SS.US') AS day,
                                 user_id, COUNT(task_run.user_id) AS day_crafters
                         FROM task_run
-                        WHERE to_date(task_run.finish_time,
-                                      'YYYY-MM-DD\THH24:MI:SS.US')
-                            >= NOW() - ('1 week'):: INTERVAL
+                        WHERE task_run.finish_time
+                            >= to_char(NOW() - ('1 week'):: INTERVAL
+                                       + INTERVAL '1 day', 'YYYY-MM-DD')
                         GROUP BY day, task_run.user_id)
                    SELECT day, COUNT(crafters_per_day.user_id) AS n_users
                    FROM crafters_per_day GROUP BY day ORDER BY day;''')
-        db.session.execute(sql)
-        db.session.commit()
-        return "Materialized view created"
+        return _create_materialized_view('dashboard_week_users', sql, 'day')
 
 
 def active_anon_week():
@@ -69,15 +76,13 @@ def active_anon_week():
                                         'YYYY-MM-DD\THH24:MI:SS.US') AS day,
                                 user_ip, COUNT(task_run.user_ip) AS day_crafters
                         FROM task_run
-                        WHERE to_date(task_run.finish_time,
-                                      'YYYY-MM-DD\THH24:MI:SS.US')
-                            >= NOW() - ('1 week'):: INTERVAL
+                        WHERE task_run.finish_time
+                            >= to_char(NOW() - ('1 week'):: INTERVAL
+                                       + INTERVAL '1 day', 'YYYY-MM-DD')
                         GROUP BY day, task_run.user_ip)
                    SELECT day, COUNT(crafters_per_day.user_ip) AS n_users
                    FROM crafters_per_day GROUP BY day ORDER BY day;''')
-        db.session.execute(sql)
-        db.session.commit()
-        return "Materialized view created"
+        return _create_materialized_view('dashboard_week_anon', sql, 'day')
 
 
 def draft_projects_week():
@@ -90,15 +95,14 @@ def draft_projects_week():
                    project.id, short_name, project.name,
                    owner_id, "user".name AS u_name, "user".email_addr
                    FROM project, "user"
-                   WHERE TO_DATE(project.created,
-                                'YYYY-MM-DD\THH24:MI:SS.US') >= now() -
-                                ('1 week')::INTERVAL
+                   WHERE project.created
+                       >= to_char(NOW() - ('1 week'):: INTERVAL
+                                  + INTERVAL '1 day', 'YYYY-MM-DD')
                    AND "user".id = project.owner_id
                    AND project.published = false
                    GROUP BY project.id, "user".name, "user".email_addr;''')
-        db.session.execute(sql)
-        db.session.commit()
-        return "Materialized view created"
+        return _create_materialized_view(
+            'dashboard_week_project_draft', sql, 'id')
 
 
 def published_projects_week():
@@ -108,20 +112,20 @@ def published_projects_week():
     else:
         sql = text('''CREATE MATERIALIZED VIEW dashboard_week_project_published AS
                    SELECT TO_DATE(auditlog.created, 'YYYY-MM-DD\THH24:MI:SS.US') AS day,
+                   auditlog.id AS auditlog_id,
                    project.id, project.short_name, project.name,
                    owner_id, "user".name AS u_name, "user".email_addr
                    FROM auditlog, project, "user"
-                   WHERE TO_DATE(auditlog.created,
-                                'YYYY-MM-DD\THH24:MI:SS.US') >= now() -
-                                ('1 week')::INTERVAL
+                   WHERE auditlog.created
+                       >= to_char(NOW() - ('1 week'):: INTERVAL
+                                  + INTERVAL '1 day', 'YYYY-MM-DD')
                    AND "user".id = project.owner_id
                    AND project.owner_id = auditlog.user_id
                    AND auditlog.project_id = project.id
                    AND auditlog.attribute = 'published'
                    GROUP BY auditlog.id, "user".name, "user".email_addr, project.id;''')
-        db.session.execute(sql)
-        db.session.commit()
-        return "Materialized view created"
+        return _create_materialized_view(
+            'dashboard_week_project_published', sql, 'auditlog_id')
 
 
 def update_projects_week():
@@ -134,14 +138,13 @@ def update_projects_week():
                    project.id, short_name, project.name,
                    owner_id, "user".name AS u_name, "user".email_addr
                    FROM project, "user"
-                   WHERE TO_DATE(project.updated,
-                                'YYYY-MM-DD\THH24:MI:SS.US') >= now() -
-                                ('1 week')::INTERVAL
+                   WHERE project.updated
+                       >= to_char(NOW() - ('1 week'):: INTERVAL
+                                  + INTERVAL '1 day', 'YYYY-MM-DD')
                    AND "user".id = project.owner_id
                    GROUP BY project.id, "user".name, "user".email_addr;''')
-        db.session.execute(sql)
-        db.session.commit()
-        return "Materialized view created"
+        return _create_materialized_view(
+            'dashboard_week_project_update', sql, 'id')
 
 
 def new_tasks_week():
@@ -153,13 +156,12 @@ def new_tasks_week():
                       SELECT TO_DATE(task.created,
                                      'YYYY-MM-DD\THH24:MI:SS.US') AS day,
                       COUNT(task.id) AS day_tasks
-                      FROM task WHERE TO_DATE(task.created,
-                                              'YYYY-MM-DD\THH24:MI:SS.US')
-                                          >= now() - ('1 week'):: INTERVAL
+                      FROM task WHERE task.created
+                                      >= to_char(now() - ('1 week'):: INTERVAL
+                                                 + INTERVAL '1 day',
+                                                 'YYYY-MM-DD')
                       GROUP BY day ORDER BY day ASC;''')
-        db.session.execute(sql)
-        db.session.commit()
-        return "Materialized view created"
+        return _create_materialized_view('dashboard_week_new_task', sql, 'day')
 
 
 def new_task_runs_week():
@@ -171,13 +173,13 @@ def new_task_runs_week():
                       SELECT TO_DATE(task_run.finish_time,
                                      'YYYY-MM-DD\THH24:MI:SS.US') AS day,
                       COUNT(task_run.id) AS day_task_runs
-                      FROM task_run WHERE TO_DATE(task_run.finish_time,
-                                              'YYYY-MM-DD\THH24:MI:SS.US')
-                                          >= now() - ('1 week'):: INTERVAL
+                      FROM task_run WHERE task_run.finish_time
+                                      >= to_char(now() - ('1 week'):: INTERVAL
+                                                 + INTERVAL '1 day',
+                                                 'YYYY-MM-DD')
                       GROUP BY day;''')
-        db.session.execute(sql)
-        db.session.commit()
-        return "Materialized view created"
+        return _create_materialized_view(
+            'dashboard_week_new_task_run', sql, 'day')
 
 
 def new_users_week():
@@ -189,13 +191,13 @@ def new_users_week():
                       SELECT TO_DATE("user".created,
                                      'YYYY-MM-DD\THH24:MI:SS.US') AS day,
                       COUNT("user".id) AS day_users
-                      FROM "user" WHERE TO_DATE("user".created,
-                                              'YYYY-MM-DD\THH24:MI:SS.US')
-                                          >= now() - ('1 week'):: INTERVAL
+                      FROM "user" WHERE "user".created
+                                      >= to_char(now() - ('1 week'):: INTERVAL
+                                                 + INTERVAL '1 day',
+                                                 'YYYY-MM-DD')
                       GROUP BY day;''')
-        db.session.execute(sql)
-        db.session.commit()
-        return "Materialized view created"
+        return _create_materialized_view(
+            'dashboard_week_new_users', sql, 'day')
 
 
 def returning_users_week():
@@ -208,13 +210,12 @@ def returning_users_week():
                     SELECT user_id, TO_DATE(task_run.finish_time,
                     'YYYY-MM-DD\THH24:MI:SS.US') AS day
                    FROM task_run
-                   WHERE TO_DATE(task_run.finish_time,
-                   'YYYY-MM-DD\THH24:MI:SS.US') >= NOW()
-                   - ('1 week')::INTERVAL GROUP BY day, task_run.user_id)
+                   WHERE task_run.finish_time >= to_char(NOW()
+                   - ('1 week')::INTERVAL + INTERVAL '1 day', 'YYYY-MM-DD')
+                   GROUP BY day, task_run.user_id)
                    SELECT user_id, COUNT(user_id) AS n_days
                    FROM data GROUP BY user_id HAVING(count(user_id) > 1)
                    ORDER by n_days;
                       ''')
-        db.session.execute(sql)
-        db.session.commit()
-        return "Materialized view created"
+        return _create_materialized_view(
+            'dashboard_week_returning_users', sql, 'user_id')
@@ -53,6 +53,9 @@ UPLOAD_METHOD = 'local'
 ## Default number of users shown in the leaderboard
 LEADERBOARD = 20
 
+## Number of processes warming the cache (1 warms it in a single process)
+WARM_CACHE_PROCESSES = 4
+
 ## Default configuration for debug toolbar
 ENABLE_DEBUG_TOOLBAR = False
 
@@ -64,6 +67,11 @@ REDIS_DB = 0
 
 REDIS_KEYPREFIX = 'pybossa_cache'
 
+## In-process cache for hot lookups, in front of Redis. Number of values
+## kept by each worker (0 disables it) and maximum age in seconds.
+LOCAL_CACHE_SIZE = 0
+LOCAL_CACHE_TIMEOUT = 30
+
 ## Default cache timeouts
 # Project cache
 AVATAR_TIMEOUT = 30 * 24 * 60 * 60
@@ -79,6 +87,7 @@ BROWSE_TASKS_TIMEOUT = 3 * 60 * 60
 CATEGORY_TIMEOUT = 24 * 60 * 60
 # User cache
 USER_TIMEOUT = 15 * 60
+API_KEY_TIMEOUT = 60
 USER_TOP_TIMEOUT = 24 * 60 * 60
 USER_TOTAL_TIMEOUT = 24 * 60 * 60
 
@@ -105,6 +114,11 @@ ACCOUNT_LINK_EXPIRATION = 5 * 60 * 60
 # Rate limits default values
 LIMIT = 300
 PER = 15 * 60
+# Rate limits by endpoint, as (limit, per)
+RATE_LIMITS = {}
+# Count clients far below their limit in process, and send their hits to
+# Redis in batches of this size (0 to disable)
+RATE_LIMIT_LOCAL_BATCH = 0
 
 # Disable new account confirmation (via email)
 ACCOUNT_CONFIRMATION_DISABLED = True
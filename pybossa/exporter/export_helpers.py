@@ -59,6 +59,8 @@ TASK_FIELDS = [
     'task.user_pref   AS {}user_pref'
 ]
 
+JSON_FIELDS = ('info', 'user_pref')
+
 session = db.slave_session
 
 
@@ -69,30 +71,98 @@ def _field_mapreducer(fields, prefix=''):
 def browse_tasks_export(obj, project_id, expanded, **kwargs):
     """Export tasks from the browse tasks view for a project
     using the same filters that are selected by the user
-    in the UI.
+    in the UI. Rows are fetched in batches from a server side
+    cursor.
+    """
+    filters, filter_params = get_task_filters(kwargs)
+    sql = _browse_tasks_export_sql(obj, expanded, filters)
+    if sql is None:
+        return
+
+    sql = text(sql).execution_options(stream_results=True)
+    return session.execute(sql, dict(project_id=project_id, **filter_params))
+
+
+def browse_tasks_export_keys(obj, project_id, expanded, **kwargs):
+    """Return the nested keys of the JSON columns of the rows exported
+    by browse_tasks_export, as paths like ``info__a__b``. The keys are
+    aggregated by the database in a single pass over the export.
     """
     filters, filter_params = get_task_filters(kwargs)
+    sql = _browse_tasks_export_sql(obj, expanded, filters)
+    if sql is None:
+        return
+
+    json_fields = [name for name in _field_names(obj, expanded)
+                   if name.split('__')[-1] in JSON_FIELDS]
+    columns = ',\n'.join("('{0}', export.{0}::jsonb)".format(name)
+                          for name in json_fields)
+    sql = text('''
+               WITH RECURSIVE export AS ({0}),
+               json_keys(path, value) AS (
+                   SELECT col.name || '__' || child.key, child.value
+                     FROM export,
+                       LATERAL (VALUES {1}) AS col(name, value),
+                       LATERAL jsonb_each(
+                         CASE WHEN jsonb_typeof(col.value) = 'object'
+                         THEN col.value ELSE '{{}}'::jsonb END) AS child
+                 UNION ALL
+                   SELECT json_keys.path || '__' || child.key, child.value
+                     FROM json_keys,
+                       LATERAL jsonb_each(json_keys.value) AS child
+                     WHERE jsonb_typeof(json_keys.value) = 'object'
+               )
+               SELECT DISTINCT path FROM json_keys
+               '''.format(sql, columns))
+    rows = session.execute(sql, dict(project_id=project_id, **filter_params))
+    return [row.path for row in rows]
+
+
+def task_runs_have_users(project_id):
+    """Check if any task run of a project was sent by a registered user."""
+    sql = text('''
+               SELECT EXISTS (SELECT 1 FROM task_run
+                              WHERE project_id = :project_id
+                              AND user_id IS NOT NULL)
+               ''')
+    return session.execute(sql, dict(project_id=project_id)).scalar()
+
+
+def _field_names(obj, expanded):
+    """Return the names of the columns selected by
+    browse_tasks_export.
+    """
     if obj == 'task':
-        sql = text('''
+        fields = [(TASK_FIELDS, '')]
+    elif expanded:
+        fields = [(TASKRUN_FIELDS, ''), (TASK_FIELDS, 'task__'),
+                  (USER_FIELDS, 'user__')]
+    else:
+        fields = [(TASKRUN_FIELDS, '')]
+    return [field.format(prefix).split()[-1]
+            for field_list, prefix in fields for field in field_list]
+
+
+def _browse_tasks_export_sql(obj, expanded, filters):
+    if obj == 'task':
+        sql = '''
                    SELECT {0}
                      FROM task
                      LEFT OUTER JOIN (
                        SELECT task_id
-                            , CAST(COUNT(id) AS FLOAT) AS ct
-                            , MAX(finish_time) as ft
-                         FROM task_run
+                            , CAST(n_task_runs AS FLOAT) AS ct
+                            , last_finish_time as ft
+                         FROM counter
                            WHERE project_id = :project_id
-                           GROUP BY task_id
                        ) AS log_counts
                        ON task.id = log_counts.task_id
                      WHERE project_id = :project_id
                      {1}
                    '''.format(_field_mapreducer(TASK_FIELDS, ''),
                               filters)
-                  )
     elif obj == 'task_run':
         if expanded:
-           sql = text('''
+           sql = '''
                       SELECT {0}
                            , {1}
                            , {2}
@@ -101,11 +171,10 @@ def browse_tasks_export(obj, project_id, expanded, **kwargs):
                           ON task_run.task_id = task.id
                         LEFT OUTER JOIN (
                           SELECT task_id
-                               , CAST(COUNT(id) AS FLOAT) AS ct
-                               , MAX(finish_time) as ft
-                            FROM task_run
+                               , CAST(n_task_runs AS FLOAT) AS ct
+                               , last_finish_time as ft
+                            FROM counter
                               WHERE project_id = :project_id
-                              GROUP BY task_id
                           ) AS log_counts
                           ON task.id = log_counts.task_id
                         LEFT JOIN "user"
@@ -116,31 +185,28 @@ def browse_tasks_export(obj, project_id, expanded, **kwargs):
                                  _field_mapreducer(TASK_FIELDS, 'task__'),
                                  _field_mapreducer(USER_FIELDS, 'user__'),
                                  filters)
-                     )
         else:
-           sql = text('''
+           sql = '''
                       SELECT {0}
                         FROM task_run
                         LEFT JOIN task
                           ON task_run.task_id = task.id
                         LEFT OUTER JOIN (
                           SELECT task_id
-                               , CAST(COUNT(id) AS FLOAT) AS ct
-                               , MAX(finish_time) as ft
-                            FROM task_run
+                               , CAST(n_task_runs AS FLOAT) AS ct
+                               , last_finish_time as ft
+                            FROM counter
                               WHERE project_id = :project_id
-                              GROUP BY task_id
                           ) AS log_counts
                           ON task_run.task_id = log_counts.task_id
                         WHERE task_run.project_id = :project_id
                         {1}
                       '''.format(_field_mapreducer(TASKRUN_FIELDS, ''),
                                  filters)
-                     )
     else:
         return
 
-    return session.execute(sql, dict(project_id=project_id, **filter_params))
+    return sql
 
 
 def browse_tasks_export_count(obj, project_id, expanded, **kwargs):
@@ -155,11 +221,10 @@ def browse_tasks_export_count(obj, project_id, expanded, **kwargs):
                      FROM task
                      LEFT OUTER JOIN (
                        SELECT task_id
-                            , CAST(COUNT(id) AS FLOAT) AS ct
-                            , MAX(finish_time) as ft
-                         FROM task_run
+                            , CAST(n_task_runs AS FLOAT) AS ct
+                            , last_finish_time as ft
+                         FROM counter
                            WHERE project_id = :project_id
-                           GROUP BY task_id
                        ) AS log_counts
                        ON task.id = log_counts.task_id
                      WHERE project_id = :project_id
@@ -174,11 +239,10 @@ def browse_tasks_export_count(obj, project_id, expanded, **kwargs):
                       ON task_run.task_id = task.id
                     LEFT OUTER JOIN (
                       SELECT task_id
-                           , CAST(COUNT(id) AS FLOAT) AS ct
-                           , MAX(finish_time) as ft
-                        FROM task_run
+                           , CAST(n_task_runs AS FLOAT) AS ct
+                           , last_finish_time as ft
+                        FROM counter
                           WHERE project_id = :project_id
-                          GROUP BY task_id
                       ) AS log_counts
                       ON task.id = log_counts.task_id
                     WHERE task_run.project_id = :project_id
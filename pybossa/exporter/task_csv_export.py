@@ -17,13 +17,16 @@
 # along with PyBossa.  If not, see <http://www.gnu.org/licenses/>.
 # Cache global variables for timeouts
 
-import tempfile
+from cStringIO import StringIO
 from flask import url_for, safe_join, send_file, redirect
 from pybossa.uploader import local
 from pybossa.exporter.csv_export import CsvExporter
 from pybossa.core import uploader, task_repo
+from pybossa.model.task import Task
+from pybossa.model.task_run import TaskRun
 from pybossa.util import UnicodeWriter
-from export_helpers import browse_tasks_export
+from export_helpers import (browse_tasks_export, browse_tasks_export_keys,
+                            task_runs_have_users)
 
 
 class TaskCsvExporter(CsvExporter):
@@ -31,6 +34,10 @@ class TaskCsvExporter(CsvExporter):
     for a project.
     """
 
+    BATCH_SIZE = 1000
+    USER_ATTRIBUTES = ['name', 'fullname', 'created',
+                       'email_addr', 'admin', 'subadmin']
+
     @classmethod
     def get_keys(self, row, ty='', parent_key=''):
         """Recursively get keys from a dictionary.
@@ -94,8 +101,8 @@ class TaskCsvExporter(CsvExporter):
                 if val is not None:
                     return val
 
-    @staticmethod
-    def merge_objects(t):
+    @classmethod
+    def merge_objects(cls, t):
         """Merge joined objects into a single dictionary."""
         obj_dict = {}
 
@@ -112,9 +119,8 @@ class TaskCsvExporter(CsvExporter):
 
         try:
             user = t.user.dictize()
-            allowed_attributes = ['name', 'fullname', 'created',
-                                  'email_addr', 'admin', 'subadmin']
-            user = {k: v for (k, v) in user.iteritems() if k in allowed_attributes}
+            user = {k: v for (k, v) in user.iteritems()
+                    if k in cls.USER_ATTRIBUTES}
             obj_dict['user'] = user
         except:
             pass
@@ -149,6 +155,14 @@ class TaskCsvExporter(CsvExporter):
         writer.writerow(self._format_csv_row(self.merge_objects(t),
                                              headers=headers))
 
+    @staticmethod
+    def _flush(out):
+        """Return what was written to the buffer so far and empty it."""
+        data = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return data
+
     def _get_csv(self, out, writer, table, project_id, expanded=False):
         if table == 'task':
             query_filter = task_repo.filter_tasks_by
@@ -158,70 +172,76 @@ class TaskCsvExporter(CsvExporter):
             return
 
         objs = query_filter(project_id=project_id, yielded=True)
-        headers = self._get_all_headers(objs, expanded)
-        writer.writerow(headers)
-
-        for obj in objs:
+        headers = None
+        for i, obj in enumerate(objs, 1):
+            if headers is None:
+                headers = self._get_all_headers(table, project_id, expanded)
+                writer.writerow(headers)
             self._handle_row(writer, obj, headers)
-        out.seek(0)
-        yield out.read()
+            if i % self.BATCH_SIZE == 0:
+                yield self._flush(out)
+        yield self._flush(out)
 
     def _get_csv_with_filters(self, out, writer, table, project_id,
                               expanded=False, **filters):
         objs = browse_tasks_export(table, project_id, expanded, **filters)
-        rows = [obj for obj in objs]
-
-        headers = self._get_all_headers(objs=rows,
-                                        expanded=expanded,
-                                        table=table,
-                                        from_obj=False)
+        keys = objs.keys() + browse_tasks_export_keys(table, project_id,
+                                                      expanded, **filters)
+        headers = sorted(set('{}__{}'.format(table, key) for key in keys))
         writer.writerow(headers)
 
-        for row in rows:
+        for i, row in enumerate(objs, 1):
             row = self.process_filtered_row(dict(row))
             writer.writerow(self._format_csv_row(row, headers))
+            if i % self.BATCH_SIZE == 0:
+                yield self._flush(out)
+        yield self._flush(out)
 
-        out.seek(0)
-        yield out.read()
-
-    def _get_all_headers(self, objs, expanded, table=None, from_obj=True):
+    def _get_all_headers(self, table, project_id, expanded):
         """Construct headers to **guarantee** that all headers
         for all tasks are included, regardless of whether
         or not all tasks were imported with the same headers.
 
-        :param objs: an iterable of objects or dicts to 
-            extract keys from
+        The keys nested in the JSON columns are aggregated by the
+        database, so the objects do not need to be read twice.
+
+        :param table: the table that is exported
+        :param project_id: the project that is exported
         :param expanded: determines if joined objects should
             be merged
-        :param table: the table that the objects belong to
-        :param from_obj: does ``objs`` iterable contain
-            domain objects. If it does then different methods
-            can be used.
         """
-        headers = set()
-
-        if from_obj:
-            obj_name = objs[0].__class__.__name__.lower()
-            for obj in objs:
-                headers.update(self._get_headers_from_row(obj, obj_name, expanded))
+        if table == 'task':
+            obj_name = 'task'
+            row = dict.fromkeys(c.name for c in Task.__table__.columns)
         else:
-            for obj in objs:
-                headers.update(self.get_keys(obj, table))
+            obj_name = 'taskrun'
+            row = dict.fromkeys(c.name for c in TaskRun.__table__.columns)
+            if expanded:
+                row['task'] = dict.fromkeys(c.name
+                                            for c in Task.__table__.columns)
+                if task_runs_have_users(project_id):
+                    row['user'] = dict.fromkeys(self.USER_ATTRIBUTES)
 
-        headers = sorted(list(headers))
-        return headers
+        headers = set(self.get_keys(row, obj_name))
+        for key in browse_tasks_export_keys(table, project_id, expanded):
+            if self._is_exported_key(row, key):
+                headers.add('{}__{}'.format(obj_name, key))
 
-    def _get_headers_from_row(self, obj, obj_name, expanded):
-        if expanded:
-            obj_dict = self.merge_objects(obj)
-        else:
-            obj_dict = obj.dictize()
+        return sorted(headers)
 
-        headers = self.get_keys(obj_dict, obj_name)
-        return headers
+    @staticmethod
+    def _is_exported_key(row, key):
+        """Check if a nested key belongs to one of the columns of a row."""
+        for part in key.split('__'):
+            if part not in row:
+                return False
+            if not isinstance(row[part], dict):
+                return True
+            row = row[part]
+        return True
 
     def _respond_csv(self, ty, project_id, expanded=False, **filters):
-        out = tempfile.TemporaryFile()
+        out = StringIO()
         writer = UnicodeWriter(out)
 
         try:
@@ -0,0 +1,80 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Location of IP addresses with the GeoLite City database.
+
+The database is opened once per process, memory mapped, and the locations
+found are kept in an LRU so each address is only looked up once.
+
+"""
+import os
+import threading
+
+import pygeoip
+from flask import current_app
+
+from pybossa.cache import ONE_DAY
+from pybossa.cache.local_cache import LocalCache
+
+#: Number of IP addresses whose location is kept in memory.
+CACHE_SIZE = 50000
+
+_locators = {}
+_locators_lock = threading.Lock()
+
+
+class GeoLocator(object):
+
+    """Resolve IP addresses to the location stored for them in a GeoIP
+    database."""
+
+    def __init__(self, path, size=CACHE_SIZE):
+        self.gic = pygeoip.GeoIP(path, flags=pygeoip.MMAP_CACHE)
+        self._cache = LocalCache(size, ONE_DAY)
+
+    def locate(self, ip):
+        """Return the location record of an IP address.
+
+        Addresses that are not in the database are placed at latitude and
+        longitude 0.
+        """
+        loc = self._cache.get(ip)
+        if loc is None:
+            loc = self.gic.record_by_addr(ip) or {}
+            if len(loc.keys()) == 0:
+                loc['latitude'] = 0
+                loc['longitude'] = 0
+            self._cache.set(ip, loc, ONE_DAY)
+        return dict(loc)
+
+
+def geolite_path():
+    """Return the path of the GeoLite City database of the app."""
+    return current_app.root_path + '/../dat/GeoLiteCity.dat'
+
+
+def get_locator():
+    """Return the GeoLocator of this process, or None if the GeoLite City
+    database is not installed."""
+    path = geolite_path()
+    with _locators_lock:
+        if path not in _locators:
+            if not os.path.isfile(path):
+                return None
+            _locators[path] = GeoLocator(path)
+        return _locators[path]
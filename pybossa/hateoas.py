@@ -16,7 +16,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 """Hateoas module for PYBOSSA."""
-from flask import url_for
+from flask import url_for, g
 
 
 class Hateoas(object):
@@ -30,10 +30,22 @@ class Hateoas(object):
     def create_link(self, item_id, title, rel='self'):
         """Create hateoas link."""
         # title = item.__class__.__name__.lower()
-        method = ".api_%s" % title
-        href = url_for(method, oid=item_id, _external=True)
+        href = "%s/%s" % (self.url_template(title), item_id)
         return self.link(rel, title, href)
 
+    def url_template(self, title):
+        """Return the URL of the endpoint of the given kind of object.
+
+        It is built once per request, as url_for is too slow to be called
+        for each link of a page of objects.
+        """
+        templates = getattr(g, 'hateoas_templates', None)
+        if templates is None:
+            templates = g.hateoas_templates = dict()
+        if title not in templates:
+            templates[title] = url_for(".api_%s" % title, _external=True)
+        return templates[title]
+
     def create_links(self, item):
         """Create Hateoas links."""
         cls = item.__class__.__name__.lower()
@@ -16,6 +16,8 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
+import json
 from flask import current_app
 from flask.ext.babel import gettext
 from .csv import BulkTaskCSVImport, BulkTaskGDImport, BulkTaskLocalCSVImport
@@ -34,6 +36,8 @@ class Importer(object):
 
     """Class to import data."""
 
+    BATCH_SIZE = 1000
+
     def __init__(self):
         """Init method."""
         self._importers = dict(localCSV=BulkTaskLocalCSVImport)
@@ -61,7 +65,6 @@ class Importer(object):
         from pybossa.model.task import Task
         """Create tasks from a remote source using an importer object and
         avoiding the creation of repeated tasks"""
-        empty = True
         n = 0
         importer = self._create_importer_for(**form_data)
         tasks = importer.tasks()
@@ -90,19 +93,27 @@ class Importer(object):
                 return ImportReport(message=msg, metadata=None, total=0)
 
         s3_bucket_failures = 0
-        for task_data in tasks:
-            task = Task(project_id=project.id)
-            [setattr(task, k, v) for k, v in task_data.iteritems()]
-            found = task_repo.find_duplicate(project_id=project.id,
-                                             info=task.info)
-            if found is None:
-                if valid_or_no_s3_bucket(task.info):
-                    task_repo.save(task)
-                    n += 1
-                    empty = False
-                else:
-                    s3_bucket_failures += 1
-                    current_app.logger.error('Invalid S3 bucket. project id: {}, task info: {}'.format(project.id, task.info))
+        seen = set()
+        batch = []
+        try:
+            for task_data in tasks:
+                task = Task(project_id=project.id)
+                [setattr(task, k, v) for k, v in task_data.iteritems()]
+                batch.append(task)
+                if len(batch) >= self.BATCH_SIZE:
+                    saved, failures = self._save_batch(task_repo, project,
+                                                       batch, seen)
+                    n += saved
+                    s3_bucket_failures += failures
+                    batch = []
+            saved, failures = self._save_batch(task_repo, project, batch,
+                                               seen)
+            n += saved
+            s3_bucket_failures += failures
+        finally:
+            if n:
+                task_repo.after_save_tasks(project.id)
+        empty = n == 0
 
         additional_msg = ' {} task import failed due to invalid S3 bucket.'\
                             .format(s3_bucket_failures) if s3_bucket_failures else ''
@@ -124,6 +135,34 @@ class Importer(object):
         report = ImportReport(message=msg, metadata=metadata, total=n)
         return report
 
+    def _save_batch(self, task_repo, project, tasks, seen):
+        """Save a batch of tasks skipping duplicates, both already in the
+        project and earlier in the import. Each batch is committed on its
+        own, so a failed import can be resumed by importing it again.
+        """
+        if not tasks:
+            return 0, 0
+        duplicates = task_repo.find_duplicates(project.id,
+                                               [task.info for task in tasks])
+        to_save = []
+        s3_bucket_failures = 0
+        for task in tasks:
+            info = json.dumps(task.info)
+            digest = hashlib.md5(info).digest()
+            if info in duplicates or digest in seen:
+                continue
+            if valid_or_no_s3_bucket(task.info):
+                seen.add(digest)
+                to_save.append(task)
+            else:
+                s3_bucket_failures += 1
+                current_app.logger.error('Invalid S3 bucket. project id: {}, task info: {}'.format(project.id, task.info))
+        task_repo.save_tasks(project.id, to_save)
+        current_app.logger.info(
+            'Project {} - imported {} tasks, {} tasks imported so far'
+            .format(project.id, len(to_save), len(seen)))
+        return len(to_save), s3_bucket_failures
+
     def count_tasks_to_import(self, **form_data):
         """Count tasks to import."""
         return self._create_importer_for(**form_data).count_tasks()
@@ -125,7 +125,7 @@ def get_periodic_jobs(queue):
     failed_jobs = get_maintenance_jobs() if queue == 'maintenance' else []
     _all = [jobs, project_jobs, autoimport_jobs,
             engage_jobs, non_contrib_jobs, dashboard_jobs,
-            weekly_update_jobs, failed_jobs]
+            leaderboard_jobs, weekly_update_jobs, failed_jobs]
     return (job for sublist in _all for job in sublist if job['queue'] == queue)
 
 
@@ -188,21 +188,37 @@ def project_export(_id):
 
 
 def get_project_jobs(queue):
-    """Return a list of jobs based on user type."""
-    from pybossa.core import project_repo
-    from pybossa.cache import projects as cached_projects
+    """Return stats jobs for the projects written to since their stats were
+    last refreshed, most active first. Published projects of pro users go
+    to the super queue and the rest to the high one."""
+    from sqlalchemy.sql import text
+    from pybossa.core import db, sentinel
+    from pybossa.stats_scheduler import DirtyProjects
     timeout = current_app.config.get('TIMEOUT')
-    if queue == 'super':
-        projects = cached_projects.get_from_pro_user()
-    elif queue == 'high':
-        projects = (p.dictize() for p in project_repo.get_all())
-    else:
-        projects = []
-    for project in projects:
-        project_id = project.get('id')
-        project_short_name = project.get('short_name')
+    if queue not in ('super', 'high'):
+        return
+    dirty_projects = DirtyProjects(sentinel.master)
+    dirty = dirty_projects.get_dirty()
+    if not dirty:
+        return
+    sql = text('''SELECT project.id, project.short_name,
+               "user".pro AND project.published AS pro
+               FROM project JOIN "user" ON project.owner_id="user".id
+               WHERE project.id = ANY(:project_ids);''')
+    results = db.slave_session.execute(
+        sql, dict(project_ids=[project_id for project_id, _, _ in dirty]))
+    projects = dict((row.id, row) for row in results)
+    for project_id, _, _ in dirty:
+        project = projects.get(project_id)
+        if project is None:
+            dirty_projects.remove(project_id)
+            continue
+        if (queue == 'super') != bool(project.pro):
+            continue
+        if not dirty_projects.claim(project_id):
+            continue
         job = dict(name=get_project_stats,
-                   args=[project_id, project_short_name], kwargs={},
+                   args=[project.id, project.short_name], kwargs={},
                    timeout=timeout,
                    queue=queue)
         yield job
@@ -226,10 +242,10 @@ def get_inactive_users_jobs(queue='quaterly'):
     # First users that have participated once but more than 3 months ago
     sql = text('''SELECT user_id FROM task_run
                WHERE user_id IS NOT NULL
-               AND to_date(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-               >= NOW() - '12 month'::INTERVAL
-               AND to_date(task_run.finish_time, 'YYYY-MM-DD\THH24:MI:SS.US')
-               < NOW() - '3 month'::INTERVAL
+               AND task_run.finish_time >= to_char(NOW() - '12 month'::INTERVAL
+                                                   + INTERVAL '1 day', 'YYYY-MM-DD')
+               AND task_run.finish_time < to_char(NOW() - '3 month'::INTERVAL
+                                                  + INTERVAL '1 day', 'YYYY-MM-DD')
                GROUP BY user_id ORDER BY user_id;''')
     results = db.slave_session.execute(sql)
 
@@ -289,6 +305,8 @@ def get_leaderboard_jobs(queue='super'):  # pragma: no cover
     timeout = current_app.config.get('TIMEOUT')
     yield dict(name=leaderboard.leaderboard, args=[], kwargs={},
                timeout=timeout, queue=queue)
+    yield dict(name=leaderboard.leaderboard, args=[], kwargs={'week': True},
+               timeout=timeout, queue=queue)
 
 
 def get_non_contributors_users_jobs(queue='quaterly'):
@@ -358,9 +376,14 @@ def get_project_stats(_id, short_name):  # pragma: no cover
     import pybossa.cache.projects as cached_projects
     import pybossa.cache.project_stats as stats
     from flask import current_app
+    from pybossa.core import sentinel
+    from pybossa.stats_scheduler import DirtyProjects
 
-    cached_projects.get_project(short_name)
-    stats.update_stats(_id, current_app.config.get('GEO'))
+    try:
+        cached_projects.get_project(short_name)
+        stats.update_stats(_id, current_app.config.get('GEO'))
+    finally:
+        DirtyProjects(sentinel.master).release(_id)
 
 
 @with_cache_disabled
@@ -369,16 +392,12 @@ def warm_up_stats():  # pragma: no cover
     print "Running on the background warm_up_stats"
     from pybossa.cache.site_stats import (n_auth_users, n_anon_users,
                                           n_tasks_site, n_total_tasks_site,
-                                          n_task_runs_site,
-                                          get_top5_projects_24_hours,
-                                          get_top5_users_24_hours, get_locs)
+                                          n_task_runs_site, get_locs)
     n_auth_users()
     n_anon_users()
     n_tasks_site()
     n_total_tasks_site()
     n_task_runs_site()
-    get_top5_projects_24_hours()
-    get_top5_users_24_hours()
     get_locs()
 
     return True
@@ -387,61 +406,8 @@ def warm_up_stats():  # pragma: no cover
 @with_cache_disabled
 def warm_cache():  # pragma: no cover
     """Background job to warm cache."""
-    from pybossa.core import create_app
-    app = create_app(run_as_server=False)
-    projects_cached = []
-    import pybossa.cache.projects as cached_projects
-    import pybossa.cache.categories as cached_cat
-    import pybossa.cache.users as cached_users
-    import pybossa.cache.project_stats as stats
-    from pybossa.util import rank
-    from pybossa.core import user_repo
-
-    def warm_project(_id, short_name, featured=False):
-        if _id not in projects_cached:
-            cached_projects.get_project(short_name)
-            #cached_projects.n_tasks(_id)
-            #n_task_runs = cached_projects.n_task_runs(_id)
-            #cached_projects.overall_progress(_id)
-            #cached_projects.last_activity(_id)
-            #cached_projects.n_completed_tasks(_id)
-            #cached_projects.n_volunteers(_id)
-            #cached_projects.browse_tasks(_id)
-            #if n_task_runs >= 1000 or featured:
-            #    # print ("Getting stats for %s as it has %s task runs" %
-            #    #        (short_name, n_task_runs))
-            stats.update_stats(_id, app.config.get('GEO'))
-            projects_cached.append(_id)
-
-    # Cache top projects
-    projects = cached_projects.get_top()
-    for p in projects:
-        warm_project(p['id'], p['short_name'])
-
-    # Cache 3 pages
-    to_cache = 3 * app.config['APPS_PER_PAGE']
-    projects = rank(cached_projects.get_all_featured('featured'))[:to_cache]
-    for p in projects:
-        warm_project(p['id'], p['short_name'], featured=True)
-
-    # Categories
-    categories = cached_cat.get_used()
-    for c in categories:
-        projects = rank(cached_projects.get_all(c['short_name']))[:to_cache]
-        for p in projects:
-            warm_project(p['id'], p['short_name'])
-    # Users
-    users = cached_users.get_leaderboard(app.config['LEADERBOARD'])
-    for user in users:
-        # print "Getting stats for %s" % user['name']
-        print user_repo
-        u = user_repo.get_by_name(user['name'])
-        cached_users.get_user_summary(user['name'])
-        cached_users.projects_contributed_cached(u.id)
-        cached_users.published_projects_cached(u.id)
-        cached_users.draft_projects_cached(u.id)
-
-    return True
+    from pybossa.cache.warm import warm_cache as warm
+    return warm()
 
 
 def get_non_updated_projects():
@@ -562,6 +528,7 @@ def delete_bulk_tasks(data):
                         AND task_id IN (SELECT id FROM to_delete);
                 DELETE FROM task WHERE project_id=:project_id
                         AND id IN (SELECT id FROM to_delete);
+                DELETE FROM project_hourly_stats WHERE project_id=:project_id;
 
                 COMMIT;
                 ''')
@@ -585,9 +552,9 @@ def delete_bulk_tasks(data):
                     coalesce(ct, 0) as n_task_runs, task.n_answers, ft,
                     priority_0, task.created
                     FROM task LEFT OUTER JOIN
-                    (SELECT task_id, CAST(COUNT(id) AS FLOAT) AS ct,
-                    MAX(finish_time) as ft FROM task_run
-                    WHERE project_id=:project_id GROUP BY task_id) AS log_counts
+                    (SELECT task_id, CAST(n_task_runs AS FLOAT) AS ct,
+                    last_finish_time as ft FROM counter
+                    WHERE project_id=:project_id) AS log_counts
                     ON task.id=log_counts.task_id
                     WHERE task.project_id=:project_id {}
                 );
@@ -600,6 +567,7 @@ def delete_bulk_tasks(data):
                        AND task_id in (SELECT id FROM to_delete);
                 DELETE FROM task WHERE task.project_id=:project_id
                        AND id in (SELECT id FROM to_delete);
+                DELETE FROM project_hourly_stats WHERE project_id=:project_id;
 
                 COMMIT;
                 '''.format(conditions))
@@ -683,6 +651,7 @@ def import_tasks(project_id, current_user_fullname, from_auto=False, **form_data
             ['Hello,\n',
              'Import task to your project {} by {} failed because the file was too large.',
              'It was able to process approximately {} tasks.',
+             'Importing the same file again will skip the tasks already imported.',
              'Please break up your task upload into smaller CSV files.',
              'Thank you,\n',
              'The {} team.']).format(project.name, current_user_fullname,
@@ -0,0 +1,311 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""Leaderboards of users kept in Redis sorted sets.
+
+Each leaderboard has a scope: the whole site, a project or an ISO week. The
+members of its sorted set are user ids and the scores their number of
+answers, so ranks are read with ZREVRANK and pages with ZREVRANGE.
+
+A leaderboard is built from SQL into a temporary set that replaces it at
+once. Until then, the previous one is still served and updated. The answers
+recorded while it is built are kept in a side set for the users already read
+from SQL, and added to the new leaderboard before it replaces the old one.
+Dropping the built flag is always safe: the leaderboard job rebuilds it.
+"""
+import uuid
+from datetime import datetime
+
+import dateutil.parser
+
+SITE_SCOPE = 'site'
+ALL_USERS = 'all'
+
+# Adds to the score of a user in a leaderboard, and in the one being built if
+# the user was already read from SQL.
+# KEYS: built flag, leaderboard, rebuild lock, users read, pending scores
+# ARGV: member, increment
+INCREMENT_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    local read = redis.call('GET', KEYS[4])
+    if read and (read == 'all' or tonumber(ARGV[1]) <= tonumber(read)) then
+        redis.call('ZINCRBY', KEYS[5], ARGV[2], ARGV[1])
+        redis.call('EXPIRE', KEYS[5], redis.call('TTL', KEYS[3]))
+    end
+end
+if redis.call('EXISTS', KEYS[1]) == 0 and
+   redis.call('EXISTS', KEYS[2]) == 0 then
+    return 0
+end
+redis.call('ZINCRBY', KEYS[2], ARGV[2], ARGV[1])
+return 1
+"""
+
+# Adds a user without score to a leaderboard, and to the one being built.
+# KEYS: built flag, leaderboard, rebuild lock, users read, pending scores
+# ARGV: member
+ADD_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    redis.call('ZINCRBY', KEYS[5], 0, ARGV[1])
+    redis.call('EXPIRE', KEYS[5], redis.call('TTL', KEYS[3]))
+end
+if redis.call('EXISTS', KEYS[1]) == 0 and
+   redis.call('EXISTS', KEYS[2]) == 0 then
+    return 0
+end
+if redis.call('ZSCORE', KEYS[2], ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[2], 0, ARGV[1])
+return 1
+"""
+
+# Records the users read from SQL for a leaderboard being rebuilt, and keeps
+# the rebuild lock while it is owned. Returns 0 if it was lost.
+# KEYS: rebuild lock, users read, pending scores, new leaderboard
+# ARGV: token, ttl, users read
+MARK_READ_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+for i = 1, 4 do
+    redis.call('EXPIRE', KEYS[i], ARGV[2])
+end
+if ARGV[3] then
+    redis.call('SETEX', KEYS[2], ARGV[2], ARGV[3])
+end
+return 1
+"""
+
+# Adds the pending scores to a rebuilt leaderboard and swaps it in. Returns
+# 0, and drops it, if the rebuild lock was lost or the leaderboard was
+# invalidated meanwhile.
+# KEYS: built flag, leaderboard, rebuild lock, users read, pending scores,
+#       new leaderboard
+# ARGV: built flag ttl, leaderboard ttl, token
+FINISH_REBUILD_SCRIPT = """
+if redis.call('GET', KEYS[3]) ~= ARGV[3] then
+    redis.call('DEL', KEYS[6])
+    return 0
+end
+if redis.call('EXISTS', KEYS[5]) == 1 then
+    redis.call('ZUNIONSTORE', KEYS[6], 2, KEYS[6], KEYS[5])
+end
+if redis.call('EXISTS', KEYS[6]) == 1 then
+    redis.call('RENAME', KEYS[6], KEYS[2])
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+else
+    redis.call('DEL', KEYS[2])
+end
+redis.call('SETEX', KEYS[1], ARGV[1], 1)
+redis.call('DEL', KEYS[3], KEYS[4], KEYS[5])
+return 1
+"""
+
+
+def project_scope(project_id):
+    """Return the scope of the leaderboard of a project."""
+    return 'project:%s' % project_id
+
+
+def week_scope(timestamp=None):
+    """Return the scope of the leaderboard of the ISO week of a UTC
+    timestamp, or of the current one."""
+    if timestamp is None:
+        timestamp = datetime.utcnow()
+    elif isinstance(timestamp, basestring):
+        timestamp = dateutil.parser.parse(timestamp)
+    year, week, _ = timestamp.isocalendar()
+    return 'week:%d-%02d' % (year, week)
+
+
+class Leaderboard(object):
+
+    BOARD_KEY = 'pybossa:leaderboard:{0}'
+    BUILDING_KEY = 'pybossa:leaderboard:building:{0}:{1}'
+    BUILT_KEY = 'pybossa:leaderboard:built:{0}'
+    REBUILD_LOCK_KEY = 'pybossa:leaderboard:rebuilding:{0}'
+    READ_KEY = 'pybossa:leaderboard:read:{0}'
+    PENDING_KEY = 'pybossa:leaderboard:pending:{0}'
+    TTL = 24 * 60 * 60
+    #: A leaderboard is served while it is rebuilt, so it outlives its flag
+    BOARD_TTL = 8 * 24 * 60 * 60
+    REBUILD_LOCK_TTL = 10 * 60
+    BATCH_SIZE = 1000
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+        self._increment_script = redis_conn.register_script(INCREMENT_SCRIPT)
+        self._add_script = redis_conn.register_script(ADD_SCRIPT)
+        self._mark_read_script = redis_conn.register_script(
+            MARK_READ_SCRIPT)
+        self._finish_rebuild_script = redis_conn.register_script(
+            FINISH_REBUILD_SCRIPT)
+
+    def is_built(self, scope):
+        """Check if a leaderboard is up to date."""
+        return bool(self.conn.exists(self.BUILT_KEY.format(scope)))
+
+    def record(self, answers):
+        """Add answers to the site, project and week leaderboards of their
+        users. Answers of anonymous users are not ranked.
+
+        :param answers: iterable of (project_id, user_id, user_ip,
+                        finish_time)
+        """
+        pipeline = self.conn.pipeline()
+        for project_id, user_id, _, finish_time in answers:
+            if user_id is None:
+                continue
+            for scope in (SITE_SCOPE, project_scope(project_id),
+                          week_scope(finish_time)):
+                self._increment_script(keys=self._keys(scope),
+                                       args=[user_id, 1], client=pipeline)
+        pipeline.execute()
+
+    def add_user(self, user_id):
+        """Add a new user to the site leaderboard, if built."""
+        return bool(self._add_script(keys=self._keys(SITE_SCOPE),
+                                     args=[user_id]))
+
+    def remove_user(self, user_id):
+        """Remove a user from the site leaderboard."""
+        self.apply([('remove_user', user_id)])
+
+    def invalidate(self, scope):
+        """Mark a leaderboard as out of date, so that it is rebuilt. It is
+        still served until then."""
+        self.apply([('invalidate', scope)])
+
+    def apply(self, changes):
+        """Apply several changes in a single pipeline.
+
+        :param changes: list of (method, argument), where method is one of
+            add_user, remove_user and invalidate
+        """
+        token = None
+        if any(method == 'remove_user' for method, _ in changes):
+            token = self.conn.get(self.REBUILD_LOCK_KEY.format(SITE_SCOPE))
+        pipeline = self.conn.pipeline()
+        for method, arg in changes:
+            if method == 'add_user':
+                self._add_script(keys=self._keys(SITE_SCOPE), args=[arg],
+                                 client=pipeline)
+            elif method == 'remove_user':
+                pipeline.zrem(self.BOARD_KEY.format(SITE_SCOPE), arg)
+                pipeline.zrem(self.PENDING_KEY.format(SITE_SCOPE), arg)
+                if token:
+                    pipeline.zrem(self.BUILDING_KEY.format(SITE_SCOPE, token),
+                                  arg)
+            elif method == 'invalidate':
+                pipeline.delete(self.BUILT_KEY.format(arg),
+                                self.REBUILD_LOCK_KEY.format(arg))
+        pipeline.execute()
+
+    def acquire_rebuild(self, scope):
+        """Ensure a single client rebuilds a leaderboard at a time.
+
+        Returns the token to rebuild the leaderboard with, or None if it is
+        already being rebuilt.
+        """
+        key = self.REBUILD_LOCK_KEY.format(scope)
+        token = uuid.uuid4().hex
+        if not self.conn.set(key, token, nx=True, ex=self.REBUILD_LOCK_TTL):
+            return None
+        # Left by a rebuild that lost the lock
+        self.conn.delete(self.READ_KEY.format(scope),
+                         self.PENDING_KEY.format(scope))
+        return token
+
+    def mark_read(self, scope, token, up_to=None):
+        """Record that the users of a leaderboard being rebuilt are read
+        from SQL up to a user id, or all of them. Their answers recorded
+        from now on are added to the new leaderboard. Returns False if the
+        rebuild lock was lost."""
+        return self._keep_rebuild(scope, token, up_to or ALL_USERS)
+
+    def rebuild(self, scope, scores, token=None):
+        """Replace a leaderboard, writing it in batches. Returns False if it
+        was invalidated or the rebuild lock was lost meanwhile, and so not
+        replaced.
+
+        :param scores: iterable of (user_id, score). It must call mark_read
+            before reading the scores of each batch of users.
+        :param token: returned by acquire_rebuild. The rebuild is acquired
+            here if not given.
+        """
+        if token is None:
+            token = uuid.uuid4().hex
+            self.conn.set(self.REBUILD_LOCK_KEY.format(scope), token,
+                          ex=self.REBUILD_LOCK_TTL)
+            self.conn.delete(self.READ_KEY.format(scope),
+                             self.PENDING_KEY.format(scope))
+        building_key = self.BUILDING_KEY.format(scope, token)
+        batch = []
+        for user_id, score in scores:
+            batch.extend([score, user_id])
+            if len(batch) >= 2 * self.BATCH_SIZE:
+                self.conn.zadd(building_key, *batch)
+                batch = []
+                if not self._keep_rebuild(scope, token):
+                    self.conn.delete(building_key)
+                    return False
+        if batch:
+            self.conn.zadd(building_key, *batch)
+        return bool(self._finish_rebuild_script(
+            keys=self._keys(scope) + [building_key],
+            args=[self.TTL, self.BOARD_TTL, token]))
+
+    def top(self, scope, n):
+        """Return (rank, user_id, score) of the n first users."""
+        return self.page(scope, 1, n)
+
+    def page(self, scope, first, last):
+        """Return (rank, user_id, score) of the users ranked from first to
+        last, both included."""
+        first = max(first, 1)
+        if last < first:
+            return []
+        members = self.conn.zrevrange(self.BOARD_KEY.format(scope),
+                                      first - 1, last - 1, withscores=True)
+        return [(first + i, int(member), int(score))
+                for i, (member, score) in enumerate(members)]
+
+    def rank(self, scope, user_id):
+        """Return (rank, score) of a user, or None if not ranked."""
+        board_key = self.BOARD_KEY.format(scope)
+        pipeline = self.conn.pipeline()
+        pipeline.zrevrank(board_key, user_id)
+        pipeline.zscore(board_key, user_id)
+        rank, score = pipeline.execute()
+        if rank is None:
+            return None
+        return rank + 1, int(score)
+
+    def _keep_rebuild(self, scope, token, read=None):
+        keys = [self.REBUILD_LOCK_KEY.format(scope),
+                self.READ_KEY.format(scope), self.PENDING_KEY.format(scope),
+                self.BUILDING_KEY.format(scope, token)]
+        args = [token, self.REBUILD_LOCK_TTL]
+        if read is not None:
+            args.append(read)
+        return bool(self._mark_read_script(keys=keys, args=args))
+
+    def _keys(self, scope):
+        return [self.BUILT_KEY.format(scope), self.BOARD_KEY.format(scope),
+                self.REBUILD_LOCK_KEY.format(scope),
+                self.READ_KEY.format(scope), self.PENDING_KEY.format(scope)]
@@ -16,54 +16,89 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 """Leaderboard queries in leaderboard view."""
+from flask import current_app
+from rq import Queue
 from sqlalchemy import text
-from pybossa.core import db
+from pybossa.core import db, sentinel
 from pybossa.model.user import User
+from pybossa.leaderboard.board import Leaderboard
+from pybossa.leaderboard.jobs import get_scope, leaderboard
 
 u = User()
+leaderboard_queue = Queue('super', connection=sentinel.master)
 
 
-def get_leaderboard(top_users=20, user_id=None, window=0):
-    """Return a list of top_users and if user_id return its position."""
-    sql = text('''SELECT * from users_rank WHERE rank <= :top_users 
-               ORDER BY rank;''')
-    results = db.session.execute(sql, dict(top_users=top_users))
-    top_users = [format_user(user) for user in results]
+def get_leaderboard(top_users=20, user_id=None, window=0, project_id=None,
+                    week=False):
+    """Return a list of top_users and if user_id return its position.
+
+    The leaderboard is the one of the site, unless the one of a project or
+    of the current week is requested.
+    """
+    board = Leaderboard(sentinel.master)
+    scope = get_scope(project_id, week)
+    schedule_rebuild(board, scope, project_id, week)
+    ranked = board.top(scope, top_users)
 
     if user_id:
-        sql = text('''SELECT * from users_rank where id=:user_id;''')
-        results = db.session.execute(sql, dict(user_id=user_id))
-        user = None
-        for row in results:
-            user = format_user(row)
-        if user and window != 0:
-            sql = text('''SELECT * from users_rank
-                       WHERE rank >= :low AND rank <= :top order by rank;
-                       ''')
-            low = user['rank'] - window
-            top = user['rank'] + window
-            results = db.session.execute(sql, dict(user_id=user_id,
-                                         top=top,
-                                         low=low))
-            for row in results:
-                top_users.append(format_user(row))
-        else:
-            if user:
-                top_users.append(user)
-        return top_users
-    return top_users
+        position = board.rank(scope, user_id)
+        if position and window != 0:
+            rank = position[0]
+            ranked.extend(board.page(scope, rank - window, rank + window))
+        elif position:
+            ranked.append((position[0], user_id, position[1]))
+    return format_users(ranked)
+
+
+def get_rank_and_score(user_id):
+    """Return the rank and score of a user in the site leaderboard."""
+    board = Leaderboard(sentinel.master)
+    scope = get_scope()
+    schedule_rebuild(board, scope)
+    rank_and_score = dict(rank=None, score=None)
+    position = board.rank(scope, user_id)
+    if position:
+        rank_and_score['rank'], rank_and_score['score'] = position
+    return rank_and_score
+
+
+def schedule_rebuild(board, scope, project_id=None, week=False):
+    """Schedule the rebuild of a leaderboard that is not up to date. The
+    current one, if any, is served until it is replaced."""
+    if board.is_built(scope):
+        return
+    token = board.acquire_rebuild(scope)
+    if token is None:
+        return
+    leaderboard_queue.enqueue_call(func=leaderboard,
+                                   kwargs=dict(project_id=project_id,
+                                               week=week, token=token),
+                                   timeout=current_app.config.get('TIMEOUT'))
+
+
+def format_users(ranked):
+    """Return the User objects of a list of (rank, user_id, score)."""
+    if not ranked:
+        return []
+    sql = text('''SELECT id, name, fullname, email_addr, info, created
+               FROM "user" WHERE id = ANY(:user_ids);''')
+    user_ids = list(set(user_id for _, user_id, _ in ranked))
+    results = db.session.execute(sql, dict(user_ids=user_ids))
+    users = dict((row.id, row) for row in results)
+    return [format_user(users[user_id], rank, score)
+            for rank, user_id, score in ranked if user_id in users]
 
 
-def format_user(user):
+def format_user(user, rank, score):
     """Return an User object."""
     user = dict(
-        rank=user.rank,
+        rank=rank,
         id=user.id,
         name=user.name,
         fullname=user.fullname,
         email_addr=user.email_addr,
         info=user.info,
         created=user.created,
-        score=user.score)
+        score=score)
     tmp = u.to_public_json(data=user)
     return tmp
@@ -16,28 +16,101 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 """Leaderboard Jobs module for running background tasks in PYBOSSA server."""
+from datetime import datetime, timedelta
+
 from sqlalchemy import text
-from pybossa.core import db
-from pybossa.util import exists_materialized_view, refresh_materialized_view
+from pybossa.core import db, sentinel
+from pybossa.leaderboard.board import (Leaderboard, SITE_SCOPE, project_scope,
+                                       week_scope)
+
+session = db.slave_session
+
+
+def get_scope(project_id=None, week=False):
+    """Return the scope of the leaderboard of a project, of the current week
+    or of the site."""
+    if project_id is not None:
+        return project_scope(project_id)
+    if week:
+        return week_scope()
+    return SITE_SCOPE
+
+
+def leaderboard(project_id=None, week=False, token=None):
+    """Rebuild a leaderboard from the task runs.
+
+    :param token: the rebuild was already acquired by the caller that
+        scheduled this job
+    """
+    board = Leaderboard(sentinel.master)
+    scope = get_scope(project_id, week)
+    token = token or board.acquire_rebuild(scope)
+    if not token:
+        return "Leaderboard already being rebuilt"
 
+    def mark_read(up_to=None):
+        return board.mark_read(scope, token, up_to)
 
-def leaderboard():
-    """Create or update leaderboard materialized view."""
-    if exists_materialized_view(db, 'users_rank'):
-        return refresh_materialized_view(db, 'users_rank')
+    if project_id is not None:
+        scores = project_scores(project_id, mark_read)
+    elif week:
+        scores = week_scores(mark_read)
     else:
-        sql = text('''
-                   CREATE MATERIALIZED VIEW users_rank AS WITH scores AS (
-                        SELECT "user".*, COUNT(task_run.user_id) AS score
-                        FROM "user" LEFT JOIN task_run
-                        ON task_run.user_id="user".id GROUP BY "user".id
-                    ) SELECT *, row_number() OVER (ORDER BY score DESC) as rank FROM scores;
-                   ''')
-        db.session.execute(sql)
-        db.session.commit()
-        sql = text('''
-                   CREATE UNIQUE INDEX users_rank_idx on users_rank(id, rank);
-                   ''')
-        db.session.execute(sql)
-        db.session.commit()
-        return "Materialized view created"
+        scores = site_scores(mark_read)
+    if not board.rebuild(scope, scores, token):
+        return "Leaderboard invalidated while being rebuilt"
+    return "Leaderboard rebuilt"
+
+
+def site_scores(mark_read):
+    """Yield the number of answers of every user, counted in chunks of
+    users by id. Stops if the rebuild lock was lost."""
+    chunk_size = Leaderboard.BATCH_SIZE
+    sql = text('''
+               WITH chunk AS (
+                    SELECT id FROM "user"
+                    WHERE id > :last_id AND id <= :up_to
+               ) SELECT chunk.id, COUNT(task_run.id) AS score
+               FROM chunk LEFT JOIN task_run ON task_run.user_id = chunk.id
+               GROUP BY chunk.id ORDER BY chunk.id;
+               ''')
+    max_id = session.execute(text('SELECT MAX(id) FROM "user"')).scalar()
+    last_id = 0
+    while last_id < (max_id or 0):
+        up_to = last_id + chunk_size
+        if not mark_read(up_to):
+            return
+        rows = session.execute(sql, dict(last_id=last_id,
+                                         up_to=up_to)).fetchall()
+        for row in rows:
+            yield row.id, row.score
+        last_id = up_to
+
+
+def project_scores(project_id, mark_read):
+    """Yield the number of answers of the users of a project."""
+    sql = text('''
+               SELECT user_id, COUNT(id) AS score FROM task_run
+               WHERE project_id=:project_id AND user_id IS NOT NULL
+               GROUP BY user_id;
+               ''')
+    mark_read()
+    for row in session.execute(sql, dict(project_id=project_id)):
+        yield row.user_id, row.score
+
+
+def week_scores(mark_read):
+    """Yield the number of answers of the users in the current ISO week."""
+    today = datetime.utcnow().date()
+    monday = today - timedelta(days=today.weekday())
+    sql = text('''
+               SELECT user_id, COUNT(id) AS score FROM task_run
+               WHERE finish_time >= :start AND finish_time < :end
+               AND user_id IS NOT NULL
+               GROUP BY user_id;
+               ''')
+    params = dict(start=monday.isoformat(),
+                  end=(monday + timedelta(days=7)).isoformat())
+    mark_read()
+    for row in session.execute(sql, params):
+        yield row.user_id, row.score
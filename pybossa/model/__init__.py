@@ -90,6 +90,11 @@ class DomainObject(object):
         return repr
 
 def make_timestamp():
+    """Return the current UTC time as an ISO 8601 string.
+
+    Timestamp columns are Text and are sorted and paged as text, which
+    matches their time order only if every writer uses this format.
+    """
     now = datetime.datetime.utcnow()
     return now.isoformat()
 
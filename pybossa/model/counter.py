@@ -16,7 +16,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
-from sqlalchemy import Integer 
+from sqlalchemy import Integer, Text
 from sqlalchemy.schema import Column, ForeignKey
 from sqlalchemy.dialects.postgresql import TIMESTAMP
 from pybossa.core import db
@@ -24,7 +24,12 @@ from pybossa.model import DomainObject, make_timestamp
 
 
 class Counter(db.Model, DomainObject):
-    '''A Counter lists the number of task runs for a given Task.'''
+    '''A Counter lists the number of task runs for a given Task.
+
+    There is a single counter per task, updated in place. It also keeps the
+    first and last finish_time of the task runs, so listings of tasks do not
+    need to aggregate the task_run table.
+    '''
 
     __tablename__ = 'counter'
 
@@ -39,6 +44,10 @@ class Counter(db.Model, DomainObject):
     #: Task.ID that this counter is associated with.
     task_id = Column(Integer, ForeignKey('task.id',
                                          ondelete='CASCADE'),
-                     nullable=False)
+                     nullable=False, unique=True)
     #: Number of task_runs for this task.
     n_task_runs = Column(Integer, default=0, nullable=False)
+    #: finish_time of the first task run of this task.
+    first_finish_time = Column(Text)
+    #: finish_time of the last task run of this task.
+    last_finish_time = Column(Text)
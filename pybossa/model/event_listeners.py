@@ -18,9 +18,10 @@
 from datetime import datetime
 
 from rq import Queue
-from sqlalchemy import event
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session, object_session
 
-from flask import url_for
+from flask import url_for, current_app
 
 from pybossa.feed import update_feed
 from pybossa.model import update_project_timestamp, update_target_timestamp
@@ -37,12 +38,28 @@ from pybossa.core import result_repo, db
 from pybossa.jobs import webhook, notify_blog_users
 from pybossa.jobs import push_notification
 from pybossa.cache import projects as cached_projects
+from pybossa.cache.project_stats import recount_hourly_stats
+from pybossa.ready_tasks import ReadyTaskQueue
+from pybossa.realtime_stats import RealtimeStats
+from pybossa.leaderboard.board import Leaderboard, project_scope
+from pybossa.stats_scheduler import DirtyProjects
 
 from pybossa.core import sentinel
 
 webhook_queue = Queue('high', connection=sentinel.master)
 mail_queue = Queue('email', connection=sentinel.master)
 webpush_queue = Queue('webpush', connection=sentinel.master)
+ready_tasks = ReadyTaskQueue(sentinel.master)
+realtime_stats = RealtimeStats(sentinel.master)
+leaderboards = Leaderboard(sentinel.master)
+dirty_projects = DirtyProjects(sentinel.master)
+
+PENDING_TASKRUNS = 'pending_taskruns'
+PENDING_ANSWERS = 'pending_answers'
+PENDING_READY_TASKS = 'pending_ready_tasks'
+PENDING_HOURLY_STATS = 'pending_hourly_stats'
+PENDING_DIRTY_PROJECTS = 'pending_dirty_projects'
+PENDING_LEADERBOARDS = 'pending_leaderboards'
 
 
 @event.listens_for(Blogpost, 'after_insert')
@@ -153,21 +170,16 @@ def add_user_contributed_to_feed(conn, user_id, project_obj):
         update_feed(tmp)
 
 
-def is_task_completed(conn, task_id, project_id):
-    sql_query = ('select count(id) from task_run \
-                 where task_run.task_id=%s and \
-                 task_run.project_id=%s') % (task_id, project_id)
-    n_answers = conn.scalar(sql_query)
-    sql_query = ('select n_answers from task \
-                 where task.id=%s') % task_id
-    task_n_answers = conn.scalar(sql_query)
-    return (n_answers) >= task_n_answers
-
-
-def update_task_state(conn, task_id):
-    sql_query = ("UPDATE task SET state=\'completed\' \
-                 where id=%s") % task_id
-    conn.execute(sql_query)
+def complete_task_if_answered(conn, task_id):
+    """Mark the task as completed if it has all its answers and its project
+    is published. Return True if it was."""
+    sql_query = text('''UPDATE task SET state='completed' FROM project
+                     WHERE task.id=:task_id AND project.id=task.project_id
+                     AND project.published
+                     AND (SELECT COUNT(id) FROM task_run
+                          WHERE task_run.task_id=:task_id) >= task.n_answers
+                     RETURNING task.id''')
+    return conn.execute(sql_query, task_id=task_id).first() is not None
 
 
 def push_webhook(project_obj, task_id, result_id):
@@ -221,33 +233,101 @@ def create_result(conn, project_id, task_id):
 
 @event.listens_for(TaskRun, 'after_insert')
 def on_taskrun_submit(mapper, conn, target):
-    """Update the task.state when n_answers condition is met."""
-    # Get project details
-    sql_query = ('select name, short_name, published, webhook, info from project \
-                 where id=%s') % target.project_id
-    results = conn.execute(sql_query)
-    tmp = dict()
-    for r in results:
-        tmp['name'] = r.name
-        tmp['short_name'] = r.short_name
-        _published = r.published
-        tmp['info'] = r.info
-        _webhook = r.webhook
-        tmp['id'] = target.project_id
+    """Update the task.state when n_answers condition is met.
+
+    The rest of the side effects of the submission are queued on the session
+    and handled once per task after the commit, by process_taskrun_events.
+    """
+    completed = complete_task_if_answered(conn, target.task_id)
+    queue_taskrun_event(object_session(target), target.project_id,
+                        target.task_id, target.user_id, completed)
+
 
-    project_public = dict()
-    project_public.update(Project().to_public_json(tmp))
-    project_public['action_updated'] = 'TaskCompleted'
+def queue_taskrun_event(session, project_id, task_id, user_id, completed):
+    """Queue a task run of the task on the session, to be handled by
+    process_taskrun_events once committed."""
+    pending = session.info.setdefault(PENDING_TASKRUNS, {})
+    task_event = pending.setdefault(task_id,
+                                    dict(project_id=project_id,
+                                         user_ids=set(), completed=False))
+    task_event['user_ids'].add(user_id)
+    task_event['completed'] = task_event['completed'] or completed
 
-    add_user_contributed_to_feed(conn, target.user_id, project_public)
-    if is_task_completed(conn, target.task_id, target.project_id) and _published:
-        update_task_state(conn, target.task_id)
+
+@event.listens_for(TaskRun, 'after_insert')
+def queue_realtime_stats(mapper, conn, target):
+    """Queue the answer to be counted in the realtime site stats and the
+    leaderboards once committed."""
+    answers = object_session(target).info.setdefault(PENDING_ANSWERS, [])
+    answers.append((target.project_id, target.user_id, target.user_ip,
+                    target.finish_time))
+
+
+@event.listens_for(Session, 'after_commit')
+def on_taskruns_commit(session):
+    """Process the side effects of the task runs just committed."""
+    answers = session.info.pop(PENDING_ANSWERS, None)
+    if answers:
+        try:
+            realtime_stats.record(answers)
+        except Exception:
+            current_app.logger.exception('Error updating realtime stats')
+        try:
+            leaderboards.record(answers)
+        except Exception:
+            current_app.logger.exception('Error updating leaderboards')
+    pending = session.info.pop(PENDING_TASKRUNS, None)
+    if not pending:
+        return
+    try:
+        with db.engine.begin() as conn:
+            process_taskrun_events(conn, pending)
+    except Exception:
+        current_app.logger.exception('Error processing task run events')
+
+
+@event.listens_for(Session, 'after_rollback')
+def on_taskruns_rollback(session):
+    """Drop the side effects of the task runs rolled back."""
+    session.info.pop(PENDING_TASKRUNS, None)
+    session.info.pop(PENDING_ANSWERS, None)
+
+
+def process_taskrun_events(conn, pending):
+    """Update the feed, create the results and push the webhooks of the
+    task runs submitted, given per task as queued by on_taskrun_submit."""
+    sql_query = text('''SELECT id, name, short_name, webhook, info
+                     FROM project WHERE id = ANY(:project_ids)''')
+    project_ids = list(set(task_event['project_id']
+                           for task_event in pending.itervalues()))
+    projects = dict()
+    for r in conn.execute(sql_query, project_ids=project_ids):
+        tmp = dict(id=r.id, name=r.name, short_name=r.short_name,
+                   info=r.info)
+        project_public = Project().to_public_json(tmp)
+        project_public['action_updated'] = 'TaskCompleted'
+        projects[r.id] = (project_public, r.webhook)
+
+    contributions = set()
+    completed = dict()
+    for task_id, task_event in sorted(pending.iteritems()):
+        project_id = task_event['project_id']
+        if project_id not in projects:
+            continue
+        for user_id in task_event['user_ids']:
+            contributions.add((user_id, project_id))
+        if task_event['completed']:
+            completed.setdefault(project_id, []).append(task_id)
+
+    for user_id, project_id in contributions:
+        add_user_contributed_to_feed(conn, user_id, projects[project_id][0])
+    for project_id, task_ids in completed.iteritems():
+        project_public, webhook = projects[project_id]
         update_feed(project_public)
-        result_id = create_result(conn, target.project_id, target.task_id)
-        project_private = dict()
-        project_private.update(project_public)
-        project_private['webhook'] = _webhook
-        push_webhook(project_private, target.task_id, result_id)
+        project_private = dict(project_public, webhook=webhook)
+        for task_id in task_ids:
+            result_id = create_result(conn, project_id, task_id)
+            push_webhook(project_private, task_id, result_id)
 
 
 @event.listens_for(Blogpost, 'after_insert')
@@ -261,6 +341,24 @@ def update_project(mapper, conn, target):
     update_project_timestamp(mapper, conn, target)
 
 
+@event.listens_for(Project, 'after_insert')
+@event.listens_for(Blogpost, 'after_insert')
+@event.listens_for(Blogpost, 'after_update')
+@event.listens_for(Task, 'after_insert')
+@event.listens_for(Task, 'after_update')
+@event.listens_for(Task, 'after_delete')
+@event.listens_for(TaskRun, 'after_insert')
+@event.listens_for(TaskRun, 'after_delete')
+def mark_project_stats_dirty(mapper, conn, target):
+    """Queue the stats of the project written to for a refresh, once
+    committed."""
+    project_id = target.id if isinstance(target, Project) \
+        else target.project_id
+    n_writes = object_session(target).info.setdefault(PENDING_DIRTY_PROJECTS,
+                                                      {})
+    n_writes[project_id] = n_writes.get(project_id, 0) + 1
+
+
 @event.listens_for(Webhook, 'after_update')
 def update_timestamp(mapper, conn, target):
     """Update domain object with timestamp."""
@@ -287,14 +385,156 @@ def create_zero_counter(mapper, conn, target):
 
 @event.listens_for(TaskRun, 'after_insert')
 def increase_task_counter(mapper, conn, target):
-    sql_query = ("insert into counter(created, project_id, task_id, n_task_runs) \
-                 VALUES (TIMESTAMP '%s', %s, %s, 1)"
-                 % (make_timestamp(), target.project_id, target.task_id))
-    conn.execute(sql_query)
+    sql_query = text('''update counter set n_task_runs = n_task_runs + 1,
+                     first_finish_time = least(first_finish_time,
+                                               cast(:finish_time as text)),
+                     last_finish_time = greatest(last_finish_time,
+                                                 cast(:finish_time as text))
+                     where task_id=:task_id''')
+    conn.execute(sql_query, task_id=target.task_id,
+                 finish_time=target.finish_time)
 
 @event.listens_for(TaskRun, 'after_delete')
 def decrease_task_counter(mapper, conn, target):
-    sql_query = ("insert into counter(created, project_id, task_id, n_task_runs) \
-                 VALUES (TIMESTAMP '%s', %s, %s, -1)"
-                 % (make_timestamp(), target.project_id, target.task_id))
-    conn.execute(sql_query)
+    sql_query = text('''update counter set n_task_runs = n_task_runs - 1,
+                     first_finish_time = times.first_finish_time,
+                     last_finish_time = times.last_finish_time
+                     from (select min(finish_time) as first_finish_time,
+                           max(finish_time) as last_finish_time
+                           from task_run where task_id=:task_id) as times
+                     where task_id=:task_id''')
+    conn.execute(sql_query, task_id=target.task_id)
+    if target.finish_time:
+        hours = object_session(target).info.setdefault(PENDING_HOURLY_STATS,
+                                                       {})
+        hours.setdefault(target.project_id, set()).add(
+            target.finish_time[:13])
+
+
+@event.listens_for(Session, 'after_flush')
+def recount_deleted_task_runs(session, flush_context):
+    """Count again the hours of the hourly stats of the task runs deleted
+    in the flush, once per hour."""
+    hours = session.info.pop(PENDING_HOURLY_STATS, None)
+    if not hours:
+        return
+    conn = session.connection()
+    for project_id, project_hours in hours.iteritems():
+        recount_hourly_stats(conn, project_id, project_hours)
+
+
+def queue_ready_task_change(target, method, *args):
+    """Queue a change of the ready task queue of the project of target, to
+    be applied once committed."""
+    changes = object_session(target).info.setdefault(PENDING_READY_TASKS, [])
+    changes.append((method, args))
+
+
+@event.listens_for(Task, 'after_insert')
+def add_ready_task(mapper, conn, target):
+    """Add a new task to the ready task queue of its project."""
+    queue_ready_task_change(target, 'add', target.project_id, target.id,
+                            target.priority_0, target.n_answers)
+
+
+@event.listens_for(Task, 'after_update')
+def update_ready_task(mapper, conn, target):
+    """Drop the ready task queue when a task scheduling data changes."""
+    state = inspect(target)
+    if any(state.attrs[attr].history.has_changes()
+           for attr in ('priority_0', 'n_answers', 'state')):
+        queue_ready_task_change(target, 'invalidate', target.project_id)
+
+
+@event.listens_for(Task, 'after_delete')
+def remove_ready_task(mapper, conn, target):
+    """Remove a deleted task from the ready task queue."""
+    queue_ready_task_change(target, 'remove', target.project_id, target.id)
+
+
+@event.listens_for(TaskRun, 'after_insert')
+def answer_ready_task(mapper, conn, target):
+    """Update the remaining answers of a task in the ready task queue."""
+    queue_ready_task_change(target, 'answer', target.project_id,
+                            target.task_id)
+
+
+@event.listens_for(TaskRun, 'after_delete')
+def reset_ready_tasks(mapper, conn, target):
+    """Drop the ready task queue, as a task may need answers again."""
+    queue_ready_task_change(target, 'invalidate', target.project_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def on_ready_tasks_commit(session):
+    """Apply the ready task queue changes just committed."""
+    changes = session.info.pop(PENDING_READY_TASKS, None)
+    if not changes:
+        return
+    for method, args in changes:
+        try:
+            getattr(ready_tasks, method)(*args)
+        except Exception:
+            current_app.logger.exception('Error updating ready task queues')
+            # A queue missing a change could skip tasks, drop it instead
+            try:
+                ready_tasks.invalidate(args[0])
+            except Exception:
+                pass
+
+
+@event.listens_for(Session, 'after_rollback')
+def on_ready_tasks_rollback(session):
+    """Drop the ready task queue changes rolled back."""
+    session.info.pop(PENDING_READY_TASKS, None)
+
+
+def queue_leaderboard_change(target, method, arg):
+    """Queue a change of the leaderboards, to be applied once committed."""
+    changes = object_session(target).info.setdefault(PENDING_LEADERBOARDS, [])
+    changes.append((method, arg))
+
+
+@event.listens_for(TaskRun, 'after_delete')
+def reset_project_leaderboard(mapper, conn, target):
+    """Drop the leaderboard of the project of a deleted answer. The site
+    and week ones are fixed by the leaderboard job."""
+    queue_leaderboard_change(target, 'invalidate',
+                             project_scope(target.project_id))
+
+
+@event.listens_for(User, 'after_insert')
+def add_leaderboard_user(mapper, conn, target):
+    """Rank a new user in the site leaderboard."""
+    queue_leaderboard_change(target, 'add_user', target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def remove_leaderboard_user(mapper, conn, target):
+    """Remove a deleted user from the site leaderboard."""
+    queue_leaderboard_change(target, 'remove_user', target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def on_stats_commit(session):
+    """Mark the stats of the projects written to as dirty and update the
+    leaderboards, each in a single pipeline."""
+    n_writes = session.info.pop(PENDING_DIRTY_PROJECTS, None)
+    if n_writes:
+        try:
+            dirty_projects.mark_many(n_writes)
+        except Exception:
+            current_app.logger.exception('Error marking dirty projects')
+    changes = session.info.pop(PENDING_LEADERBOARDS, None)
+    if changes:
+        try:
+            leaderboards.apply(changes)
+        except Exception:
+            current_app.logger.exception('Error updating leaderboards')
+
+
+@event.listens_for(Session, 'after_rollback')
+def on_stats_rollback(session):
+    """Drop the stats changes rolled back."""
+    session.info.pop(PENDING_DIRTY_PROJECTS, None)
+    session.info.pop(PENDING_LEADERBOARDS, None)
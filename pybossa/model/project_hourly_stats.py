@@ -0,0 +1,56 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+
+from sqlalchemy import Integer, Text
+from sqlalchemy.schema import Column, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSON, ARRAY
+
+from pybossa.core import db
+from pybossa.model import DomainObject
+
+
+class ProjectHourlyStats(db.Model, DomainObject):
+    '''The task runs of a Project finished within one hour.
+
+    Rows are filled incrementally from the task runs saved since the last
+    update, and read by the project stats instead of the task_run table.
+    '''
+
+    __tablename__ = 'project_hourly_stats'
+    __table_args__ = (UniqueConstraint('project_id', 'hour'), )
+
+    #: ID
+    id = Column(Integer, primary_key=True)
+    #: Project ID
+    project_id = Column(Integer, ForeignKey('project.id', ondelete='CASCADE'),
+                        nullable=False)
+    #: Hour of the finish_time of the task runs, as YYYY-MM-DDTHH
+    hour = Column(Text, nullable=False)
+    #: Number of anonymous task runs
+    n_anon = Column(Integer, default=0, nullable=False)
+    #: Number of authenticated task runs
+    n_auth = Column(Integer, default=0, nullable=False)
+    #: Number of task runs of each anonymous user, by IP
+    anon_users = Column(JSON, default=dict)
+    #: Number of task runs of each authenticated user, by user ID
+    auth_users = Column(JSON, default=dict)
+    #: Highest TaskRun.ID counted in this hour
+    last_task_run_id = Column(Integer, default=0, nullable=False)
+    #: IDs of the task runs counted in this hour that are read again by the
+    #: next update, see HOURLY_STATS_RESCAN
+    task_run_ids = Column(ARRAY(Integer), default=list)
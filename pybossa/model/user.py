@@ -105,3 +105,60 @@ class User(db.Model, DomainObject, UserMixin):
             return list(set(default).union(set(extra)))
         else:
             return default
+
+
+class APIKeyUser(object):
+
+    """User authenticated with an API key.
+
+    Its id and flags come from the API key cache. The User row is only
+    loaded the first time any other attribute is needed; it then replaces
+    the proxy as the request user, so that current_user is a real User for
+    the rest of the request. If the row was deleted meanwhile, the user is
+    treated as anonymous from then on.
+    """
+
+    def __init__(self, id, enabled, admin, subadmin, api_key=None):
+        self.id = id
+        self.enabled = enabled
+        self.admin = admin
+        self.subadmin = subadmin
+        self._api_key = api_key
+        self._user = None
+        self._anonymous = False
+
+    def is_authenticated(self):
+        return not self._anonymous
+
+    def is_active(self):
+        return not self._anonymous
+
+    def is_anonymous(self):
+        return self._anonymous
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if self._user is None and not self._anonymous:
+            self._user = User.query.get(self.id)
+            if self._user is None:
+                self._become_anonymous()
+            else:
+                self._replace_request_user()
+        if self._anonymous:
+            return None
+        return getattr(self._user, name)
+
+    def _replace_request_user(self):
+        from flask import _request_ctx_stack
+        top = _request_ctx_stack.top
+        if top is not None and getattr(top, 'user', None) is self:
+            top.user = self._user
+
+    def _become_anonymous(self):
+        if self._api_key:
+            from pybossa.cache.users import delete_api_key_owner
+            delete_api_key_owner(self._api_key)
+        self._anonymous = True
+        self.id = None
+        self.enabled = self.admin = self.subadmin = False
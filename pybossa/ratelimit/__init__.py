@@ -24,32 +24,58 @@ This module exports:
     * ratelimit decorator: for decorating the views
 
 """
+import threading
 import time
 from functools import update_wrapper, wraps
 from flask import request, g
 from werkzeug.exceptions import TooManyRequests
-from pybossa.core import sentinel
+from pybossa.core import sentinel, ratelimits
 from pybossa.error import ErrorStatus
 from flask.ext.login import current_user
 from flask import current_app
 
 error = ErrorStatus()
 
+# Sliding window counter: the hits of the previous window are weighted by
+# the part of it that still falls within the sliding window.
+#
+# KEYS[1] counter of the current window
+# KEYS[2] counter of the previous window
+# ARGV[1] hits to add
+# ARGV[2] weight of the previous window, in thousandths
+# ARGV[3] expiration timestamp of the current window counter
+SLIDING_WINDOW_SCRIPT = """
+local current = redis.call('INCRBY', KEYS[1], ARGV[1])
+redis.call('EXPIREAT', KEYS[1], ARGV[3])
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+return current + math.floor(previous * tonumber(ARGV[2]) / 1000)
+"""
+
+_sliding_window = None
+
+# Hits not sent to Redis yet, by counter key: (last count, pending hits)
+_local_hits = {}
+_local_lock = threading.Lock()
+MAX_LOCAL_KEYS = 10000
+
 
 class RateLimit(object):
 
     """
     Limit the number of requests.
 
-    It uses a Redis pipe from the master node (configured via Sentinel) to
-    limit the number of requests.
+    It counts the requests in a sliding window with a Lua script run on the
+    master node (configured via Sentinel), with a single round trip. If
+    RATE_LIMIT_LOCAL_BATCH is set, clients far below their limit are
+    counted in process and sent to Redis in batches of that size.
 
     """
 
     expiration_window = 10
 
-    def __init__(self, key_prefix, limit, per, send_x_headers):
-        self.reset = (int(time.time()) // per) * per + per
+    def __init__(self, key_prefix, limit, per, send_x_headers, hits=1):
+        now = time.time()
+        self.reset = (int(now) // per) * per + per
         self.key = key_prefix + str(self.reset)
         self.limit = limit
         self.per = per
@@ -58,15 +84,42 @@ class RateLimit(object):
         if not current_user.is_anonymous() and current_user.admin:
             self.limit *= current_app.config.get("ADMIN_RATE_MULTIPLIER", 1)
 
-        p = sentinel.master.pipeline()
-        p.incr(self.key)
-        p.expireat(self.key, self.reset + self.expiration_window)
-
-        self.current = min(p.execute()[0], limit)
+        previous_key = key_prefix + str(self.reset - per)
+        weight = int(1000 * (self.reset - now) / per)
+        # Capped at the limit before the admin multiplier, as it always was
+        self.current = min(self._hit(previous_key, weight, hits), limit)
 
     remaining = property(lambda x: x.limit - x.current)
     over_limit = property(lambda x: x.current >= x.limit)
 
+    def _hit(self, previous_key, weight, hits):
+        batch = current_app.config.get('RATE_LIMIT_LOCAL_BATCH', 0)
+        if not batch:
+            return self._send(previous_key, weight, hits)
+        with _local_lock:
+            count, pending = _local_hits.pop(self.key, (None, 0))
+            pending += hits
+            if (count is not None and pending < batch and
+                    count + pending < self.limit // 2):
+                _local_hits[self.key] = (count, pending)
+                return count + pending
+        count = self._send(previous_key, weight, pending)
+        with _local_lock:
+            if len(_local_hits) >= MAX_LOCAL_KEYS:
+                _local_hits.clear()
+            _local_hits[self.key] = (count, 0)
+        return count
+
+    def _send(self, previous_key, weight, hits):
+        global _sliding_window
+        if _sliding_window is None:
+            _sliding_window = sentinel.master.register_script(
+                SLIDING_WINDOW_SCRIPT)
+        expireat = self.reset + self.per + self.expiration_window
+        return _sliding_window(keys=[self.key, previous_key],
+                               args=[hits, weight, expireat],
+                               client=sentinel.master)
+
 
 def get_view_rate_limit():
     """Return the rate limit values."""
@@ -76,19 +129,28 @@ def get_view_rate_limit():
 def ratelimit(limit, per, send_x_headers=True,
               scope_func=lambda: request.remote_addr,
               key_func=lambda: request.endpoint,
-              path=lambda: request.path):
+              path=lambda: request.path,
+              hits_func=lambda: 1):
     """
     Decorator for limiting the access to a route.
 
-    Returns the function if within the limit, otherwise TooManyRequests error
+    The limit and period can be set per endpoint with the RATE_LIMITS
+    setting. A request counts as the number of hits returned by hits_func.
+    Returns the function if within the limit, otherwise TooManyRequests
+    error
 
     """
     def decorator(f):
         @wraps(f)
         def rate_limited(*args, **kwargs):
             try:
-                key = 'rate-limit/%s/%s/' % (key_func(), scope_func())
-                rlimit = RateLimit(key, limit, per, send_x_headers)
+                endpoint = key_func()
+                endpoint_limit, endpoint_per = \
+                    ratelimits.get('ENDPOINTS', {}).get(endpoint,
+                                                        (limit, per))
+                key = 'rate-limit/%s/%s/' % (endpoint, scope_func())
+                rlimit = RateLimit(key, endpoint_limit, endpoint_per,
+                                   send_x_headers, hits_func())
                 g._view_rate_limit = rlimit
                 #if over_limit is not None and rlimit.over_limit:
                 if rlimit.over_limit:
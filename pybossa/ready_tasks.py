@@ -0,0 +1,325 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""Per-project queue of the tasks that still need answers.
+
+Tasks are kept in a Redis sorted set in the same order the locked scheduler
+uses (priority_0 DESC, id ASC): the score is the negated priority and the
+member is the zero padded task id, so ties are sorted by id. A hash next to
+it holds the number of answers each task still needs; a task leaves the
+queue when it reaches zero.
+
+The queue is built lazily from SQL, by a job scheduled on the first read,
+and only updated incrementally while it is built, so dropping it is always
+safe. While it is rebuilt, the tasks written to are recorded instead, and read again from
+SQL before the new queue is swapped in.
+"""
+import uuid
+
+# Records a task written to while the queue is rebuilt. Returns 1 if the
+# queue is built, so that the caller goes on updating it.
+# KEYS: built flag, queue, remaining answers, rebuild lock, touched tasks
+TRACK_REBUILD = """
+local function built_or_track(member)
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return 1
+    end
+    if redis.call('EXISTS', KEYS[4]) == 1 then
+        redis.call('SADD', KEYS[5], member)
+        redis.call('EXPIRE', KEYS[5], redis.call('TTL', KEYS[4]))
+    end
+    return 0
+end
+"""
+
+# Adds or updates a task in a built queue.
+# ARGV: score, member, remaining answers
+ADD_SCRIPT = TRACK_REBUILD + """
+if built_or_track(ARGV[2]) == 0 then
+    return 0
+end
+if tonumber(ARGV[3]) <= 0 then
+    redis.call('ZREM', KEYS[2], ARGV[2])
+    redis.call('HDEL', KEYS[3], ARGV[2])
+    return 1
+end
+local ttl = redis.call('TTL', KEYS[1])
+redis.call('ZADD', KEYS[2], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[3], ARGV[2], ARGV[3])
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[2], ttl)
+    redis.call('EXPIRE', KEYS[3], ttl)
+end
+return 1
+"""
+
+# Records a new answer for a task of a built queue.
+# ARGV: member
+ANSWER_SCRIPT = TRACK_REBUILD + """
+if built_or_track(ARGV[1]) == 0 then
+    return 0
+end
+if redis.call('HEXISTS', KEYS[3], ARGV[1]) == 0 then
+    return 0
+end
+if redis.call('HINCRBY', KEYS[3], ARGV[1], -1) <= 0 then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('HDEL', KEYS[3], ARGV[1])
+end
+return 1
+"""
+
+# Removes a task from a built queue.
+# ARGV: member
+REMOVE_SCRIPT = TRACK_REBUILD + """
+if built_or_track(ARGV[1]) == 0 then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+return 1
+"""
+
+# Drops the queue, and any queue being rebuilt.
+INVALIDATE_SCRIPT = TRACK_REBUILD + """
+redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+built_or_track('*')
+return 1
+"""
+
+# Keeps the rebuild lock while it is owned. Returns 0 if it was lost.
+# KEYS: rebuild lock, new queue, new remaining answers
+# ARGV: token, ttl
+EXTEND_REBUILD_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+return 1
+"""
+
+# Drops a rebuilt queue, and the rebuild lock while it is owned.
+# KEYS: rebuild lock, new queue, new remaining answers
+# ARGV: token
+RELEASE_REBUILD_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+redis.call('DEL', KEYS[2], KEYS[3])
+return 1
+"""
+
+# Swaps a rebuilt queue in, unless tasks were written to since the last
+# call: those are returned and cleared instead, to be read again. Returns
+# nil, and drops the rebuilt queue, if the rebuild lock was lost or the
+# queue was invalidated meanwhile.
+# KEYS: built flag, queue, remaining answers, rebuild lock, touched tasks,
+#       new queue, new remaining answers
+# ARGV: ttl, token
+FINISH_REBUILD_SCRIPT = """
+if redis.call('GET', KEYS[4]) ~= ARGV[2] then
+    redis.call('DEL', KEYS[6], KEYS[7])
+    return false
+end
+if redis.call('SISMEMBER', KEYS[5], '*') == 1 then
+    redis.call('DEL', KEYS[4], KEYS[5], KEYS[6], KEYS[7])
+    return false
+end
+local touched = redis.call('SMEMBERS', KEYS[5])
+if #touched > 0 then
+    redis.call('DEL', KEYS[5])
+    return touched
+end
+redis.call('DEL', KEYS[2], KEYS[3])
+if redis.call('EXISTS', KEYS[6]) == 1 then
+    redis.call('RENAME', KEYS[6], KEYS[2])
+    redis.call('RENAME', KEYS[7], KEYS[3])
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+    redis.call('EXPIRE', KEYS[3], ARGV[1])
+end
+redis.call('SETEX', KEYS[1], ARGV[1], 1)
+redis.call('DEL', KEYS[4])
+return {}
+"""
+
+
+class ReadyTaskQueue(object):
+
+    QUEUE_KEY = 'pybossa:project:ready_tasks:{0}'
+    REMAINING_KEY = 'pybossa:project:ready_tasks:remaining:{0}'
+    BUILT_KEY = 'pybossa:project:ready_tasks:built:{0}'
+    REBUILD_LOCK_KEY = 'pybossa:project:ready_tasks:rebuilding:{0}'
+    TOUCHED_KEY = 'pybossa:project:ready_tasks:touched:{0}'
+    NEW_QUEUE_KEY = 'pybossa:project:ready_tasks:new:{0}:{1}'
+    NEW_REMAINING_KEY = 'pybossa:project:ready_tasks:remaining:new:{0}:{1}'
+    TTL = 24 * 60 * 60
+    #: The lock is kept while the rebuild writes batches, and must outlast
+    #: the wait of the rebuild job in its queue
+    REBUILD_LOCK_TTL = 5 * 60
+    REBUILD_ROUNDS = 5
+    BATCH_SIZE = 1000
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+        self._add_script = redis_conn.register_script(ADD_SCRIPT)
+        self._answer_script = redis_conn.register_script(ANSWER_SCRIPT)
+        self._remove_script = redis_conn.register_script(REMOVE_SCRIPT)
+        self._invalidate_script = redis_conn.register_script(
+            INVALIDATE_SCRIPT)
+        self._extend_rebuild_script = redis_conn.register_script(
+            EXTEND_REBUILD_SCRIPT)
+        self._release_rebuild_script = redis_conn.register_script(
+            RELEASE_REBUILD_SCRIPT)
+        self._finish_rebuild_script = redis_conn.register_script(
+            FINISH_REBUILD_SCRIPT)
+
+    def is_built(self, project_id):
+        """Check if the queue of a project can be read."""
+        return bool(self.conn.exists(self.BUILT_KEY.format(project_id)))
+
+    def add(self, project_id, task_id, priority, remaining):
+        """Add a task to the queue of a project, or update it if already
+        there. Does nothing if the queue is not built.
+        """
+        return bool(self._add_script(keys=self._keys(project_id),
+                                     args=[self._score(priority),
+                                           self._member(task_id),
+                                           remaining]))
+
+    def answer(self, project_id, task_id):
+        """Record a new answer for a task, removing it from the queue once
+        it does not need any more answers.
+        """
+        return bool(self._answer_script(keys=self._keys(project_id),
+                                        args=[self._member(task_id)]))
+
+    def remove(self, project_id, task_id):
+        """Remove a task from the queue of a project."""
+        return bool(self._remove_script(keys=self._keys(project_id),
+                                        args=[self._member(task_id)]))
+
+    def invalidate(self, project_id):
+        """Drop the queue of a project, so that it is rebuilt on next read."""
+        self._invalidate_script(keys=self._keys(project_id))
+
+    def acquire_rebuild(self, project_id):
+        """Ensure a single client rebuilds the queue of a project at a time.
+
+        Returns the token to rebuild the queue with, or None if it is
+        already being rebuilt.
+        """
+        key = self.REBUILD_LOCK_KEY.format(project_id)
+        token = uuid.uuid4().hex
+        if self.conn.set(key, token, nx=True, ex=self.REBUILD_LOCK_TTL):
+            return token
+        return None
+
+    def rebuild(self, project_id, tasks, refresh=None, token=None):
+        """Replace the queue of a project.
+
+        The writes made to the queue from the time the rebuild is acquired
+        are not lost: the tasks written to are read again with refresh and
+        updated in the new queue before it is swapped in. Returns False if
+        the queue was left unbuilt, because it was invalidated meanwhile,
+        kept being written to or the rebuild lock was lost.
+
+        :param tasks: iterable of (task_id, priority_0, remaining answers)
+        :param refresh: callable returning the same tuples for a list of
+            task ids, leaving out the tasks not needing answers any more
+        :param token: returned by acquire_rebuild. The rebuild is acquired
+            here if not given.
+        """
+        lock_key = self.REBUILD_LOCK_KEY.format(project_id)
+        if token is None:
+            token = uuid.uuid4().hex
+            self.conn.set(lock_key, token, ex=self.REBUILD_LOCK_TTL)
+        new_queue_key = self.NEW_QUEUE_KEY.format(project_id, token)
+        new_remaining_key = self.NEW_REMAINING_KEY.format(project_id, token)
+        new_keys = [lock_key, new_queue_key, new_remaining_key]
+        if not self._write_tasks(new_keys, token, tasks):
+            self._release_rebuild_script(keys=new_keys, args=[token])
+            return False
+        keys = self._keys(project_id) + [new_queue_key, new_remaining_key]
+        for _ in range(self.REBUILD_ROUNDS):
+            touched = self._finish_rebuild_script(keys=keys,
+                                                  args=[self.TTL, token])
+            if touched is None:
+                return False
+            if not touched:
+                return True
+            if refresh is None:
+                break
+            members = list(touched)
+            pipeline = self.conn.pipeline()
+            pipeline.zrem(new_queue_key, *members)
+            pipeline.hdel(new_remaining_key, *members)
+            pipeline.execute()
+            tasks = refresh([int(member) for member in members])
+            if not self._write_tasks(new_keys, token, tasks):
+                break
+        self._release_rebuild_script(keys=new_keys, args=[token])
+        return False
+
+    def get_task_ids(self, project_id, offset=0, limit=10):
+        """Return ids of the tasks needing answers, in scheduling order."""
+        members = self.conn.zrange(self.QUEUE_KEY.format(project_id),
+                                   offset, offset + limit - 1)
+        return [int(member) for member in members]
+
+    def _write_tasks(self, keys, token, tasks):
+        """Write tasks to the new queue, a batch at a time, keeping the
+        rebuild lock after each one. Returns False if it was lost."""
+        scores = []
+        remaining = {}
+        for task_id, priority, n_remaining in tasks:
+            if n_remaining <= 0:
+                continue
+            member = self._member(task_id)
+            scores.extend([self._score(priority), member])
+            remaining[member] = n_remaining
+            if len(remaining) >= self.BATCH_SIZE:
+                if not self._write_batch(keys, token, scores, remaining):
+                    return False
+                scores = []
+                remaining = {}
+        return self._write_batch(keys, token, scores, remaining)
+
+    def _write_batch(self, keys, token, scores, remaining):
+        _, queue_key, remaining_key = keys
+        pipeline = self.conn.pipeline(transaction=False)
+        if remaining:
+            pipeline.zadd(queue_key, *scores)
+            pipeline.hmset(remaining_key, remaining)
+        self._extend_rebuild_script(keys=keys,
+                                    args=[token, self.REBUILD_LOCK_TTL],
+                                    client=pipeline)
+        return bool(pipeline.execute()[-1])
+
+    def _keys(self, project_id):
+        return [self.BUILT_KEY.format(project_id),
+                self.QUEUE_KEY.format(project_id),
+                self.REMAINING_KEY.format(project_id),
+                self.REBUILD_LOCK_KEY.format(project_id),
+                self.TOUCHED_KEY.format(project_id)]
+
+    def _score(self, priority):
+        return repr(-float(priority or 0))
+
+    def _member(self, task_id):
+        return '%012d' % int(task_id)
@@ -0,0 +1,175 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""Realtime site statistics kept in Redis.
+
+Every answer is counted in per-minute buckets, by finish time: a sorted set
+with the answers of each project, another with the answers of each
+authenticated user, and a HyperLogLog with the users and anonymous IPs that
+contributed. The buckets expire once they leave the window.
+
+A window is read by merging its buckets. The merge of the complete minutes
+is kept until the minute changes, so a read only merges it with the bucket
+of the current minute.
+
+The total number of answers is seeded from SQL and then incremented on each
+answer until it expires, so it is recounted once a day.
+"""
+import calendar
+import time
+from datetime import datetime
+
+import dateutil.parser
+
+# Records an answer.
+# KEYS: projects bucket, users bucket, contributors bucket, total answers
+# ARGV: bucket ttl, project id, user id, contributor
+RECORD_SCRIPT = """
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    redis.call('INCR', KEYS[4])
+end
+if tonumber(ARGV[1]) <= 0 then
+    return 0
+end
+redis.call('ZINCRBY', KEYS[1], 1, ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+if ARGV[3] ~= '' then
+    redis.call('ZINCRBY', KEYS[2], 1, ARGV[3])
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+end
+redis.call('PFADD', KEYS[3], ARGV[4])
+redis.call('EXPIRE', KEYS[3], ARGV[1])
+return 1
+"""
+
+# Returns the top members of a window with their scores.
+# KEYS: merge of the complete minutes, current bucket, scratch key
+# ARGV: number of members
+TOP_SCRIPT = """
+redis.call('ZUNIONSTORE', KEYS[3], 2, KEYS[1], KEYS[2])
+local top = redis.call('ZREVRANGE', KEYS[3], 0, tonumber(ARGV[1]) - 1,
+                       'WITHSCORES')
+redis.call('DEL', KEYS[3])
+return top
+"""
+
+
+class RealtimeStats(object):
+
+    PROJECTS_KEY = 'pybossa:site_stats:projects:{0}'
+    USERS_KEY = 'pybossa:site_stats:users:{0}'
+    CONTRIBUTORS_KEY = 'pybossa:site_stats:contributors:{0}'
+    SCRATCH_KEY = 'pybossa:site_stats:scratch'
+    TASK_RUNS_KEY = 'pybossa:site_stats:n_task_runs'
+    WINDOW = 24 * 60
+    WINDOW_TTL = 2 * 60
+    TASK_RUNS_TTL = 24 * 60 * 60
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+        self._record_script = redis_conn.register_script(RECORD_SCRIPT)
+        self._top_script = redis_conn.register_script(TOP_SCRIPT)
+
+    def record(self, answers):
+        """Count answers in the realtime stats.
+
+        :param answers: iterable of (project_id, user_id, user_ip,
+                        finish_time)
+        """
+        now = self._minute()
+        pipeline = self.conn.pipeline()
+        for project_id, user_id, user_ip, finish_time in answers:
+            minute = self._minute(finish_time)
+            ttl = (minute - now + self.WINDOW) * 60
+            if user_id is not None:
+                contributor = 'user:%s' % user_id
+            else:
+                contributor = 'ip:%s' % user_ip
+            keys = [self.PROJECTS_KEY.format(minute),
+                    self.USERS_KEY.format(minute),
+                    self.CONTRIBUTORS_KEY.format(minute),
+                    self.TASK_RUNS_KEY]
+            args = [ttl, project_id, '' if user_id is None else user_id,
+                    contributor]
+            self._record_script(keys=keys, args=args, client=pipeline)
+        pipeline.execute()
+
+    def top_projects(self, n=5):
+        """Return (project_id, n_answers) of the n projects with more
+        answers in the window."""
+        return self._top(self.PROJECTS_KEY, n)
+
+    def top_users(self, n=5):
+        """Return (user_id, n_answers) of the n authenticated users with
+        more answers in the window."""
+        return self._top(self.USERS_KEY, n)
+
+    def n_active_users(self):
+        """Return the number of users and anonymous IPs that contributed in
+        the window."""
+        now = self._minute()
+        window_key = self._window(self.CONTRIBUTORS_KEY, now)
+        return self.conn.execute_command('PFCOUNT', window_key,
+                                         self.CONTRIBUTORS_KEY.format(now))
+
+    def n_task_runs(self):
+        """Return the number of answers of the site, or None if not seeded."""
+        n_task_runs = self.conn.get(self.TASK_RUNS_KEY)
+        if n_task_runs is not None:
+            return int(n_task_runs)
+
+    def seed_task_runs(self, n_task_runs):
+        """Set the number of answers of the site if not already set."""
+        self.conn.set(self.TASK_RUNS_KEY, n_task_runs, nx=True,
+                      ex=self.TASK_RUNS_TTL)
+
+    def _top(self, bucket_key, n):
+        now = self._minute()
+        window_key = self._window(bucket_key, now)
+        top = self._top_script(keys=[window_key, bucket_key.format(now),
+                                     self.SCRATCH_KEY],
+                               args=[n])
+        return [(int(member), int(float(score)))
+                for member, score in zip(top[::2], top[1::2])]
+
+    def _window(self, bucket_key, now):
+        """Return the key of the merge of the complete minutes of the window,
+        merging them if not done yet in this minute."""
+        window_key = bucket_key.format('window:%d' % now)
+        if self.conn.exists(window_key):
+            return window_key
+        keys = [bucket_key.format(minute)
+                for minute in range(now - self.WINDOW + 1, now)]
+        pipeline = self.conn.pipeline()
+        if bucket_key == self.CONTRIBUTORS_KEY:
+            pipeline.execute_command('PFMERGE', window_key, *keys)
+        else:
+            pipeline.zunionstore(window_key, keys)
+        pipeline.expire(window_key, self.WINDOW_TTL)
+        pipeline.execute()
+        return window_key
+
+    def _minute(self, timestamp=None):
+        """Return the minute since the epoch of a UTC timestamp, or of
+        now."""
+        if timestamp is None:
+            return int(time.time()) // 60
+        if isinstance(timestamp, basestring):
+            timestamp = dateutil.parser.parse(timestamp)
+        elif not isinstance(timestamp, datetime):
+            timestamp = datetime.combine(timestamp, datetime.min.time())
+        return calendar.timegm(timestamp.utctimetuple()) // 60
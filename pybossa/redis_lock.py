@@ -1,9 +1,47 @@
 from time import time
-from datetime import timedelta
 
 
 ACTIVE_USER_KEY = 'gigwork:active_users_in_project:{}'
 
+# Sweeps expired entries of the lock hashes and grants locks on the first
+# available resources, all in a single atomic call.
+# KEYS: resource ids, one lock hash per resource
+# ARGV: client_id, now, expiration, duration, number of locks wanted,
+#       limit for each resource
+# Returns the 1-based indexes of the resources granted, in order.
+ACQUIRE_LOCK_SCRIPT = """
+local client_id = ARGV[1]
+local now = tonumber(ARGV[2])
+local expiration = ARGV[3]
+local duration = tonumber(ARGV[4])
+local wanted = tonumber(ARGV[5])
+local granted = {}
+for i, resource_id in ipairs(KEYS) do
+    if #granted >= wanted then
+        break
+    end
+    local limit = tonumber(ARGV[5 + i])
+    local locks = redis.call('HGETALL', resource_id)
+    local to_delete = {}
+    for j = 1, #locks, 2 do
+        if now > tonumber(locks[j + 1]) then
+            table.insert(to_delete, locks[j])
+        end
+    end
+    if #to_delete > 0 then
+        redis.call('HDEL', resource_id, unpack(to_delete))
+    end
+    if redis.call('HEXISTS', resource_id, client_id) == 1 then
+        table.insert(granted, i)
+    elseif redis.call('HLEN', resource_id) < limit then
+        redis.call('HSET', resource_id, client_id, expiration)
+        redis.call('EXPIRE', resource_id, duration)
+        table.insert(granted, i)
+    end
+end
+return granted
+"""
+
 
 def get_active_user_key(project_id):
     return ACTIVE_USER_KEY.format(project_id)
@@ -36,27 +74,53 @@ class LockManager(object):
     def __init__(self, cache, duration):
         self._cache = cache
         self._duration = duration
+        self._acquire_script = cache.register_script(ACQUIRE_LOCK_SCRIPT)
 
     def acquire_lock(self, resource_id, client_id, limit):
-        # TODO can lock access to hash
         """
-        Acquire a lock on a resource.
+        Acquire a lock on a resource. Expired locks are released, and the
+        lock is checked and granted atomically on the Redis server.
         :param resource_id: resource on which lock is needed
         :param client_id: id of client needing the lock
         :param limit: how many client can access the resource concurrently
         :return: True if lock was successfully acquired, else False
         """
+        return self.acquire_any_lock([resource_id], client_id,
+                                     [limit]) is not None
+
+    def acquire_any_lock(self, resource_ids, client_id, limits):
+        """
+        Acquire a lock on the first available resource of a list, trying
+        them in order within a single atomic call.
+        :param resource_ids: candidate resources on which lock is needed
+        :param client_id: id of client needing the lock
+        :param limits: how many clients can access each resource
+            concurrently, in the same order as resource_ids
+        :return: the resource id on which the lock was acquired, or None
+        """
+        acquired = self.acquire_locks(resource_ids, client_id, limits, 1)
+        return acquired[0] if acquired else None
+
+    def acquire_locks(self, resource_ids, client_id, limits, count):
+        """
+        Acquire locks on the first available resources of a list, trying
+        them in order within a single atomic call.
+        :param resource_ids: candidate resources on which lock is needed
+        :param client_id: id of client needing the locks
+        :param limits: how many clients can access each resource
+            concurrently, in the same order as resource_ids
+        :param count: maximum number of locks to acquire
+        :return: the resource ids on which locks were acquired, in order
+        """
+        if not resource_ids or count < 1:
+            return []
         timestamp = time()
         expiration = timestamp + self._duration
-        self._release_expired_locks(resource_id, timestamp)
-        if self._cache.hexists(resource_id, client_id):
-            return True
-        num_acquired = self._cache.hlen(resource_id)
-        if num_acquired < limit:
-            self._cache.hset(resource_id, client_id, expiration)
-            self._cache.expire(resource_id, timedelta(seconds=self._duration))
-            return True
-        return False
+        args = [client_id, repr(timestamp), repr(expiration),
+                int(self._duration), int(count)]
+        args.extend(limits)
+        indexes = self._acquire_script(keys=resource_ids, args=args)
+        return [resource_ids[index - 1] for index in indexes]
 
     def has_lock(self, resource_id, client_id):
         """
@@ -73,6 +137,20 @@ class LockManager(object):
         now = time()
         return expiration > now
 
+    def has_locks(self, resource_ids, client_id):
+        """
+        :param resource_ids: resources on which locks are being held
+        :param client_id: client id
+        :return: for each resource, True if client id holds a lock on it,
+        False otherwise
+        """
+        pipeline = self._cache.pipeline(transaction=False)
+        for resource_id in resource_ids:
+            pipeline.hget(resource_id, client_id)
+        now = time()
+        return [time_str is not None and float(time_str) > now
+                for time_str in pipeline.execute()]
+
     def release_lock(self, resource_id, client_id):
         """
         Release a lock. Note that the lock is not release immediately, rather
@@ -85,12 +163,14 @@ class LockManager(object):
         """
         self._cache.hset(resource_id, client_id, time() + 5)
 
-    def _release_expired_locks(self, resource_id, now):
-        locks = self._cache.hgetall(resource_id)
-        to_delete = []
-        for key, expiration in locks.iteritems():
-            expiration = float(expiration)
-            if now > expiration:
-                to_delete.append(key)
-        if to_delete:
-            self._cache.hdel(resource_id, *to_delete)
+    def release_locks(self, resource_ids, client_id):
+        """
+        Release several locks in a single round trip, see release_lock.
+        :param resource_ids: resources on which locks are being held
+        :param client_id: id of client holding the locks
+        """
+        expiration = time() + 5
+        pipeline = self._cache.pipeline(transaction=False)
+        for resource_id in resource_ids:
+            pipeline.hset(resource_id, client_id, expiration)
+        pipeline.execute()
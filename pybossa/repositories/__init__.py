@@ -39,13 +39,14 @@ PYBOSSA.
 """
 import json
 from pybossa.model.project import Project
-from sqlalchemy.sql import and_
-from sqlalchemy import cast, Text, func, desc
-from sqlalchemy.types import TIMESTAMP
+from sqlalchemy.sql import and_, or_
+from sqlalchemy import cast, Text, func, desc, tuple_
 from sqlalchemy.orm.base import _entity_descriptor
 
 class Repository(object):
 
+    YIELD_PER = 1000
+
     def __init__(self, db, language='english'):
         self.db = db
         self.language = language
@@ -143,46 +144,69 @@ class Repository(object):
         if orderby == 'fav_user_ids':
             n_favs = func.coalesce(func.array_length(model.fav_user_ids, 1), 0).label('n_favs')
             query = query.add_column(n_favs)
-        if orderby in ['created', 'updated', 'finish_time']:
             if descending:
-                query = query.order_by(desc(
-                                            cast(getattr(model,
-                                                         orderby),
-                                                 TIMESTAMP)))
+                query = query.order_by(desc("n_favs"))
             else:
-                query = query.order_by(cast(getattr(model, orderby), TIMESTAMP))
+                query = query.order_by("n_favs")
         else:
-            if orderby != 'fav_user_ids':
-                if descending:
-                    query = query.order_by(desc(getattr(model, orderby)))
-                else:
-                    query = query.order_by(getattr(model, orderby))
+            # Timestamps are not cast: a cast is not immutable in Postgres,
+            # so it cannot be indexed, and the ISO 8601 strings written by
+            # make_timestamp already sort like the dates they represent.
+            if descending:
+                query = query.order_by(desc(getattr(model, orderby)))
             else:
-                if descending:
-                    query = query.order_by(desc("n_favs"))
-                else:
-                    query = query.order_by("n_favs")
+                query = query.order_by(getattr(model, orderby))
+        if orderby != 'id':
+            # Break ties by id, so that pages do not overlap
+            query = query.order_by(desc(model.id) if descending else model.id)
         if last_id:
             query = query.limit(limit)
         else:
             query = query.limit(limit).offset(offset)
         return query
 
+    def _filter_after_cursor(self, query, model, orderby, descending, cursor):
+        """Return the query filtered to the items after the cursor.
+
+        The cursor is the (orderby value, id) pair of the last item of the
+        previous page. Timestamps are ISO 8601 strings, which sort like the
+        dates they represent, so the composite indexes on them can be used.
+        NULL values are sorted as Postgres does by default: last in
+        ascending order and first in descending order.
+        """
+        value, last_id = cursor
+        if orderby == 'id':
+            if descending:
+                return query.filter(model.id < last_id)
+            return query.filter(model.id > last_id)
+        column = getattr(model, orderby)
+        if value is None:
+            if descending:
+                return query.filter(or_(and_(column == None,
+                                             model.id < last_id),
+                                        column != None))
+            return query.filter(column == None, model.id > last_id)
+        key = tuple_(column, model.id)
+        bound = tuple_(value, last_id)
+        if descending:
+            return query.filter(key < bound)
+        return query.filter(or_(key > bound, column == None))
 
     def _filter_by(self, model, limit=None, offset=0, yielded=False,
                   last_id=None, fulltextsearch=None, desc=False,
-                  orderby='id', **filters):
+                  orderby='id', cursor=None, **filters):
         """Filter by using several arguments and ordering items."""
         query = self.create_context(filters, fulltextsearch, model)
         if last_id:
             query = query.filter(model.id > last_id)
-            query = self._set_orderby_desc(query, model, limit,
-                                           last_id, offset, desc, orderby)
-        else:
-            query = self._set_orderby_desc(query, model, limit,
-                                           last_id, offset, desc, orderby)
+        if cursor:
+            query = self._filter_after_cursor(query, model, orderby, desc,
+                                              cursor)
+        query = self._set_orderby_desc(query, model, limit,
+                                       last_id or cursor, offset, desc,
+                                       orderby)
         if yielded:
-            limit = limit or 1
+            limit = limit or self.YIELD_PER
             return query.yield_per(limit)
         return query.all()
 
@@ -45,6 +45,14 @@ class ResultRepository(Repository):
                               fulltextsearch,
                               desc, **filters)
 
+    def get_last_versions(self, task_ids):
+        if not task_ids:
+            return []
+        return self.db.session.query(Result)\
+                   .filter(Result.task_id.in_(task_ids),
+                           Result.last_version == True)\
+                   .order_by(Result.id).all()
+
     def update(self, result):
         self._validate_can_be('updated', result)
         try:
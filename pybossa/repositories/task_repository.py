@@ -16,19 +16,27 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
+from flask import current_app
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import cast, Date
 
 from pybossa.repositories import Repository
+from pybossa.model.project import Project
 from pybossa.model.task import Task
 from pybossa.model.task_run import TaskRun
 from pybossa.model import make_timestamp
 from pybossa.model.user import User
 from pybossa.exc import WrongObjectError, DBIntegrityError
 from pybossa.cache import projects as cached_projects
-from pybossa.core import uploader
+from pybossa.cache.project_stats import recount_hourly_stats
+from pybossa.core import uploader, sentinel
+from pybossa.ready_tasks import ReadyTaskQueue
+from pybossa.realtime_stats import RealtimeStats
+from pybossa.leaderboard.board import Leaderboard
+from pybossa.stats_scheduler import DirtyProjects
 from sqlalchemy import text
 from pybossa.cache.task_browse_helpers import get_task_filters
+from pybossa.feed import update_feed
 import json
 
 
@@ -40,6 +48,11 @@ class TaskRepository(Repository):
     def get_task(self, id):
         return self.db.session.query(Task).get(id)
 
+    def get_tasks(self, ids):
+        if not ids:
+            return []
+        return self.db.session.query(Task).filter(Task.id.in_(ids)).all()
+
     def get_task_by(self, **attributes):
         filters, _, _, _ = self.generate_query_from_keywords(Task, **attributes)
         return self.db.session.query(Task).filter(*filters).first()
@@ -102,6 +115,13 @@ class TaskRepository(Repository):
                                                     **attributes)
         return self.db.session.query(TaskRun).filter(*filters).first()
 
+    def get_task_runs_of_tasks(self, task_ids):
+        if not task_ids:
+            return []
+        return self.db.session.query(TaskRun)\
+                   .filter(TaskRun.task_id.in_(task_ids))\
+                   .order_by(TaskRun.id).all()
+
     def filter_task_runs_by(self, limit=None, offset=0, last_id=None,
                             yielded=False, fulltextsearch=None,
                             desc=False, **filters):
@@ -112,6 +132,17 @@ class TaskRepository(Repository):
         query_args, _, _, _ = self.generate_query_from_keywords(TaskRun, **filters)
         return self.db.session.query(TaskRun).filter(*query_args).count()
 
+    def get_answered_tasks(self, task_ids, user_id=None, user_ip=None):
+        """Return the (task id, external uid) pairs of the task runs of the
+        user, or the ip, for the given tasks."""
+        if not task_ids:
+            return set()
+        query = self.db.session.query(TaskRun.task_id, TaskRun.external_uid)\
+                    .filter(TaskRun.task_id.in_(task_ids),
+                            TaskRun.user_id == user_id,
+                            TaskRun.user_ip == user_ip)
+        return set((row.task_id, row.external_uid) for row in query)
+
     # Filter helpers
     def _filter_query(self, query, obj, limit, offset, last_id, yielded, desc):
         if last_id:
@@ -136,6 +167,8 @@ class TaskRepository(Repository):
             self.db.session.add(element)
             self.db.session.commit()
             cached_projects.clean_project(element.project_id)
+            if isinstance(element, Task):
+                cached_projects.delete_searchable_columns(element.project_id)
         except IntegrityError as e:
             self.db.session.rollback()
             raise DBIntegrityError(e)
@@ -146,6 +179,8 @@ class TaskRepository(Repository):
             self.db.session.merge(element)
             self.db.session.commit()
             cached_projects.clean_project(element.project_id)
+            if isinstance(element, Task):
+                cached_projects.delete_searchable_columns(element.project_id)
         except IntegrityError as e:
             self.db.session.rollback()
             raise DBIntegrityError(e)
@@ -162,14 +197,20 @@ class TaskRepository(Repository):
         self.db.session.execute(text('''
                    DELETE FROM result WHERE project_id=:project_id
                                       AND task_id=:task_id;'''), args)
-        self.db.session.execute(text('''
+        hours = self.db.session.execute(text('''
                    DELETE FROM task_run WHERE project_id=:project_id
-                                        AND task_id=:task_id;'''), args)
+                                        AND task_id=:task_id
+                   RETURNING left(finish_time, 13) AS hour;'''), args)
+        hours = set(row.hour for row in hours if row.hour)
         self.db.session.execute(text('''
                    DELETE FROM task WHERE project_id=:project_id
                                     AND id=:task_id;'''), args)
+        if hours:
+            recount_hourly_stats(self.db.session, project_id, hours)
         self.db.session.commit()
         cached_projects.clean(project_id)
+        self._reset_ready_tasks(project_id)
+        self._mark_stats_dirty(project_id)
 
     def delete_valid_from_project(self, project, force_reset=False, filters=None):
         if not force_reset:
@@ -180,6 +221,7 @@ class TaskRepository(Repository):
                 AND task.id NOT IN
                 (SELECT task_id FROM result
                 WHERE result.project_id=:project_id GROUP BY result.task_id);
+                DELETE FROM project_hourly_stats WHERE project_id=:project_id;
                 ''')
         else:
             """force reset, remove all results."""
@@ -192,9 +234,9 @@ class TaskRepository(Repository):
                     coalesce(ct, 0) as n_task_runs, task.n_answers, ft,
                     priority_0, task.created
                     FROM task LEFT OUTER JOIN
-                    (SELECT task_id, CAST(COUNT(id) AS FLOAT) AS ct,
-                    MAX(finish_time) as ft FROM task_run
-                    WHERE project_id=:project_id GROUP BY task_id) AS log_counts
+                    (SELECT task_id, CAST(n_task_runs AS FLOAT) AS ct,
+                    last_finish_time as ft FROM counter
+                    WHERE project_id=:project_id) AS log_counts
                     ON task.id=log_counts.task_id
                     WHERE task.project_id=:project_id {}
                 );
@@ -204,21 +246,29 @@ class TaskRepository(Repository):
                        AND task_id in (SELECT id FROM to_delete);
                 DELETE FROM task WHERE task.project_id=:project_id
                        AND id in (SELECT id FROM to_delete);
+                DELETE FROM project_hourly_stats WHERE project_id=:project_id;
 
                 COMMIT;
                 '''.format(conditions))
         self.db.session.execute(sql, dict(project_id=project.id, **params))
         self.db.session.commit()
         cached_projects.clean_project(project.id)
+        self._reset_ready_tasks(project.id)
+        self._mark_stats_dirty(project.id)
         self._delete_zip_files_from_store(project)
 
     def delete_taskruns_from_project(self, project):
         sql = text('''
                    DELETE FROM task_run WHERE project_id=:project_id;
+                   UPDATE counter SET n_task_runs=0, first_finish_time=NULL,
+                   last_finish_time=NULL WHERE project_id=:project_id;
+                   DELETE FROM project_hourly_stats WHERE project_id=:project_id;
                    ''')
         self.db.session.execute(sql, dict(project_id=project.id))
         self.db.session.commit()
         cached_projects.clean_project(project.id)
+        self._reset_ready_tasks(project.id)
+        self._mark_stats_dirty(project.id)
         self._delete_zip_files_from_store(project)
 
     def update_tasks_redundancy(self, project, n_answers, filters=None):
@@ -242,9 +292,9 @@ class TaskRepository(Repository):
                         coalesce(ct, 0) as n_task_runs, task.n_answers, ft,
                         priority_0, task.created
                         FROM task LEFT OUTER JOIN
-                        (SELECT task_id, CAST(COUNT(id) AS FLOAT) AS ct,
-                        MAX(finish_time) as ft FROM task_run
-                        WHERE project_id=:project_id GROUP BY task_id) AS log_counts
+                        (SELECT task_id, CAST(n_task_runs AS FLOAT) AS ct,
+                        last_finish_time as ft FROM counter
+                        WHERE project_id=:project_id) AS log_counts
                         ON task.id=log_counts.task_id
                         WHERE task.project_id=:project_id {}
                    )
@@ -258,6 +308,8 @@ class TaskRepository(Repository):
         self.update_task_state(project.id, n_answers)
         self.db.session.commit()
         cached_projects.clean_project(project.id)
+        self._reset_ready_tasks(project.id)
+        self._mark_stats_dirty(project.id)
 
     def update_task_state(self, project_id, n_answers):
         # Create temp tables for completed tasks
@@ -318,9 +370,9 @@ class TaskRepository(Repository):
                         coalesce(ct, 0) as n_task_runs, task.n_answers, ft,
                         priority_0, task.created
                         FROM task LEFT OUTER JOIN
-                        (SELECT task_id, CAST(COUNT(id) AS FLOAT) AS ct,
-                        MAX(finish_time) as ft FROM task_run
-                        WHERE project_id=:project_id GROUP BY task_id) AS log_counts
+                        (SELECT task_id, CAST(n_task_runs AS FLOAT) AS ct,
+                        last_finish_time as ft FROM counter
+                        WHERE project_id=:project_id) AS log_counts
                         ON task.id=log_counts.task_id
                         WHERE task.project_id=:project_id {}
                    )
@@ -334,6 +386,189 @@ class TaskRepository(Repository):
                                           **params))
         self.db.session.commit()
         cached_projects.clean_project(project_id)
+        self._reset_ready_tasks(project_id)
+
+    def find_duplicates(self, project_id, infos):
+        """
+        Find which of the given task infos already exist as ongoing tasks
+        in the given project, with a single query on the md5 index of the
+        info column. Return the set of the matching infos serialized as
+        JSON, the same way find_duplicate compares them.
+        """
+        if not infos:
+            return set()
+        sql = text('''
+                   SELECT info_text
+                   FROM unnest(:infos) AS info_text
+                   WHERE EXISTS (SELECT 1 FROM task
+                                 WHERE task.project_id=:project_id
+                                 AND task.state='ongoing'
+                                 AND md5(task.info::text)=md5(info_text))
+                   ''')
+        infos = [json.dumps(info) for info in infos]
+        rows = self.db.session.execute(sql, dict(project_id=project_id,
+                                                 infos=infos))
+        return set(row.info_text for row in rows)
+
+    def save_tasks(self, project_id, tasks):
+        """
+        Save a batch of tasks of a project, and their counters, with
+        multi-row INSERTs and a single commit. Per-task listeners are not
+        fired: call after_save_tasks once the whole import is saved.
+        Return the ids of the new tasks.
+        """
+        if not tasks:
+            return []
+        for task in tasks:
+            self._validate_can_be('saved', task)
+        if cached_projects.overall_progress(project_id) == 100:
+            sentinel.master.sadd('updated_project_ids', project_id)
+        rows = [self._row(task) for task in tasks]
+        table = Task.__table__
+        try:
+            sql = table.insert().values(rows).returning(table.c.id)
+            task_ids = [row.id for row in self.db.session.execute(sql)]
+            sql = text('''
+                       INSERT INTO counter
+                       (created, project_id, task_id, n_task_runs)
+                       SELECT :created, :project_id, task_id, 0
+                       FROM unnest(:task_ids) AS task_id;
+                       ''')
+            self.db.session.execute(sql, dict(created=make_timestamp(),
+                                              project_id=project_id,
+                                              task_ids=task_ids))
+            sql = text('''UPDATE project SET updated=:updated
+                       WHERE id=:project_id;''')
+            self.db.session.execute(sql, dict(updated=make_timestamp(),
+                                              project_id=project_id))
+            self.db.session.commit()
+        except IntegrityError as e:
+            self.db.session.rollback()
+            raise DBIntegrityError(e)
+        return task_ids
+
+    def after_save_tasks(self, project_id):
+        """
+        Update the feed and clean the project caches once after tasks
+        were saved with save_tasks.
+        """
+        project = self.db.session.query(Project).get(project_id)
+        obj = dict(action_updated='Task')
+        obj.update(Project().to_public_json(dict(id=project.id,
+                                                 name=project.name,
+                                                 short_name=project.short_name,
+                                                 info=project.info)))
+        update_feed(obj)
+        cached_projects.clean_project(project_id)
+        cached_projects.delete_searchable_columns(project_id)
+        self._reset_ready_tasks(project_id)
+        self._mark_stats_dirty(project_id)
+
+    def save_task_runs(self, task_runs):
+        """
+        Save a batch of task runs with a multi-row INSERT, updating the
+        counters and states of their tasks set-wise, and commit once.
+        Per-task run listeners are not fired: the feed, results and
+        webhooks are queued as for a single task run and handled after the
+        commit, and after_save_task_runs must be called for the rest.
+        Return the ids of the tasks completed.
+        """
+        from pybossa.model.event_listeners import queue_taskrun_event
+        if not task_runs:
+            return []
+        for task_run in task_runs:
+            self._validate_can_be('saved', task_run)
+        rows = [self._row(task_run) for task_run in task_runs]
+        table = TaskRun.__table__
+        params = dict(task_ids=[task_run.task_id for task_run in task_runs],
+                      finish_times=[row['finish_time'] for row in rows],
+                      project_ids=list(set(task_run.project_id
+                                           for task_run in task_runs)),
+                      now=make_timestamp())
+        try:
+            sql = table.insert().values(rows).returning(table.c.id)
+            ids = [row.id for row in self.db.session.execute(sql)]
+            for task_run, task_run_id in zip(task_runs, ids):
+                task_run.id = task_run_id
+            sql = text('''
+                       UPDATE counter
+                       SET n_task_runs = counter.n_task_runs + added.n,
+                       first_finish_time = LEAST(counter.first_finish_time,
+                                                 added.first_finish_time),
+                       last_finish_time = GREATEST(counter.last_finish_time,
+                                                   added.last_finish_time)
+                       FROM (SELECT task_id, COUNT(*) AS n,
+                             MIN(finish_time) AS first_finish_time,
+                             MAX(finish_time) AS last_finish_time
+                             FROM unnest(:task_ids, :finish_times)
+                             AS added(task_id, finish_time)
+                             GROUP BY task_id) AS added
+                       WHERE counter.task_id = added.task_id;
+                       ''')
+            self.db.session.execute(sql, params)
+            sql = text('''UPDATE project SET updated=:now
+                       WHERE id = ANY(:project_ids);''')
+            self.db.session.execute(sql, params)
+            sql = text('''
+                       UPDATE task SET state='completed' FROM project, counter
+                       WHERE task.id = ANY(:task_ids)
+                       AND project.id = task.project_id AND project.published
+                       AND counter.task_id = task.id
+                       AND counter.n_task_runs >= task.n_answers
+                       RETURNING task.id;
+                       ''')
+            completed = set(row.id for row in
+                            self.db.session.execute(sql, params))
+            for task_run in task_runs:
+                queue_taskrun_event(self.db.session, task_run.project_id,
+                                    task_run.task_id, task_run.user_id,
+                                    task_run.task_id in completed)
+            self.db.session.commit()
+        except IntegrityError as e:
+            self.db.session.rollback()
+            raise DBIntegrityError(e)
+        return sorted(completed)
+
+    def after_save_task_runs(self, task_runs):
+        """
+        Update the ready task queues, the realtime site stats, the
+        leaderboards, schedule the project stats and clean the project
+        caches once after task runs were saved with save_task_runs.
+
+        The task runs are already committed, so errors are only logged.
+        """
+        task_queue = ReadyTaskQueue(sentinel.master)
+        n_writes = dict()
+        for task_run in task_runs:
+            n_writes[task_run.project_id] = \
+                n_writes.get(task_run.project_id, 0) + 1
+        try:
+            for task_run in task_runs:
+                task_queue.answer(task_run.project_id, task_run.task_id)
+        except Exception:
+            current_app.logger.exception('Error updating ready task queues')
+            for project_id in n_writes:
+                try:
+                    task_queue.invalidate(project_id)
+                except Exception:
+                    pass
+        answers = [(task_run.project_id, task_run.user_id, task_run.user_ip,
+                    task_run.finish_time) for task_run in task_runs]
+        try:
+            RealtimeStats(sentinel.master).record(answers)
+        except Exception:
+            current_app.logger.exception('Error updating realtime stats')
+        try:
+            Leaderboard(sentinel.master).record(answers)
+        except Exception:
+            current_app.logger.exception('Error updating leaderboards')
+        for project_id, n in n_writes.iteritems():
+            try:
+                self._mark_stats_dirty(project_id, n)
+                cached_projects.clean_project(project_id)
+            except Exception:
+                current_app.logger.exception('Error cleaning project %s'
+                                             % project_id)
 
     def find_duplicate(self, project_id, info):
         """
@@ -359,6 +594,26 @@ class TaskRepository(Repository):
             msg = '%s cannot be %s by %s' % (name, action, self.__class__.__name__)
             raise WrongObjectError(msg)
 
+    def _row(self, element):
+        row = dict()
+        for column in element.__table__.columns:
+            if column.primary_key:
+                continue
+            value = getattr(element, column.key)
+            if value is None and column.default is not None:
+                if column.default.is_callable:
+                    value = column.default.arg(None)
+                else:
+                    value = column.default.arg
+            row[column.name] = value
+        return row
+
+    def _reset_ready_tasks(self, project_id):
+        ReadyTaskQueue(sentinel.master).invalidate(project_id)
+
+    def _mark_stats_dirty(self, project_id, n_writes=1):
+        DirtyProjects(sentinel.master).mark(project_id, n_writes)
+
     def _delete(self, element):
         self._validate_can_be('deleted', element)
         table = element.__class__
@@ -391,9 +646,9 @@ class TaskRepository(Repository):
                         coalesce(ct, 0) as n_task_runs, task.n_answers, ft,
                         priority_0, task.created
                         FROM task LEFT OUTER JOIN
-                        (SELECT task_id, CAST(COUNT(id) AS FLOAT) AS ct,
-                        MAX(finish_time) as ft FROM task_run
-                        WHERE project_id=:project_id GROUP BY task_id) AS log_counts
+                        (SELECT task_id, CAST(n_task_runs AS FLOAT) AS ct,
+                        last_finish_time as ft FROM counter
+                        WHERE project_id=:project_id) AS log_counts
                         ON task.id=log_counts.task_id
                         WHERE task.project_id=:project_id
                         AND task.state='completed'
@@ -16,13 +16,14 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
-from sqlalchemy import or_, func
+from sqlalchemy import or_, func, inspect
 from sqlalchemy.exc import IntegrityError
 from pybossa.repositories import Repository
 from sqlalchemy import text
 from pybossa.model.user import User
 from pybossa.util import AttrDict
 from pybossa.exc import WrongObjectError, DBIntegrityError
+from pybossa.cache.users import delete_api_key_owner
 
 
 class UserRepository(Repository):
@@ -73,13 +74,30 @@ class UserRepository(Repository):
 
     def update(self, new_user):
         self._validate_can_be('updated', new_user)
+        api_keys = self._api_keys(new_user)
         try:
             self.db.session.merge(new_user)
             self.db.session.commit()
+            for api_key in api_keys:
+                delete_api_key_owner(api_key)
         except IntegrityError as e:
             self.db.session.rollback()
             raise DBIntegrityError(e)
 
+    def delete(self, user):
+        self._validate_can_be('deleted', user)
+        api_key = user.api_key
+        self.db.session.delete(user)
+        self.db.session.commit()
+        if api_key:
+            delete_api_key_owner(api_key)
+
+    def _api_keys(self, user):
+        """Return the current and replaced API keys of the user."""
+        history = inspect(user).attrs.api_key.history
+        api_keys = set([user.api_key]).union(history.deleted or [])
+        return [api_key for api_key in api_keys if api_key]
+
     def _validate_can_be(self, action, user):
         if not isinstance(user, User):
             name = user.__class__.__name__
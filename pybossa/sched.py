@@ -17,6 +17,7 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 """Scheduler module for PYBOSSA tasks."""
 from functools import wraps
+from rq import Queue
 from sqlalchemy.sql import func, desc, text
 from sqlalchemy.sql import and_
 from pybossa.model import DomainObject
@@ -26,12 +27,14 @@ from pybossa.model.counter import Counter
 from pybossa.core import db, sentinel, project_repo
 from redis_lock import LockManager, get_active_user_count, register_active_user
 from contributions_guard import ContributionsGuard
+from ready_tasks import ReadyTaskQueue
 from werkzeug.exceptions import BadRequest, Forbidden
 import random
 from pybossa.cache import users as cached_users
 from flask import current_app
 
 session = db.slave_session
+ready_tasks_queue = Queue('high', connection=sentinel.master)
 
 
 class Schedulers(object):
@@ -41,6 +44,7 @@ class Schedulers(object):
 
 
 DEFAULT_SCHEDULER = Schedulers.locked
+READY_TASK_WINDOWS = 5
 
 
 def new_task(project_id, sched, user_id=None, user_ip=None,
@@ -104,10 +108,9 @@ def get_breadth_first_task(project_id, user_id=None, user_ip=None,
                                                                 external_uid=external_uid)
 
     tmp = project_query.except_(subquery)
-    query = session.query(Task, func.sum(Counter.n_task_runs).label('n_task_runs'))\
+    query = session.query(Task, Counter.n_task_runs.label('n_task_runs'))\
                    .filter(Task.id==Counter.task_id)\
                    .filter(Counter.task_id.in_(tmp))\
-                   .group_by(Task.id)\
                    .order_by('n_task_runs ASC')\
 
     query = _set_orderby_desc(query, orderby, desc)
@@ -189,33 +192,110 @@ def locked_scheduler(query_factory):
             "Project {} - number of current users: {}"
             .format(project_id, user_count))
 
-        sql = query_factory(project_id, user_id, user_ip, external_uid,
-                            limit, offset, orderby, desc)
+        limit = max(limit or 1, 1)
+        n_candidates = user_count + 5 + limit - 1
+        candidates = get_ready_candidates(query_factory, project_id, user_id,
+                                          user_ip, external_uid,
+                                          n_candidates, offset, orderby,
+                                          desc)
+        if candidates is None:
+            sql = query_factory(project_id, user_id, user_ip, external_uid,
+                                limit, offset, orderby, desc)
+            rows = session.execute(sql, dict(project_id=project_id,
+                                             user_id=user_id,
+                                             limit=n_candidates))
+            candidates = rows.fetchall()
+
+        if not candidates:
+            return []
+
+        timeout = candidates[0].timeout or TIMEOUT
+        task_ids = [row.id for row in candidates]
+        limits = [row.n_answers - row.taskcount for row in candidates]
+        task_ids = acquire_locks(project_id, task_ids, user_id, limits,
+                                 timeout, limit)
+        if not task_ids:
+            return []
+
+        register_active_user(project_id, user_id, sentinel.master, ttl=timeout)
+        current_app.logger.info(
+            'Project {} - user {} obtained tasks {}, timeout: {}'
+            .format(project_id, user_id, task_ids, timeout))
+        tasks = session.query(Task).filter(Task.id.in_(task_ids)).all()
+        tasks.sort(key=lambda task: task_ids.index(task.id))
+        return tasks
+
+    return template_get_locked_task
+
+
+def get_ready_candidates(query_factory, project_id, user_id, user_ip,
+                         external_uid, limit, offset, orderby, desc):
+    """Get candidate rows for the locked schedulers from the ready task queue.
+
+    Windows of task ids are read from the queue in scheduling order and
+    checked against the database, which only has to look at those tasks.
+    Returns None when the queue cannot answer, so that the caller falls
+    back to scanning the whole project.
+    """
+    task_queue = ReadyTaskQueue(sentinel.master)
+    if not task_queue.is_built(project_id):
+        token = task_queue.acquire_rebuild(project_id)
+        if token is not None:
+            ready_tasks_queue.enqueue_call(
+                func=rebuild_ready_tasks,
+                kwargs=dict(project_id=project_id, token=token),
+                timeout=current_app.config.get('TIMEOUT'))
+        return None
 
+    sql = query_factory(project_id, user_id, user_ip, external_uid,
+                        limit, offset, orderby, desc, candidates=True)
+    for window in range(READY_TASK_WINDOWS):
+        task_ids = task_queue.get_task_ids(project_id, window * limit, limit)
+        if not task_ids:
+            return None
         rows = session.execute(sql, dict(project_id=project_id,
                                          user_id=user_id,
-                                         limit=user_count + 5))
+                                         task_ids=task_ids,
+                                         limit=limit)).fetchall()
+        if rows:
+            return rows
+    return None
 
-        for task_id, taskcount, n_answers, timeout in rows:
-            timeout = timeout or TIMEOUT
-            remaining = n_answers - taskcount
-            if acquire_lock(project_id, task_id, user_id, remaining, timeout):
-                rows.close()
-                register_active_user(project_id, user_id, sentinel.master, ttl=timeout)
-                current_app.logger.info(
-                    'Project {} - user {} obtained task {}, timeout: {}'
-                    .format(project_id, user_id, task_id, timeout))
-                return [session.query(Task).get(task_id)]
 
-        return []
+def rebuild_ready_tasks(project_id, token=None):
+    """Rebuild the ready task queue of a project from the database.
 
-    return template_get_locked_task
+    :param token: the rebuild was already acquired by the caller that
+        scheduled this job
+    """
+    task_queue = ReadyTaskQueue(sentinel.master)
+    sql = '''
+          SELECT task.id, task.priority_0,
+          task.n_answers - coalesce(counter.n_task_runs, 0) AS remaining
+          FROM task
+          LEFT JOIN counter ON (task.id = counter.task_id)
+          WHERE task.project_id=:project_id AND task.state !='completed'
+          {0};
+          '''
+
+    def refresh(task_ids):
+        rows = db.session.execute(text(sql.format(
+            'AND task.id = ANY(:task_ids)')),
+            dict(project_id=project_id, task_ids=task_ids))
+        return rows.fetchall()
+
+    rows = db.session.execute(
+        text(sql.format('')).execution_options(stream_results=True),
+        dict(project_id=project_id))
+    if not task_queue.rebuild(project_id, rows, refresh, token):
+        return "Ready task queue left unbuilt"
+    return "Ready task queue rebuilt"
 
 
 @locked_scheduler
 def get_locked_task(project_id, user_id=None, user_ip=None,
                     external_uid=None, limit=1, offset=0,
-                    orderby='priority_0', desc=True):
+                    orderby='priority_0', desc=True, candidates=False):
     """ Select a new task to be returned to the contributor.
 
     For each incomplete task, check if the number of users working on the task
@@ -223,7 +303,7 @@ def get_locked_task(project_id, user_id=None, user_ip=None,
     a lock on the task and return the task to the user. If offset is nonzero,
     skip that amount of available tasks before returning to the user.
     """
-    sql = text('''
+    sql = '''
            SELECT task.id, COUNT(task_run.task_id) AS taskcount, n_answers,
               (SELECT info->'timeout'
                FROM project
@@ -234,17 +314,18 @@ def get_locked_task(project_id, user_id=None, user_ip=None,
            (SELECT 1 FROM task_run WHERE project_id=:project_id AND
            user_id=:user_id AND task_id=task.id)
            AND task.project_id=:project_id AND task.state !='completed'
+           {0}
            group by task.id HAVING COUNT(task_run.task_id) < n_answers
            ORDER BY priority_0 DESC, id ASC LIMIT :limit;
-           ''')
+           '''.format(_candidates_filter(candidates))
 
-    return sql
+    return text(sql)
 
 
 @locked_scheduler
 def get_user_pref_task(project_id, user_id=None, user_ip=None,
                        external_uid=None, limit=1, offset=0,
-                       orderby='priority_0', desc=True):
+                       orderby='priority_0', desc=True, candidates=False):
     """ Select a new task based on user preference set under user profile.
 
     For each incomplete task, check if the number of users working on the task
@@ -267,11 +348,20 @@ def get_user_pref_task(project_id, user_id=None, user_ip=None,
            AND task.project_id=:project_id
            AND (task.user_pref IS NULL OR {0})
            AND task.state !='completed'
+           {1}
            group by task.id ORDER BY priority_0 DESC, id ASC
-           LIMIT :limit; '''.format(user_pref_list)
+           LIMIT :limit; '''.format(user_pref_list,
+                                     _candidates_filter(candidates))
     return text(sql)
 
 
+def _candidates_filter(candidates):
+    """Restrict a locked scheduler query to the tasks in :task_ids."""
+    if candidates:
+        return 'AND task.id = ANY(:task_ids)'
+    return ''
+
+
 KEY_PREFIX = 'pybossa:project:task_requested:timestamps:{0}:{1}'
 TIMEOUT = ContributionsGuard.STAMP_TTL
 
@@ -288,12 +378,36 @@ def acquire_lock(project_id, task_id, user_id, limit, timeout):
     return lock_manager.acquire_lock(key, user_id, limit)
 
 
+def acquire_locks(project_id, task_ids, user_id, limits, timeout, count=1):
+    """Try the candidate tasks in order and lock the first available ones.
+
+    Returns the ids of the locked tasks, at most count of them.
+    """
+    lock_manager = LockManager(sentinel.master, timeout)
+    keys = [get_key(project_id, task_id) for task_id in task_ids]
+    acquired = set(lock_manager.acquire_locks(keys, user_id, limits, count))
+    return [task_id for task_id, key in zip(task_ids, keys)
+            if key in acquired]
+
+
 def release_lock(project_id, task_id, user_id, timeout):
     lock_manager = LockManager(sentinel.master, timeout)
     key = get_key(project_id, task_id)
     lock_manager.release_lock(key, user_id)
 
 
+def has_locks(project_id, task_ids, user_id, timeout):
+    lock_manager = LockManager(sentinel.master, timeout)
+    keys = [get_key(project_id, task_id) for task_id in task_ids]
+    return lock_manager.has_locks(keys, user_id)
+
+
+def release_locks(project_id, task_ids, user_id, timeout):
+    lock_manager = LockManager(sentinel.master, timeout)
+    keys = [get_key(project_id, task_id) for task_id in task_ids]
+    lock_manager.release_locks(keys, user_id)
+
+
 def get_key(project_id, task_id):
     return KEY_PREFIX.format(project_id, task_id)
 
@@ -0,0 +1,104 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+"""Projects whose stats need to be refreshed.
+
+Writes to the tasks, task runs and blog posts of a project mark it as dirty
+in a Redis sorted set, scored by the number of writes since its stats were
+last refreshed, with the time of its first write kept in a hash next to it.
+
+The periodic stats jobs only refresh dirty projects, most active first. A
+project leaves the set when its stats job is queued, and holds a lock until
+the job is done, so it never has two stats jobs queued at once.
+"""
+import time
+
+# Takes a project out of the dirty set if its stats job can be queued.
+# KEYS: dirty set, dirty since hash, job lock
+# ARGV: member, job lock ttl
+CLAIM_SCRIPT = """
+if redis.call('SET', KEYS[3], 1, 'NX', 'EX', ARGV[2]) == false then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+return 1
+"""
+
+
+class DirtyProjects(object):
+
+    DIRTY_KEY = 'pybossa:project:stats:dirty'
+    SINCE_KEY = 'pybossa:project:stats:dirty_since'
+    JOB_LOCK_KEY = 'pybossa:project:stats:job:{0}'
+    JOB_LOCK_TTL = 60 * 60
+
+    def __init__(self, redis_conn):
+        self.conn = redis_conn
+        self._claim_script = redis_conn.register_script(CLAIM_SCRIPT)
+
+    def mark(self, project_id, n_writes=1):
+        """Mark the stats of a project as dirty."""
+        self.mark_many({project_id: n_writes})
+
+    def mark_many(self, n_writes):
+        """Mark the stats of several projects as dirty at once.
+
+        :param n_writes: dict of the number of writes of each project
+        """
+        now = int(time.time())
+        pipeline = self.conn.pipeline()
+        for project_id, n in n_writes.iteritems():
+            pipeline.zincrby(self.DIRTY_KEY, project_id, n)
+            pipeline.hsetnx(self.SINCE_KEY, project_id, now)
+        pipeline.execute()
+
+    def get_dirty(self, limit=None):
+        """Return (project_id, n_writes, dirty_since) of the dirty projects,
+        most active first."""
+        end = -1 if limit is None else limit - 1
+        members = self.conn.zrevrange(self.DIRTY_KEY, 0, end,
+                                      withscores=True)
+        if not members:
+            return []
+        since = self.conn.hmget(self.SINCE_KEY,
+                                [member for member, _ in members])
+        return [(int(member), int(score), int(ts) if ts else None)
+                for (member, score), ts in zip(members, since)]
+
+    def claim(self, project_id, ttl=None):
+        """Take a project out of the dirty set to queue its stats job.
+
+        Returns False if a stats job of the project is already queued or
+        running, in which case the project stays dirty.
+        """
+        keys = [self.DIRTY_KEY, self.SINCE_KEY,
+                self.JOB_LOCK_KEY.format(project_id)]
+        return bool(self._claim_script(keys=keys,
+                                       args=[project_id,
+                                             ttl or self.JOB_LOCK_TTL]))
+
+    def remove(self, project_id):
+        """Take a project out of the dirty set."""
+        pipeline = self.conn.pipeline()
+        pipeline.zrem(self.DIRTY_KEY, project_id)
+        pipeline.hdel(self.SINCE_KEY, project_id)
+        pipeline.execute()
+
+    def release(self, project_id):
+        """Allow a new stats job of a project to be queued."""
+        self.conn.delete(self.JOB_LOCK_KEY.format(project_id))
@@ -1076,7 +1076,8 @@ def tasks_browse(short_name, page=1, records_per_page=10):
         args["records_per_page"] = per_page
         args["offset"] = offset
         start_time = time.time()
-        (count, page_tasks) = cached_projects.browse_tasks(project.get('id'), args)
+        (count, page_tasks) = cached_projects.browse_tasks(project.get('id'),
+                                                           args, columns)
         current_app.logger.debug("Browse Tasks data loading took %s seconds"
                                  % (time.time()-start_time))
         first_task_id = cached_projects.first_task_id(project.get('id'))
@@ -1096,10 +1097,6 @@ def tasks_browse(short_name, page=1, records_per_page=10):
         args.pop("records_per_page", None)
         args.pop("offset", None)
 
-        for task in page_tasks:
-            task_info = task_repo.get_task(task['id']).info
-            for col in columns:
-                task[col] = task_info.get(col, '')
         info_columns = [col for col in columns if col in args['display_columns']]
 
         data = dict(template='/projects/tasks_browse.html',
@@ -30,6 +30,7 @@ ENFORCE_PRIVACY = False
 REDIS_CACHE_ENABLED = False
 REDIS_SENTINEL = [('localhost', 26379)]
 REDIS_KEYPREFIX = 'pybossa_cache'
+WARM_CACHE_PROCESSES = 1
 WTF_CSRF_ENABLED = False
 TESTING = True
 CSRF_ENABLED = False
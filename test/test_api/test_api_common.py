@@ -89,6 +89,65 @@ class TestApiCommon(TestAPI):
         assert len(data) == 10, len(data)
         assert data[0].get('name') == 'user11', data
 
+    @with_context
+    def test_cursor_pagination(self):
+        """Test API GET pages with the cursor of the Link header"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(7, project=project)
+        for i, task in enumerate(tasks):
+            task.priority_0 = i % 3 / 10.0
+            project_repo.db.session.add(task)
+        project_repo.db.session.commit()
+        expected = sorted(tasks, key=lambda t: (-t.priority_0, -t.id))
+
+        url = '/api/task?project_id=%s&orderby=priority_0&desc=true&limit=3' % project.id
+        ids = []
+        while url:
+            res = self.app.get(url)
+            ids.extend(task['id'] for task in json.loads(res.data))
+            link = res.headers.get('Link')
+            url = link[1:link.index('>')] if link else None
+
+        assert ids == [t.id for t in expected], ids
+
+    @with_context
+    def test_cursor_pagination_with_null_values(self):
+        """Test API GET pages with the cursor over NULL orderby values"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(5, project=project)
+        for task in tasks[1::2]:
+            task.priority_0 = None
+            project_repo.db.session.add(task)
+        project_repo.db.session.commit()
+
+        for desc in ('false', 'true'):
+            url = ('/api/task?project_id=%s&orderby=priority_0&desc=%s'
+                   '&limit=2' % (project.id, desc))
+            ids = []
+            while url:
+                res = self.app.get(url)
+                ids.extend(task['id'] for task in json.loads(res.data))
+                link = res.headers.get('Link')
+                url = link[1:link.index('>')] if link else None
+
+            assert sorted(ids) == sorted(t.id for t in tasks), ids
+            assert len(ids) == len(set(ids)), ids
+
+    @with_context
+    def test_cursor_pagination_rejects_mismatched_cursor(self):
+        """Test API GET fails with a cursor of another ordering"""
+        project = ProjectFactory.create()
+        TaskFactory.create_batch(3, project=project)
+
+        res = self.app.get('/api/task?limit=2&orderby=created')
+        link = res.headers.get('Link')
+        url = link[1:link.index('>')].replace('orderby=created', 'orderby=id')
+        res = self.app.get(url)
+
+        assert res.status_code == 400, res.status_code
+        res = self.app.get('/api/task?cursor=notacursor')
+        assert res.status_code == 400, res.status_code
+
     @with_context
     def test_get_query_with_api_key_and_all(self):
         """ Test API GET query with an API-KEY requesting all results"""
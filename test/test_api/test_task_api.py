@@ -123,6 +123,48 @@ class TestTaskAPI(TestAPI):
         assert len(task['task_runs']) == len(taskruns), task
         assert task['result'] == None, task
 
+    @with_context
+    def test_task_query_related_is_batched(self):
+        """ Test API Task query with related loads the page related objects
+        with a query per kind"""
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(3, project=project, n_answers=2)
+        for i, task in enumerate(tasks):
+            TaskRunFactory.create_batch(i, project=project, task=task)
+        get_task_runs = task_repo.get_task_runs_of_tasks
+        get_results = result_repo.get_last_versions
+
+        with patch('pybossa.api.api_base.task_repo.get_task_runs_of_tasks',
+                   side_effect=get_task_runs) as task_runs_query, \
+                patch('pybossa.api.api_base.result_repo.get_last_versions',
+                      side_effect=get_results) as results_query:
+            url = '/api/task?project_id=%s&related=True' % project.id
+            data = json.loads(self.app.get(url).data)
+
+        assert task_runs_query.call_count == 1, task_runs_query.call_count
+        assert results_query.call_count == 1, results_query.call_count
+        data = dict((task['id'], task) for task in data)
+        for i, task in enumerate(tasks):
+            task_runs = data[task.id]['task_runs']
+            assert len(task_runs) == i, task_runs
+            assert all(tr['task_id'] == task.id for tr in task_runs)
+        assert data[tasks[2].id]['result']['task_id'] == tasks[2].id
+        assert data[tasks[0].id]['result'] is None
+
+    @with_context
+    def test_task_related_outside_list_response(self):
+        """ Test API Task dict with related loads the related objects of the
+        task when no page was loaded"""
+        from pybossa.api.task import TaskAPI
+        task = TaskFactory.create()
+        TaskRunFactory.create(task=task)
+
+        with self.flask_app.test_request_context('/?related=True'):
+            data = TaskAPI()._create_dict_from_model(task)
+
+        assert len(data['task_runs']) == 1, data
+        assert data['result'] is None, data
+
     @with_context
     def test_task_query_without_params_with_context(self):
         """ Test API Task query with context"""
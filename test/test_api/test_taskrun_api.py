@@ -708,6 +708,112 @@ class TestTaskrunAPI(TestAPI):
         assert success.status_code == 200, success.data
 
 
+    @with_context
+    @patch('pybossa.api.task_run.ContributionsGuard')
+    def test_taskrun_bulk_post(self, guard):
+        """Test API TaskRun bulk post stores the valid task runs and returns
+        the status of each of them"""
+        guard.return_value = mock_contributions_guard(True)
+        guard.return_value.retrieve_timestamps.return_value = [
+            ('2015-11-18T16:29:25.496327', None),
+            ('2015-11-18T16:29:25.496327', None)]
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(2, project=project, n_answers=1)
+        data = [dict(project_id=project.id, task_id=tasks[0].id, info='a'),
+                dict(project_id=project.id, task_id=9999, info='b'),
+                dict(project_id=project.id, task_id=tasks[1].id, info='c'),
+                dict(project_id=project.id, task_id=tasks[1].id, info='d')]
+        url = '/api/taskrun/bulk?api_key=%s' % project.owner.api_key
+
+        res = self.app.post(url, data=json.dumps(data))
+        statuses = json.loads(res.data)
+
+        assert res.status_code == 200, res.data
+        assert [s['status'] for s in statuses] == ['ok', 'failed', 'ok', 'failed'], statuses
+        assert statuses[1]['exception_msg'] == 'Invalid task_id', statuses
+        assert statuses[3]['exception_cls'] == 'Forbidden', statuses
+        task_runs = task_repo.filter_task_runs_by(project_id=project.id)
+        assert sorted(tr.id for tr in task_runs) == sorted([statuses[0]['id'], statuses[2]['id']])
+        for task in tasks:
+            assert task_repo.get_task(task.id).state == 'completed'
+            assert result_repo.get_by(project_id=project.id, task_id=task.id) is not None
+
+    @with_context
+    @patch('pybossa.api.task_run.ensure_authorized_to')
+    @patch('pybossa.api.task_run.ContributionsGuard')
+    def test_taskrun_bulk_post_authorizes_once_per_project(self, guard,
+                                                          authorize):
+        """Test API TaskRun bulk post authorizes the user once per project
+        and rejects the tasks already answered"""
+        guard.return_value = mock_contributions_guard(True)
+        guard.return_value.retrieve_timestamps.return_value = [
+            ('2015-11-18T16:29:25.496327', None),
+            ('2015-11-18T16:29:25.496327', None)]
+        project = ProjectFactory.create()
+        tasks = TaskFactory.create_batch(3, project=project, n_answers=2)
+        TaskRunFactory.create(task=tasks[1], user=project.owner)
+        data = [dict(project_id=project.id, task_id=task.id, info='a')
+                for task in tasks]
+        url = '/api/taskrun/bulk?api_key=%s' % project.owner.api_key
+
+        res = self.app.post(url, data=json.dumps(data))
+        statuses = json.loads(res.data)
+
+        assert res.status_code == 200, res.data
+        assert [s['status'] for s in statuses] == ['ok', 'failed', 'ok'], statuses
+        assert statuses[1]['status_code'] == 403, statuses
+        assert authorize.call_count == 1, authorize.call_args_list
+
+    @with_context
+    @patch('pybossa.repositories.task_repository.RealtimeStats')
+    @patch('pybossa.api.task_run.ContributionsGuard')
+    def test_taskrun_bulk_post_ignores_side_effect_errors(self, guard,
+                                                          stats):
+        """Test API TaskRun bulk post succeeds if the side effects run after
+        the commit fail"""
+        guard.return_value = mock_contributions_guard(True)
+        guard.return_value.retrieve_timestamps.return_value = [
+            ('2015-11-18T16:29:25.496327', None)]
+        stats.return_value.record.side_effect = Exception('Redis is down')
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project)
+        data = [dict(project_id=project.id, task_id=task.id, info='a')]
+        url = '/api/taskrun/bulk?api_key=%s' % project.owner.api_key
+
+        res = self.app.post(url, data=json.dumps(data))
+        statuses = json.loads(res.data)
+
+        assert res.status_code == 200, res.data
+        assert [s['status'] for s in statuses] == ['ok'], statuses
+        assert stats.return_value.record.called
+
+    @with_context
+    def test_taskrun_bulk_post_rate_limited_per_task_run(self):
+        """Test API TaskRun bulk post counts each task run posted against
+        the rate limit"""
+        project = ProjectFactory.create()
+        url = '/api/taskrun/bulk?api_key=%s' % project.owner.api_key
+        data = [dict(project_id=project.id, task_id=9999, info='a')] * 3
+
+        res = self.app.post(url, data=json.dumps(data))
+        remaining = int(res.headers['X-RateLimit-Remaining'])
+        res = self.app.post(url, data=json.dumps(data))
+
+        assert int(res.headers['X-RateLimit-Remaining']) == remaining - 3
+
+    @with_context
+    def test_taskrun_bulk_post_requires_a_list(self):
+        """Test API TaskRun bulk post fails if the payload is not a list"""
+        project = ProjectFactory.create()
+        url = '/api/taskrun/bulk?api_key=%s' % project.owner.api_key
+
+        res = self.app.post(url, data=json.dumps(dict(project_id=project.id)))
+        err = json.loads(res.data)
+
+        assert res.status_code == 400, res.data
+        assert err['exception_cls'] == 'BadRequest', err
+
+
     @with_context
     def test_taskrun_post_with_bad_data(self):
         """Test API TaskRun error messages."""
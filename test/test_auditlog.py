@@ -60,6 +60,39 @@ class TestAuditlogAPI(Test):
             assert log.old_value == 'Nothing', log.old_value
             assert log.new_value == 'New project', log.new_value
 
+    @with_context
+    def test_project_create_with_api_key_logs_real_user(self):
+        """Test Auditlog API project create with an API key gets a User
+        instance as current_user for the project owner and the log."""
+        from pybossa.auditlogger import AuditLogger
+        from pybossa.model.user import User
+        CategoryFactory.create()
+        user = UserFactory.create()
+        logged_users = []
+        add_log_entry = AuditLogger.add_log_entry
+
+        def record_user(logger, old_project, new_project, user):
+            logged_users.append(user._get_current_object())
+            return add_log_entry(logger, old_project, new_project, user)
+
+        data = {'name': 'New Name',
+                'short_name': 'new_short_name',
+                'description': 'new_description',
+                'long_description': 'new_long_description'}
+        url = '/api/project?api_key=%s' % (user.api_key)
+        with patch.object(AuditLogger, 'add_log_entry', record_user):
+            res = self.app.post(url, data=json.dumps(data))
+
+        assert res.status_code == 200, res.data
+        assert json.loads(res.data)['owner_id'] == user.id, res.data
+        assert len(logged_users) == 1, logged_users
+        assert type(logged_users[0]) is User, logged_users
+        assert logged_users[0].id == user.id, logged_users
+        logs = auditlog_repo.filter_by(project_short_name='new_short_name')
+        assert len(logs) == 1, logs
+        assert logs[0].user_id == user.id, logs[0].user_id
+        assert logs[0].user_name == user.name, logs[0].user_name
+
     @with_context
     def test_project_delete(self):
         """Test Auditlog API project create works."""
@@ -18,7 +18,7 @@
 
 from default import assert_not_raises
 from mock import Mock, patch, PropertyMock
-from pybossa.auth import ensure_authorized_to, is_authorized
+from pybossa.auth import ensure_authorized_to, is_authorized, filter_authorized
 from nose.tools import assert_raises
 from werkzeug.exceptions import Forbidden, Unauthorized
 from pybossa.model.user import User
@@ -121,3 +121,38 @@ class TestAuthorizationFunctions(object):
 
         auth_factory.assert_called_with('token')
         authorizer.can.assert_called_with(user, 'read', 'token')
+
+    def test_authorizers_are_reused(self):
+        from pybossa.auth import _authorizer_for
+
+        assert _authorizer_for('task') is _authorizer_for('task')
+
+    @patch('pybossa.auth._authorizer_for')
+    def test_filter_authorized_decides_once_per_project(self, auth_factory):
+        authorizer = Mock()
+        authorizer.specific_actions = []
+        authorizer.project_scoped_actions = ['read']
+        authorizer.can.side_effect = lambda user, action, item: item.project_id == 1
+        auth_factory.return_value = authorizer
+        user = self.mock_authenticated
+        items = [Mock(project_id=1), Mock(project_id=2), Mock(project_id=1)]
+
+        authorized = filter_authorized(user, 'read', items)
+
+        assert authorized == [items[0], items[2]], authorized
+        assert authorizer.can.call_count == 2, authorizer.can.call_count
+
+    @patch('pybossa.auth._authorizer_for')
+    def test_filter_authorized_leaves_out_forbidden_items(self, auth_factory):
+        authorizer = Mock()
+        authorizer.specific_actions = []
+        authorizer.project_scoped_actions = []
+        authorizer.can.side_effect = [True, Forbidden]
+        auth_factory.return_value = authorizer
+        user = self.mock_authenticated
+        items = [Mock(project_id=1), Mock(project_id=1)]
+
+        authorized = filter_authorized(user, 'read', items)
+
+        assert authorized == [items[0]], authorized
+        assert authorizer.can.call_count == 2, authorizer.can.call_count
@@ -19,7 +19,9 @@
 import hashlib
 from mock import patch
 from pybossa.cache import (get_key_to_hash, get_hash_key, cache, memoize,
-                           delete_cached, delete_memoized)
+                           delete_cached, delete_memoized, memoize_essentials,
+                           delete_memoized_essential, get_tag_key,
+                           set_memoized)
 from pybossa.sentinel import Sentinel
 from settings_test import REDIS_SENTINEL, REDIS_KEYPREFIX
 
@@ -246,11 +248,12 @@ class TestCacheMemoizeFunctions(object):
         def my_func(*args, **kwargs):
             return [args, kwargs]
         my_func('arg', kwarg='kwarg')
-        assert len(test_sentinel.master.keys()) == 1
+        key_pattern = "%s:%s_args:*" % (REDIS_KEYPREFIX, my_func.__name__)
+        assert len(test_sentinel.master.keys(key_pattern)) == 1
 
         delete_succedeed = delete_memoized(my_func, 'arg', kwarg='kwarg')
         assert delete_succedeed is True, delete_succedeed
-        assert test_sentinel.master.keys() == [], 'Key was not deleted!'
+        assert test_sentinel.master.keys(key_pattern) == [], 'Key was not deleted!'
 
 
     def test_delete_memoized_returns_false_when_delete_fails(self):
@@ -260,11 +263,12 @@ class TestCacheMemoizeFunctions(object):
         def my_func(*args, **kwargs):
             return [args, kwargs]
         my_func('arg', kwarg='kwarg')
-        assert len(test_sentinel.master.keys()) == 1
+        key_pattern = "%s:%s_args:*" % (REDIS_KEYPREFIX, my_func.__name__)
+        assert len(test_sentinel.master.keys(key_pattern)) == 1
 
         delete_succedeed = delete_memoized(my_func, 'badarg', kwarg='barkwarg')
         assert delete_succedeed is False, delete_succedeed
-        assert len(test_sentinel.master.keys()) == 1, 'Key was unexpectedly deleted'
+        assert len(test_sentinel.master.keys(key_pattern)) == 1, 'Key was unexpectedly deleted'
 
 
     def test_delete_memoized_deletes_only_requested(self):
@@ -276,11 +280,12 @@ class TestCacheMemoizeFunctions(object):
             return [args, kwargs]
         my_func('arg', kwarg='kwarg')
         my_func('other', kwarg='other')
-        assert len(test_sentinel.master.keys()) == 2
+        key_pattern = "%s:*_args:*" % REDIS_KEYPREFIX
+        assert len(test_sentinel.master.keys(key_pattern)) == 2
 
         delete_succedeed = delete_memoized(my_func, 'arg', kwarg='kwarg')
         assert delete_succedeed is True, delete_succedeed
-        assert len(test_sentinel.master.keys()) == 1, 'Everything was deleted!'
+        assert len(test_sentinel.master.keys(key_pattern)) == 1, 'Everything was deleted!'
 
 
     def test_delete_memoized_deletes_all_function_calls(self):
@@ -296,8 +301,99 @@ class TestCacheMemoizeFunctions(object):
         my_func('arg', kwarg='kwarg')
         my_func('other', kwarg='other')
         my_other_func('arg', kwarg='kwarg')
-        assert len(test_sentinel.master.keys()) == 3
+        key_pattern = "%s:*_args:*" % REDIS_KEYPREFIX
+        assert len(test_sentinel.master.keys(key_pattern)) == 3
 
         delete_succedeed = delete_memoized(my_func)
         assert delete_succedeed is True, delete_succedeed
-        assert len(test_sentinel.master.keys()) == 1
+        assert len(test_sentinel.master.keys(key_pattern)) == 1
+
+
+    def test_delete_memoized_essential_deletes_only_matching_calls(self):
+        """Test CACHE delete_memoized_essential deletes all the function calls
+        stored for the given essential arguments and leaves the rest"""
+
+        @memoize_essentials(essentials=[0])
+        def my_func(*args, **kwargs):
+            return [args, kwargs]
+        my_func(1, 'arg')
+        my_func(1, 'other')
+        my_func(10, 'arg')
+        key_pattern = "%s:%s_args:*" % (REDIS_KEYPREFIX, my_func.__name__)
+        assert len(test_sentinel.master.keys(key_pattern)) == 3
+
+        delete_succedeed = delete_memoized_essential(my_func, 1)
+        assert delete_succedeed is True, delete_succedeed
+        assert len(test_sentinel.master.keys(key_pattern)) == 1
+        assert not test_sentinel.master.exists(get_tag_key(my_func, 1))
+
+        delete_succedeed = delete_memoized_essential(my_func, 1)
+        assert delete_succedeed is False, delete_succedeed
+
+
+    def test_memoized_calls_are_tagged(self):
+        """Test CACHE memoize registers the stored keys of a function in the
+        function tag set, which expires with them"""
+
+        @memoize(timeout=100)
+        def my_func(*args, **kwargs):
+            return [args, kwargs]
+        my_func('arg')
+        my_func('other')
+        key_pattern = "%s:%s_args:*" % (REDIS_KEYPREFIX, my_func.__name__)
+        tag = get_tag_key(my_func)
+
+        tagged = set(test_sentinel.master.zrange(tag, 0, -1))
+        assert tagged == set(test_sentinel.master.keys(key_pattern)), tagged
+        assert 0 < test_sentinel.master.ttl(tag) <= 100
+
+        delete_memoized(my_func, 'arg')
+        assert test_sentinel.master.zcard(tag) == 1
+        delete_memoized(my_func)
+        assert not test_sentinel.master.exists(tag)
+        assert test_sentinel.master.keys(key_pattern) == []
+
+
+    def test_memoized_tags_drop_expired_keys(self):
+        """Test CACHE memoize drops the keys already expired from the tag
+        set of a function when a value is stored"""
+
+        @memoize(timeout=100)
+        def my_func(*args, **kwargs):
+            return [args, kwargs]
+        tag = get_tag_key(my_func)
+        test_sentinel.master.zadd(tag, 1, 'expired')
+        my_func('arg')
+
+        tagged = test_sentinel.master.zrange(tag, 0, -1)
+        assert len(tagged) == 1 and 'expired' not in tagged, tagged
+
+
+    def test_delete_memoized_essential_with_kwargs(self):
+        """Test CACHE delete_memoized_essential accepts the essential
+        arguments as keyword arguments"""
+
+        @memoize_essentials(essentials=[0])
+        def my_func(*args, **kwargs):
+            return [args, kwargs]
+        my_func(1, 'arg')
+
+        assert get_tag_key(my_func, project_id=1) == get_tag_key(my_func, 1)
+        assert delete_memoized_essential(my_func, project_id=1) is True
+
+
+    def test_set_memoized_is_read_by_memoized_function(self):
+        """Test CACHE set_memoized stores a value that the memoized function
+        returns without being called"""
+
+        calls = []
+        @memoize(timeout=100)
+        def my_func(arg):
+            calls.append(arg)
+            return 'computed %s' % arg
+        set_memoized(my_func, 'stored', 'arg')
+
+        assert my_func('arg') == 'stored', my_func('arg')
+        assert my_func('other') == 'computed other'
+        assert calls == ['other'], calls
+        assert test_sentinel.master.zcard(get_tag_key(my_func)) == 2
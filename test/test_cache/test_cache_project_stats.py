@@ -72,6 +72,94 @@ class TestProjectsStatsCache(Test):
         assert len(anon_users) == 0, len(anon_users)
         assert len(auth_users) == 1, len(auth_users)
 
+    @with_context
+    def test_stats_users_with_period_counts_whole_days(self):
+        """Test CACHE PROJECT STATS user stats with period counts the task
+        runs of every day within the period."""
+        pr = ProjectFactory.create()
+        first_day = date.today() - timedelta(days=6)
+        day_before = first_day - timedelta(days=1)
+        TaskRunFactory.create(project=pr,
+                              finish_time=first_day.isoformat() + 'T00:00:01')
+        TaskRunFactory.create(project=pr,
+                              finish_time=day_before.isoformat() + 'T23:59:59')
+        users, anon_users, auth_users = stats_users(pr.id, '1 week')
+        assert users['n_auth'] == 1, users
+        assert len(auth_users) == 1, auth_users
+
+    @with_context
+    def test_update_hourly_stats_counts_new_task_runs_once(self):
+        """Test CACHE PROJECT STATS update_hourly_stats only adds the task
+        runs saved since the last update."""
+        from pybossa.core import db
+        pr = ProjectFactory.create()
+        TaskRunFactory.create_batch(2, project=pr)
+        update_hourly_stats(pr.id)
+        update_hourly_stats(pr.id)
+        TaskRunFactory.create(project=pr)
+        AnonymousTaskRunFactory.create(project=pr)
+        update_hourly_stats(pr.id)
+
+        rows = db.session.query(ProjectHourlyStats)\
+                 .filter_by(project_id=pr.id).all()
+        assert sum(row.n_auth for row in rows) == 3, rows
+        assert sum(row.n_anon for row in rows) == 1, rows
+        assert sum(len(row.auth_users) for row in rows) == 3, rows
+
+    @with_context
+    def test_update_hourly_stats_counts_task_runs_committed_late(self):
+        """Test CACHE PROJECT STATS update_hourly_stats counts a task run
+        committed after one with a higher id was counted, and only once."""
+        from pybossa.core import db
+        pr = ProjectFactory.create()
+        TaskRunFactory.create(project=pr, id=100000)
+        update_hourly_stats(pr.id)
+        TaskRunFactory.create(project=pr)
+        update_hourly_stats(pr.id)
+        update_hourly_stats(pr.id)
+
+        rows = db.session.query(ProjectHourlyStats)\
+                 .filter_by(project_id=pr.id).all()
+        assert sum(row.n_auth for row in rows) == 2, rows
+
+    @with_context
+    def test_hourly_stats_are_rebuilt_after_a_task_run_is_deleted(self):
+        """Test CACHE PROJECT STATS hourly stats do not count deleted task
+        runs."""
+        from pybossa.core import db
+        pr = ProjectFactory.create()
+        task_run = TaskRunFactory.create(project=pr)
+        TaskRunFactory.create(project=pr)
+        users, anon_users, auth_users = stats_users(pr.id, '1 week')
+        assert users['n_auth'] == 2, users
+
+        db.session.delete(task_run)
+        db.session.commit()
+
+        users, anon_users, auth_users = stats_users(pr.id, '1 week')
+        assert users['n_auth'] == 1, users
+
+    @with_context
+    def test_hourly_stats_recount_only_the_hour_of_a_deleted_task_run(self):
+        """Test CACHE PROJECT STATS deleting a task run only counts again
+        the hour it finished in."""
+        from pybossa.core import db, task_repo
+        pr = ProjectFactory.create()
+        day = (datetime.utcnow() - timedelta(days=2)).strftime('%Y-%m-%d')
+        task_run = TaskRunFactory.create(project=pr,
+                                         finish_time=day + 'T10:10:00.000000')
+        TaskRunFactory.create(project=pr, finish_time=day + 'T10:20:00.000000')
+        TaskRunFactory.create(project=pr, finish_time=day + 'T11:20:00.000000')
+        update_hourly_stats(pr.id)
+
+        task_repo.delete(task_run)
+
+        rows = db.session.query(ProjectHourlyStats)\
+                 .filter_by(project_id=pr.id).order_by('hour').all()
+        assert [row.hour for row in rows] == [day + 'T10', day + 'T11'], rows
+        assert [row.n_auth for row in rows] == [1, 1], rows
+        assert [len(row.auth_users) for row in rows] == [1, 1], rows
+
     @with_context
     def test_stats_dates(self):
         """Test CACHE PROJECT STATS date works."""
@@ -432,6 +432,43 @@ class TestProjectsCache(Test):
         assert cached_tasks[0].get('pct_status') == 1.0, cached_tasks[0].get('pct_status')
 
 
+    @with_context
+    def test_browse_tasks_returns_info_columns(self):
+        """Test CACHE PROJECTS browse_tasks returns the requested info
+        columns of each task"""
+
+        project = ProjectFactory.create()
+        TaskFactory.create(project=project, info={'name': 'a', 'n': 1})
+        TaskFactory.create(project=project, info={'n': 2})
+
+        count, cached_tasks = cached_projects.browse_tasks(
+            project.id, {}, ['name', 'n'])
+
+        assert cached_tasks[0]['name'] == 'a', cached_tasks[0]
+        assert cached_tasks[0]['n'] == 1, cached_tasks[0]
+        assert cached_tasks[1]['name'] == '', cached_tasks[1]
+        assert cached_tasks[1]['n'] == 2, cached_tasks[1]
+
+
+    @with_context
+    def test_searchable_columns_reset_on_task_import_only(self):
+        """Test CACHE PROJECTS the cached searchable columns of a project
+        are reset when tasks are saved, not when they are answered"""
+        from pybossa.cache.task_browse_helpers import get_searchable_columns
+        project = ProjectFactory.create()
+        task = TaskFactory.create(project=project, info={'a': 1})
+        assert get_searchable_columns(project.id) == ['a']
+
+        TaskRunFactory.create(project=project, task=task)
+        TaskFactory.create(project=project, info={'b': 1})
+        assert get_searchable_columns(project.id) == ['b']
+
+        with patch('pybossa.cache.projects.delete_memoized') as delete:
+            TaskRunFactory.create(project=project, task=task)
+            calls = [call[0][0] for call in delete.call_args_list]
+            assert get_searchable_columns not in calls, calls
+
+
     @with_context
     def test_n_featured_returns_nothing(self):
         """Test CACHE PROJECTS _n_featured 0 if there are no featured projects"""
@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 
+from mock import patch
 from default import Test, with_context
 from pybossa.cache import users as cached_users
 from pybossa.model.user import User
@@ -54,6 +55,21 @@ class TestUsersCache(Test):
         assert type(zizou) is dict, type(zizou)
         assert zizou != None, zizou
 
+    @with_context
+    def test_warm_user_summaries(self):
+        """Test CACHE USERS warm_user_summaries returns the summaries of the
+        users requested"""
+        UserFactory.create(name='zidane')
+        UserFactory.create(name='figo')
+        UserFactory.create(name='ronaldo')
+
+        summaries = cached_users.warm_user_summaries(['zidane', 'figo',
+                                                      'nouser'])
+
+        assert sorted(user['name'] for user in summaries) == ['figo', 'zidane']
+        for user in summaries:
+            assert user == cached_users.get_user_summary(user['name']), user
+
     @with_context
     def test_public_get_user_summary_user_exists(self):
         """Test public CACHE USERS get_user_summary returns a dict with the user data
@@ -523,3 +539,79 @@ class TestUsersCache(Test):
         for field in fields:
             assert field in users[0].keys(), field
         assert len(users[0].keys()) == len(fields)
+
+    @with_context
+    def test_get_api_key_owner(self):
+        """Test CACHE USERS get_api_key_owner returns the owner id and flags"""
+        user = UserFactory.create(admin=True)
+
+        owner = cached_users.get_api_key_owner(user.api_key)
+
+        assert owner == dict(id=user.id, enabled=True, admin=True,
+                             subadmin=False), owner
+        assert cached_users.get_api_key_owner('unknown') is None
+
+    @with_context
+    def test_get_api_key_owner_is_reset_on_user_update(self):
+        """Test CACHE USERS get_api_key_owner is reset when the user flags or
+        API key change"""
+        from pybossa.core import user_repo
+        from pybossa.model import make_uuid
+        user = UserFactory.create()
+        old_api_key = user.api_key
+        assert cached_users.get_api_key_owner(old_api_key)['enabled']
+
+        user.enabled = False
+        user_repo.update(user)
+        assert cached_users.get_api_key_owner(old_api_key)['enabled'] is False
+
+        user.api_key = make_uuid()
+        user_repo.update(user)
+        assert cached_users.get_api_key_owner(old_api_key) is None
+        assert cached_users.get_api_key_owner(user.api_key)['id'] == user.id
+
+    @with_context
+    @patch('pybossa.cache.users.db')
+    def test_get_api_key_owner_does_not_cache_unknown_keys(self, db_mock):
+        """Test CACHE USERS get_api_key_owner looks an unknown key up again
+        every time"""
+        db_mock.session.execute.return_value.first.return_value = None
+
+        assert cached_users.get_api_key_owner('unknown') is None
+        assert cached_users.get_api_key_owner('unknown') is None
+
+        assert db_mock.session.execute.call_count == 2
+
+    @with_context
+    def test_api_key_user_of_deleted_user_is_anonymous(self):
+        """Test an APIKeyUser whose row was deleted is treated as
+        anonymous"""
+        from pybossa.model.user import APIKeyUser
+        api_key_user = APIKeyUser(id=9999, enabled=True, admin=True,
+                                  subadmin=False, api_key='gone')
+
+        assert api_key_user.name is None
+        assert api_key_user.is_anonymous()
+        assert not api_key_user.is_authenticated()
+        assert api_key_user.admin is False
+
+    @with_context
+    def test_api_key_user_replaces_itself_with_the_user_row(self):
+        """Test an APIKeyUser hands its User row to current_user once the
+        row is loaded"""
+        from flask import _request_ctx_stack
+        from flask.ext.login import current_user
+        from pybossa.model.user import APIKeyUser
+        user = UserFactory.create()
+
+        with self.flask_app.test_request_context('/'):
+            api_key_user = APIKeyUser(api_key=user.api_key,
+                                      **cached_users.get_api_key_owner(
+                                          user.api_key))
+            _request_ctx_stack.top.user = api_key_user
+            assert current_user._get_current_object() is api_key_user
+            assert current_user.id == user.id
+
+            assert current_user.name == user.name
+            assert type(current_user._get_current_object()) is User
+            assert current_user._get_current_object().id == user.id
@@ -0,0 +1,129 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from mock import patch
+from pybossa.cache import memoize, delete_memoized
+from pybossa.cache.local_cache import LocalCache
+from pybossa.sentinel import Sentinel
+from settings_test import REDIS_SENTINEL
+
+
+class FakeApp(object):
+    def __init__(self):
+        self.config = { 'REDIS_SENTINEL': REDIS_SENTINEL }
+
+test_sentinel = Sentinel(app=FakeApp())
+
+
+class TestLocalCache(object):
+
+    def test_get_returns_stored_value(self):
+        """Test LocalCache returns the values stored and None otherwise"""
+        local = LocalCache(10, 30)
+        local.set('key', 'value', 60)
+
+        assert local.get('key') == 'value', local.get('key')
+        assert local.get('other') is None
+
+    def test_least_recently_used_are_evicted(self):
+        """Test LocalCache evicts the least recently used values"""
+        local = LocalCache(2, 30)
+        local.set('a', 1, 60)
+        local.set('b', 2, 60)
+        local.get('a')
+        local.set('c', 3, 60)
+
+        assert local.get('a') == 1
+        assert local.get('b') is None
+        assert local.get('c') == 3
+
+    @patch('pybossa.cache.local_cache.time')
+    def test_values_expire(self, time):
+        """Test LocalCache keeps values for the shortest of both timeouts"""
+        local = LocalCache(10, 30)
+        time.time.return_value = 100
+        local.set('short', 1, 10)
+        local.set('long', 2, 60)
+
+        time.time.return_value = 120
+        assert local.get('short') is None
+        assert local.get('long') == 2
+
+        time.time.return_value = 140
+        assert local.get('long') is None
+
+    def test_set_is_skipped_after_invalidation(self):
+        """Test LocalCache does not store values read before an
+        invalidation"""
+        local = LocalCache(10, 30)
+        generation = local.generation
+        local.invalidate('key:key')
+
+        assert local.set('key', 'stale', 60, generation) is False
+        assert local.get('key') is None
+
+    def test_invalidate(self):
+        """Test LocalCache applies key and prefix invalidation messages"""
+        local = LocalCache(10, 30)
+        local.set('f_args:1', 1, 60)
+        local.set('f_args:2', 2, 60)
+        local.set('g_args:1', 3, 60)
+
+        local.invalidate('key:f_args:1')
+        assert local.get('f_args:1') is None
+        assert local.get('f_args:2') == 2
+
+        local.invalidate('prefix:f_args:')
+        assert local.get('f_args:2') is None
+        assert local.get('g_args:1') == 3
+
+        local.invalidate('flush')
+        assert local.get('g_args:1') is None
+
+
+@patch('pybossa.cache.sentinel', new=test_sentinel)
+class TestLocalMemoize(object):
+
+    def setUp(self):
+        test_sentinel.master.flushall()
+        self.local = LocalCache(10, 30)
+
+    @patch.dict(os.environ)
+    def test_memoize_local_reads_from_local_cache(self):
+        """Test CACHE memoize with local=True serves values from the local
+        cache until they are deleted"""
+        os.environ.pop('PYBOSSA_REDIS_CACHE_DISABLED', None)
+        local_state = dict(pid=os.getpid(), cache=self.local, listener=None)
+
+        @memoize(local=True)
+        def my_func(arg, call_count=[]):
+            call_count.append(1)
+            return len(call_count)
+
+        with patch('pybossa.cache.get_local_cache', return_value=self.local), \
+                patch('pybossa.cache._local', new=local_state), \
+                patch('pybossa.cache.settings.LOCAL_CACHE_SIZE', 10,
+                      create=True):
+            assert my_func('arg') == 1
+            assert my_func('arg') == 1
+            test_sentinel.master.flushall()
+            assert my_func('arg') == 1, 'Value not served locally'
+
+            delete_memoized(my_func, 'arg')
+            assert my_func('arg') == 2
@@ -85,5 +85,26 @@ class TestTaskCsvExporter(Test):
         assert chinese_value == u'\u4E2D\u570B\u7684 \u82F1\u8A9E \u7F8E\u570B\u4EBA'
         assert smart_quotes_value == u'\u201CHello\u201D'
 
+    @with_context
+    def test_task_csv_exporter_is_exported_key(self):
+        """Test that TaskCsvExporter only keeps keys of exported columns."""
+        exporter = TaskCsvExporter()
+        row = {'info': None,
+               'task': {'info': None},
+               'user': {'name': None}}
+
+        assert exporter._is_exported_key(row, 'info__a__b')
+        assert exporter._is_exported_key(row, 'task__info__a')
+        assert not exporter._is_exported_key(row, 'user__user_pref__a')
+        assert not exporter._is_exported_key(row, 'unknown__a')
 
+    @with_context
+    def test_task_csv_exporter_flush(self):
+        """Test that TaskCsvExporter flush returns and empties the buffer."""
+        from cStringIO import StringIO
+        exporter = TaskCsvExporter()
+        out = StringIO()
+        out.write('a,b\r\n')
 
+        assert exporter._flush(out) == 'a,b\r\n'
+        assert exporter._flush(out) == ''
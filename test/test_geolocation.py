@@ -0,0 +1,51 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+
+from mock import patch
+from pybossa.geolocation import GeoLocator
+
+
+class TestGeoLocator(object):
+
+    @patch('pybossa.geolocation.pygeoip')
+    def test_database_is_memory_mapped(self, pygeoip):
+        """Test GeoLocator opens the database memory mapped"""
+        GeoLocator('GeoLiteCity.dat')
+
+        pygeoip.GeoIP.assert_called_once_with('GeoLiteCity.dat',
+                                              flags=pygeoip.MMAP_CACHE)
+
+    @patch('pybossa.geolocation.pygeoip')
+    def test_locate_looks_up_each_address_once(self, pygeoip):
+        """Test GeoLocator keeps the location of the addresses it found"""
+        record = {'latitude': 1, 'longitude': 2, 'city': 'Madrid'}
+        pygeoip.GeoIP.return_value.record_by_addr.return_value = record
+        locator = GeoLocator('GeoLiteCity.dat')
+
+        assert locator.locate('1.1.1.1') == record
+        assert locator.locate('1.1.1.1') == record
+        record_by_addr = pygeoip.GeoIP.return_value.record_by_addr
+        record_by_addr.assert_called_once_with('1.1.1.1')
+
+    @patch('pybossa.geolocation.pygeoip')
+    def test_locate_unknown_address(self, pygeoip):
+        """Test GeoLocator places unknown addresses at 0, 0"""
+        pygeoip.GeoIP.return_value.record_by_addr.return_value = None
+        locator = GeoLocator('GeoLiteCity.dat')
+
+        assert locator.locate('2.2.2.2') == {'latitude': 0, 'longitude': 0}
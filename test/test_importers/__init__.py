@@ -79,6 +79,37 @@ class TestImporterPublicMethods(Test):
         assert result.message == 'It looks like there were no new records to import.', result.message
         importer_factory.assert_called_with(**form_data)
 
+    @with_context
+    def test_create_tasks_not_creates_duplicated_tasks_in_import(self, importer_factory):
+        mock_importer = Mock()
+        mock_importer.tasks.return_value = [{'info': {'question': 'question'}},
+                                            {'info': {'question': 'question'}}]
+        importer_factory.return_value = mock_importer
+        project = ProjectFactory.create()
+        form_data = dict(type='flickr', album_id='1234')
+
+        result = self.importer.create_tasks(task_repo, project, **form_data)
+        tasks = task_repo.filter_tasks_by(project_id=project.id)
+
+        assert len(tasks) == 1, len(tasks)
+        assert result.total == 1, result.total
+
+    @with_context
+    @patch.object(Importer, 'BATCH_SIZE', 2)
+    def test_create_tasks_saves_them_in_batches(self, importer_factory):
+        mock_importer = Mock()
+        mock_importer.tasks.return_value = [{'info': {'question': i}}
+                                            for i in range(5)]
+        importer_factory.return_value = mock_importer
+        project = ProjectFactory.create()
+        form_data = dict(type='gdocs', googledocs_url='http://ggl.com')
+
+        result = self.importer.create_tasks(task_repo, project, **form_data)
+        tasks = task_repo.filter_tasks_by(project_id=project.id)
+
+        assert len(tasks) == 5, len(tasks)
+        assert result.total == 5, result.total
+
     @with_context
     def test_create_tasks_returns_task_report(self, importer_factory):
         mock_importer = Mock()
@@ -37,7 +37,7 @@ class TestDashBoardActiveUsers(Test):
         db_mock.slave_session.execute.return_value = results
         res = active_users_week()
         assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed'
+        assert res == 'Materialized view refreshed concurrently'
 
     @with_context
     @patch('pybossa.dashboard.jobs.db')
@@ -62,6 +62,21 @@ class TestDashBoardActiveUsers(Test):
 
         assert results[0].n_users == 1, results[0].n_users
 
+    @with_context
+    def test_active_week_refreshed_concurrently(self):
+        """Test JOB dashboard view is created with an index to be refreshed
+        concurrently."""
+        TaskRunFactory.create()
+        active_users_week()
+        TaskRunFactory.create()
+
+        res = active_users_week()
+
+        assert res == 'Materialized view refreshed concurrently', res
+        sql = "select * from dashboard_week_users;"
+        results = db.session.execute(sql).fetchall()
+        assert results[0].n_users == 2, results[0].n_users
+
     @with_context
     def test_format_users_week(self):
         """Test format users week works."""
@@ -43,7 +43,7 @@ class TestDashBoardDraftProject(Test):
         db_mock.slave_session.execute.return_value = results
         res = draft_projects_week()
         assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed'
+        assert res == 'Materialized view refreshed concurrently'
 
     @with_context
     @patch('pybossa.dashboard.jobs.db')
@@ -90,7 +90,7 @@ class TestDashBoardPublishedProject(Test):
         db_mock.slave_session.execute.return_value = results
         res = published_projects_week()
         assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed'
+        assert res == 'Materialized view refreshed concurrently'
 
     @with_context
     @patch('pybossa.dashboard.jobs.db')
@@ -126,6 +126,21 @@ class TestDashBoardPublishedProject(Test):
         assert res['owner_id'] == p.owner.id
         assert res['u_name'] == p.owner.name
 
+    @with_context
+    def test_published_projects_week_refreshed_concurrently(self):
+        """Test published_projects_week keeps a row per publication, so it
+        can be refreshed concurrently."""
+        p = ProjectFactory.create(published=True)
+        auditlogger = AuditLogger(auditlog_repo, caller='web')
+        auditlogger.log_event(p, p.owner, 'update', 'published', False, True)
+        auditlogger.log_event(p, p.owner, 'update', 'published', False, True)
+        published_projects_week()
+
+        res = published_projects_week()
+
+        assert res == 'Materialized view refreshed concurrently', res
+        assert len(format_published_projects()) == 2
+
 
 class TestDashBoardUpdateProject(Test):
 
@@ -139,7 +154,7 @@ class TestDashBoardUpdateProject(Test):
         db_mock.slave_session.execute.return_value = results
         res = update_projects_week()
         assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed'
+        assert res == 'Materialized view refreshed concurrently'
 
     @with_context
     @patch('pybossa.dashboard.jobs.db')
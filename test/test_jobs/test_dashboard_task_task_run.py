@@ -38,7 +38,7 @@ class TestDashBoardNewTask(Test):
         db_mock.slave_session.execute.return_value = results
         res = new_tasks_week()
         assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed'
+        assert res == 'Materialized view refreshed concurrently'
 
     @with_context
     @patch('pybossa.dashboard.jobs.db')
@@ -99,7 +99,7 @@ class TestDashBoardNewTaskRuns(Test):
         db_mock.slave_session.execute.return_value = results
         res = new_task_runs_week()
         assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed'
+        assert res == 'Materialized view refreshed concurrently'
 
     @with_context
     @patch('pybossa.dashboard.jobs.db')
@@ -39,7 +39,7 @@ class TestDashBoardNewUsers(Test):
         db_mock.slave_session.execute.return_value = results
         res = new_users_week()
         assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed'
+        assert res == 'Materialized view refreshed concurrently'
 
     @with_context
     @patch('pybossa.dashboard.jobs.db')
@@ -101,7 +101,7 @@ class TestDashBoardReturningUsers(Test):
         db_mock.slave_session.execute.return_value = results
         res = returning_users_week()
         assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed'
+        assert res == 'Materialized view refreshed concurrently'
 
     @with_context
     @patch('pybossa.dashboard.jobs.db')
@@ -18,56 +18,101 @@
 
 from pybossa.leaderboard.jobs import leaderboard
 from pybossa.leaderboard.data import get_leaderboard
-from pybossa.core import db
-from factories import UserFactory, TaskRunFactory
+from pybossa.leaderboard.board import Leaderboard
+from pybossa.core import sentinel
+from factories import UserFactory, TaskRunFactory, ProjectFactory
 from default import Test, with_context
-from mock import patch, MagicMock
-from sqlalchemy.exc import ProgrammingError
+from mock import patch
 
 
 class TestDashBoardActiveAnon(Test):
 
     @with_context
-    @patch('pybossa.leaderboard.jobs.db')
-    def test_materialized_view_refreshed_concurrently(self, db_mock):
-        """Test JOB leaderboard materialized view is refreshed."""
-        result = MagicMock()
-        result.exists = True
-        results = [result]
-        db_mock.slave_session.execute.return_value = results
+    def test_leaderboard_rebuilt(self):
+        """Test JOB leaderboard rebuilds the site leaderboard."""
+        user = UserFactory.create()
+        TaskRunFactory.create_batch(2, user=user)
+
         res = leaderboard()
-        assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed concurrently'
+
+        assert res == 'Leaderboard rebuilt', res
+        board = Leaderboard(sentinel.master)
+        assert board.is_built('site')
+        assert board.rank('site', user.id) == (1, 2)
 
     @with_context
-    @patch('pybossa.leaderboard.jobs.exists_materialized_view')
-    @patch('pybossa.leaderboard.jobs.db')
-    def test_materialized_view_refreshed(self, db_mock, exists_mock):
-        """Test JOB leaderboard materialized view is refreshed."""
-        result = MagicMock()
-        result.exists = True
-        results = [result]
-        exists_mock.return_value = True
-        db_mock.slave_session.execute.side_effect = results
-        db_mock.session.execute.side_effect = [ProgrammingError('foo',
-                                                                'bar',
-                                                                'bar'),
-                                               True]
+    @patch('pybossa.leaderboard.jobs.Leaderboard')
+    def test_leaderboard_not_rebuilt_twice(self, board_mock):
+        """Test JOB leaderboard skips a rebuild already running."""
+        board_mock.return_value.acquire_rebuild.return_value = None
+
         res = leaderboard()
-        assert db_mock.session.execute.called
-        assert res == 'Materialized view refreshed'
+
+        assert res == 'Leaderboard already being rebuilt', res
+        assert not board_mock.return_value.rebuild.called
 
     @with_context
-    @patch('pybossa.leaderboard.jobs.db')
-    def test_materialized_view_created(self, db_mock):
-        """Test JOB leaderboard materialized view is created."""
-        result = MagicMock()
-        result.exists = False
-        results = [result]
-        db_mock.slave_session.execute.return_value = results
-        res = leaderboard()
-        assert db_mock.session.commit.called
-        assert res == 'Materialized view created'
+    @patch('pybossa.leaderboard.jobs.Leaderboard.BATCH_SIZE', 2)
+    def test_leaderboard_rebuilt_in_chunks(self):
+        """Test JOB leaderboard counts the answers of users in chunks."""
+        users = UserFactory.create_batch(5)
+        for i, user in enumerate(users):
+            TaskRunFactory.create_batch(i, user=user)
+
+        leaderboard()
+
+        board = Leaderboard(sentinel.master)
+        assert board.rank('site', users[4].id) == (1, 4)
+        assert board.rank('site', users[1].id)[1] == 1
+
+    @with_context
+    def test_project_and_week_leaderboards(self):
+        """Test JOB leaderboard rebuilds project and week leaderboards."""
+        project = ProjectFactory.create()
+        user = UserFactory.create()
+        TaskRunFactory.create(user=user, project=project)
+        TaskRunFactory.create(user=user)
+
+        leaderboard(project_id=project.id)
+        leaderboard(week=True)
+
+        top = get_leaderboard(project_id=project.id)
+        assert [(u['name'], u['score']) for u in top] == [(user.name, 1)]
+        top = get_leaderboard(week=True)
+        assert top[0]['name'] == user.name and top[0]['score'] == 2, top
+
+    @with_context
+    @patch('pybossa.leaderboard.data.leaderboard_queue')
+    def test_get_leaderboard_schedules_rebuild(self, queue_mock):
+        """Test get_leaderboard schedules the rebuild of a leaderboard not
+        up to date, once, and serves the current one meanwhile."""
+        project = ProjectFactory.create()
+        user = UserFactory.create()
+        TaskRunFactory.create(user=user, project=project)
+        leaderboard(project_id=project.id)
+        Leaderboard(sentinel.master).invalidate('project:%s' % project.id)
+
+        top = get_leaderboard(project_id=project.id)
+        get_leaderboard(project_id=project.id)
+
+        assert [(u['name'], u['score']) for u in top] == [(user.name, 1)]
+        assert queue_mock.enqueue_call.call_count == 1
+        kwargs = queue_mock.enqueue_call.call_args[1]['kwargs']
+        assert kwargs['project_id'] == project.id, kwargs
+        assert kwargs['week'] is False, kwargs
+        assert kwargs['token'], kwargs
+
+    @with_context
+    def test_answers_update_built_leaderboard(self):
+        """Test answers committed update a built leaderboard."""
+        user = UserFactory.create()
+        leaderboard()
+        TaskRunFactory.create_batch(3, user=user)
+
+        top = get_leaderboard(1)
+
+        assert top[0]['name'] == user.name, top
+        assert top[0]['score'] == 3, top
 
     @with_context
     def test_anon_week(self):
@@ -71,6 +71,24 @@ class TestProjectsStats(Test):
         err_msg = "There should have the same kwargs, but it's: %s" % job['kwargs']
         assert {} == job['kwargs'], err_msg
 
+    @with_context
+    def test_get_project_jobs_only_for_dirty_projects(self):
+        """Test JOB get project jobs skips projects without activity and
+        projects with a stats job already queued."""
+        from pybossa.core import sentinel
+        from pybossa.stats_scheduler import DirtyProjects
+        owner = UserFactory.create(pro=False)
+        project = ProjectFactory.create(owner=owner)
+
+        assert len(list(get_project_jobs('high'))) == 1
+        assert len(list(get_project_jobs('high'))) == 0
+
+        TaskFactory.create(project=project)
+        assert len(list(get_project_jobs('high'))) == 0
+
+        DirtyProjects(sentinel.master).release(project.id)
+        assert len(list(get_project_jobs('high'))) == 1
+
     @with_context
     def test_get_project_jobs_for_non_pro_users(self):
         """Test JOB get project jobs works for non pro users."""
@@ -0,0 +1,145 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+
+from redis import StrictRedis
+from pybossa.leaderboard.board import (Leaderboard, SITE_SCOPE, project_scope,
+                                       week_scope)
+
+
+class TestLeaderboard(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.board = Leaderboard(self.connection)
+
+    def test_not_built_by_default(self):
+        assert not self.board.is_built(SITE_SCOPE)
+
+    def test_rebuild_ranks_by_score(self):
+        self.board.rebuild(SITE_SCOPE, [(1, 2), (2, 5), (3, 0)])
+
+        assert self.board.is_built(SITE_SCOPE)
+        assert self.board.top(SITE_SCOPE, 2) == [(1, 2, 5), (2, 1, 2)]
+        assert self.board.rank(SITE_SCOPE, 3) == (3, 0)
+        assert self.board.rank(SITE_SCOPE, 4) is None
+
+    def test_page_around_rank(self):
+        self.board.rebuild(SITE_SCOPE, [(i, i) for i in range(1, 11)])
+
+        page = self.board.page(SITE_SCOPE, 3 - 3, 3 + 3)
+
+        assert [user_id for _, user_id, _ in page] == range(10, 4, -1)
+        assert page[0][0] == 1
+
+    def test_record_only_updates_built_leaderboards(self):
+        answers = [(1, 10, None, '2017-09-13T10:00:00'),
+                   (1, None, '127.0.0.1', '2017-09-13T10:00:00')]
+        self.board.rebuild(SITE_SCOPE, [])
+        self.board.record(answers)
+
+        assert self.board.rank(SITE_SCOPE, 10) == (1, 1)
+        assert self.board.rank(project_scope(1), 10) is None
+
+        self.board.rebuild(week_scope('2017-09-13'), [(10, 1)])
+        self.board.record(answers)
+
+        assert self.board.rank(SITE_SCOPE, 10) == (1, 2)
+        assert self.board.rank(week_scope('2017-09-11'), 10) == (1, 2)
+
+    def test_add_user_keeps_score(self):
+        self.board.rebuild(SITE_SCOPE, [(1, 3)])
+
+        assert not self.board.add_user(1)
+        assert self.board.add_user(2)
+        assert self.board.top(SITE_SCOPE, 5) == [(1, 1, 3), (2, 2, 0)]
+
+    def test_invalidate_keeps_serving_leaderboard(self):
+        self.board.rebuild(project_scope(1), [(1, 3)])
+        self.board.invalidate(project_scope(1))
+
+        assert not self.board.is_built(project_scope(1))
+        assert self.board.top(project_scope(1), 5) == [(1, 1, 3)]
+
+    def test_rebuild_keeps_answers_of_users_already_read(self):
+        answers = [(1, 1, None, '2017-09-13T10:00:00'),
+                   (1, 3, None, '2017-09-13T10:00:00')]
+
+        token = self.board.acquire_rebuild(SITE_SCOPE)
+
+        def scores():
+            self.board.mark_read(SITE_SCOPE, token, 2)
+            # Recorded once user 1 was read from SQL, but not user 3
+            self.board.record(answers)
+            yield 1, 2
+            yield 2, 1
+            self.board.mark_read(SITE_SCOPE, token, 4)
+            yield 3, 2
+
+        assert self.board.rebuild(SITE_SCOPE, scores(), token)
+
+        assert self.board.top(SITE_SCOPE, 5) == [(1, 1, 3), (2, 3, 2),
+                                                 (3, 2, 1)]
+
+    def test_rebuild_dropped_if_invalidated_meanwhile(self):
+        self.board.rebuild(project_scope(1), [(1, 3)])
+
+        def scores():
+            self.board.invalidate(project_scope(1))
+            yield 1, 4
+
+        assert not self.board.rebuild(project_scope(1), scores())
+        assert not self.board.is_built(project_scope(1))
+        assert self.board.top(project_scope(1), 5) == [(1, 1, 3)]
+
+    def test_rebuild_dropped_if_lock_lost(self):
+        token = self.board.acquire_rebuild(SITE_SCOPE)
+        self.connection.delete(Leaderboard.REBUILD_LOCK_KEY.format(SITE_SCOPE))
+        other = self.board.acquire_rebuild(SITE_SCOPE)
+
+        assert not self.board.mark_read(SITE_SCOPE, token, 2)
+        assert not self.board.rebuild(SITE_SCOPE, [(1, 3)], token)
+
+        assert not self.board.is_built(SITE_SCOPE)
+        assert self.board.rebuild(SITE_SCOPE, [(2, 1)], other)
+        assert self.board.top(SITE_SCOPE, 5) == [(1, 2, 1)]
+
+    def test_rebuild_keeps_lock_while_writing_batches(self):
+        self.board.BATCH_SIZE = 2
+        token = self.board.acquire_rebuild(SITE_SCOPE)
+        lock_key = Leaderboard.REBUILD_LOCK_KEY.format(SITE_SCOPE)
+        ttls = []
+
+        def scores():
+            for user_id in range(1, 6):
+                ttls.append(self.connection.ttl(lock_key))
+                self.connection.expire(lock_key, 1)
+                yield user_id, user_id
+
+        assert self.board.rebuild(SITE_SCOPE, scores(), token)
+        assert [ttl > 1 for ttl in ttls] == [True, False, True, False, True]
+
+    def test_apply_changes(self):
+        self.board.rebuild(SITE_SCOPE, [(1, 3), (2, 1)])
+        self.board.rebuild(project_scope(1), [(1, 3)])
+
+        self.board.apply([('add_user', 3), ('remove_user', 2),
+                          ('invalidate', project_scope(1))])
+
+        assert self.board.top(SITE_SCOPE, 5) == [(1, 1, 3), (2, 3, 0)]
+        assert not self.board.is_built(project_scope(1))
@@ -23,7 +23,6 @@ from pybossa.core import db, task_repo, result_repo
 from pybossa.model.counter import Counter
 from pybossa.model.event_listeners import *
 from pybossa.jobs import notify_blog_users
-from sqlalchemy import func
 
 
 """Tests for model event listeners."""
@@ -95,42 +94,134 @@ class TestModelEventListeners(Test):
         obj['action_updated'] = 'Task'
         mock_update_feed.assert_called_with(obj)
 
+    @with_context
+    @patch('pybossa.model.event_listeners.object_session')
+    @patch('pybossa.model.event_listeners.complete_task_if_answered',
+           return_value=True)
+    def test_on_taskrun_submit_event(self, mock_complete, mock_session):
+        """Test on_taskrun_submit completes the task and queues the rest of
+        the side effects once per task."""
+        conn = MagicMock()
+        mock_session.return_value.info = {}
+        for user_id in (3, 4):
+            target = MagicMock()
+            target.project_id = 1
+            target.task_id = 2
+            target.user_id = user_id
+            on_taskrun_submit(None, conn, target)
+
+        mock_complete.assert_called_with(conn, 2)
+        pending = mock_session.return_value.info[PENDING_TASKRUNS]
+        assert pending == {2: dict(project_id=1, user_ids=set([3, 4]),
+                                   completed=True)}, pending
+
     @with_context
     @patch('pybossa.model.event_listeners.push_webhook')
     @patch('pybossa.model.event_listeners.create_result', return_value=1)
-    @patch('pybossa.model.event_listeners.update_task_state')
-    @patch('pybossa.model.event_listeners.is_task_completed', return_value=True)
     @patch('pybossa.model.event_listeners.add_user_contributed_to_feed')
     @patch('pybossa.model.event_listeners.update_feed')
-    def test_on_taskrun_submit_event(self, mock_update_feed,
-                                     mock_add_user,
-                                     mock_is_task,
-                                     mock_update_task,
-                                     mock_create_result,
-                                     mock_push):
-        """Test on_taskrun_submit is called."""
+    def test_process_taskrun_events(self, mock_update_feed, mock_add_user,
+                                    mock_create_result, mock_push):
+        """Test process_taskrun_events updates the feed, creates the results
+        and pushes the webhooks of the tasks completed."""
         conn = MagicMock()
-        target = MagicMock()
-        target.id = 1
-        target.project_id = 1
-        target.task_id = 2
-        target.user_id = 3
         tmp = Project(id=1, name='name', short_name='short_name',
                       info=dict(container=1, thumbnail="avatar.png"),
                       published=True,
                       webhook='http://localhost.com')
         conn.execute.return_value = [tmp]
-        on_taskrun_submit(None, conn, target)
+        pending = {2: dict(project_id=1, user_ids=set([3]), completed=True),
+                   5: dict(project_id=1, user_ids=set([3]), completed=False)}
+        process_taskrun_events(conn, pending)
         obj = tmp.to_public_json()
         obj['action_updated'] = 'TaskCompleted'
-        mock_add_user.assert_called_with(conn, target.user_id, obj)
-        mock_update_task.assert_called_with(conn, target.task_id)
+        mock_add_user.assert_called_once_with(conn, 3, obj)
         mock_update_feed.assert_called_once_with(obj)
+        mock_create_result.assert_called_once_with(conn, 1, 2)
         obj_with_webhook = tmp.to_public_json()
         obj_with_webhook['webhook'] = tmp.webhook
         obj_with_webhook['action_updated'] = 'TaskCompleted'
-        mock_push.assert_called_with(obj_with_webhook, target.task_id, 1)
+        mock_push.assert_called_once_with(obj_with_webhook, 2, 1)
+
+    @with_context
+    def test_taskrun_submit_completes_task_after_commit(self):
+        """Test a task run completing its task creates a result once
+        committed."""
+        task = TaskFactory.create(n_answers=1)
+        TaskRunFactory.create(task=task)
 
+        assert task_repo.get_task(task.id).state == 'completed'
+        results = result_repo.filter_by(project_id=task.project_id,
+                                        task_id=task.id)
+        assert len(results) == 1, results
+        assert db.session().info.get(PENDING_TASKRUNS) is None
+
+
+    @with_context
+    @patch('pybossa.model.event_listeners.ready_tasks')
+    def test_ready_task_changes_applied_after_commit(self, mock_ready_tasks):
+        """Test the ready task queue is only answered once the task run is
+        committed."""
+        task = TaskFactory.create(n_answers=2)
+        mock_ready_tasks.reset_mock()
+        TaskRunFactory.create(task=task)
+
+        mock_ready_tasks.answer.assert_called_once_with(task.project_id,
+                                                        task.id)
+        assert db.session().info.get(PENDING_READY_TASKS) is None
+
+    @with_context
+    @patch('pybossa.model.event_listeners.ready_tasks')
+    def test_ready_task_changes_dropped_on_rollback(self, mock_ready_tasks):
+        """Test the ready task queue is left untouched by a rollback."""
+        task = TaskFactory.create(n_answers=2)
+        mock_ready_tasks.reset_mock()
+        db.session.add(TaskRun(project_id=task.project_id, task_id=task.id,
+                               user_ip='127.0.0.1', info='yes'))
+        db.session.flush()
+        db.session.rollback()
+
+        assert not mock_ready_tasks.answer.called
+        assert db.session().info.get(PENDING_READY_TASKS) is None
+
+    @with_context
+    @patch('pybossa.model.event_listeners.leaderboards')
+    @patch('pybossa.model.event_listeners.dirty_projects')
+    def test_stats_changes_applied_after_commit(self, mock_dirty,
+                                                mock_leaderboards):
+        """Test the dirty projects and leaderboards are updated once per
+        commit."""
+        task = TaskFactory.create(n_answers=3)
+        task_runs = TaskRunFactory.create_batch(2, task=task)
+        mock_dirty.reset_mock()
+        mock_leaderboards.reset_mock()
+        for task_run in task_runs:
+            db.session.delete(task_run)
+        db.session.commit()
+
+        mock_dirty.mark_many.assert_called_once_with({task.project_id: 2})
+        scope = 'project:%s' % task.project_id
+        mock_leaderboards.apply.assert_called_once_with(
+            [('invalidate', scope), ('invalidate', scope)])
+        assert db.session().info.get(PENDING_DIRTY_PROJECTS) is None
+        assert db.session().info.get(PENDING_LEADERBOARDS) is None
+
+    @with_context
+    @patch('pybossa.model.event_listeners.leaderboards')
+    @patch('pybossa.model.event_listeners.dirty_projects')
+    def test_stats_changes_dropped_on_rollback(self, mock_dirty,
+                                               mock_leaderboards):
+        """Test the dirty projects and leaderboards are left untouched by a
+        rollback."""
+        task = TaskFactory.create(n_answers=2)
+        mock_dirty.reset_mock()
+        db.session.add(TaskRun(project_id=task.project_id, task_id=task.id,
+                               user_ip='127.0.0.1', info='yes'))
+        db.session.flush()
+        db.session.rollback()
+
+        assert not mock_dirty.mark_many.called
+        assert db.session().info.get(PENDING_DIRTY_PROJECTS) is None
 
     @with_context
     @patch('pybossa.model.event_listeners.update_feed')
@@ -192,69 +283,58 @@ class TestModelEventListeners(Test):
         
     @with_context
     def test_counter_works_add_counter(self):
-        """Test event listener when adding a task run adds a counter."""
+        """Test event listener when adding a task run updates its counter."""
 
         task_run = TaskRunFactory.create()
 
         counters = db.session.query(Counter).filter_by(project_id=task_run.project.id,
                                                        task_id=task_run.task.id)\
-                     .order_by(Counter.id).all()
-
-        assert len(counters) == 2, counters
-        for c in counters:
-            assert c.task_id == task_run.task.id, c
-            assert c.project_id == task_run.project.id, c
-
-        counters = db.session.query(Counter.project_id, Counter.task_id, func.sum(Counter.n_task_runs))\
-                     .filter_by(project_id=task_run.project.id,
-                                task_id=task_run.task.id)\
-                     .group_by(Counter.project_id, Counter.task_id).all()
+                     .all()
 
         assert len(counters) == 1, counters
         counter = counters[0]
-        assert counter[1] == 1, counter
+        assert counter.n_task_runs == 1, counter
 
     @with_context
-    def test_delete_taskrun_adds_counter(self):
-        """Delete event for task run adds a counter."""
+    def test_delete_taskrun_updates_counter(self):
+        """Delete event for task run updates its counter."""
         task_run = TaskRunFactory.create()
+        TaskRunFactory.create(task=task_run.task)
 
-        counters = db.session.query(Counter).filter_by(project_id=task_run.project.id,
-                                                       task_id=task_run.task.id)\
-                     .order_by(Counter.id).all()
-
-        assert len(counters) == 2, counters
-        for c in counters:
-            assert c.task_id == task_run.task.id, c
-            assert c.project_id == task_run.project.id, c
-
-        counters = db.session.query(Counter.project_id, Counter.task_id, func.sum(Counter.n_task_runs))\
-                     .filter_by(project_id=task_run.project.id,
-                                task_id=task_run.task.id)\
-                     .group_by(Counter.project_id, Counter.task_id).all()
-
-        assert len(counters) == 1, counters
-        counter = counters[0]
-        assert counter[2] == 1, counter
+        counter = db.session.query(Counter).filter_by(task_id=task_run.task.id)\
+                    .one()
+        assert counter.n_task_runs == 2, counter
 
         db.session.delete(task_run)
         db.session.commit()
 
         counters = db.session.query(Counter).filter_by(project_id=task_run.project.id,
                                                        task_id=task_run.task.id)\
-                     .order_by(Counter.id).all()
-
-        assert len(counters) == 3, counters
-        for c in counters:
-            assert c.task_id == task_run.task.id, c
-            assert c.project_id == task_run.project.id, c
-
-
-        counters = db.session.query(Counter.project_id, Counter.task_id, func.sum(Counter.n_task_runs))\
-                     .filter_by(project_id=task_run.project.id,
-                                task_id=task_run.task.id)\
-                     .group_by(Counter.project_id, Counter.task_id).all()
+                     .all()
 
         assert len(counters) == 1, counters
         counter = counters[0]
-        assert counter[2] == 0, counter
+        assert counter.n_task_runs == 1, counter
+        assert counter.project_id == task_run.project.id, counter
+
+    @with_context
+    def test_counter_keeps_first_and_last_finish_times(self):
+        """Adding and deleting task runs updates the finish times of the
+        counter."""
+        first = TaskRunFactory.create(finish_time='2017-09-01T10:00:00')
+        task = first.task
+        last = TaskRunFactory.create(task=task,
+                                     finish_time='2017-09-03T10:00:00')
+        TaskRunFactory.create(task=task, finish_time='2017-09-02T10:00:00')
+
+        counter = db.session.query(Counter).filter_by(task_id=task.id).one()
+        assert counter.first_finish_time == first.finish_time, counter
+        assert counter.last_finish_time == last.finish_time, counter
+
+        db.session.delete(last)
+        db.session.commit()
+
+        counter = db.session.query(Counter).filter_by(task_id=task.id).one()
+        assert counter.n_task_runs == 2, counter
+        assert counter.first_finish_time == '2017-09-01T10:00:00', counter
+        assert counter.last_finish_time == '2017-09-02T10:00:00', counter
@@ -138,3 +138,66 @@ class TestAPI(object):
 
         url = '/api/project/1/userprogress'
         self.check_limit(url, 'get', 'project')
+
+
+class TestRateLimit(object):
+
+    def setUp(self):
+        sentinel.connection.master_for('mymaster').flushall()
+
+    @patch('pybossa.ratelimit.time')
+    def test_previous_window_is_weighted(self, time):
+        """Test RateLimit counts the part of the previous window still within
+        the sliding window."""
+        from pybossa.ratelimit import RateLimit
+        with flask_app.test_request_context('/'):
+            time.time.return_value = 4000000000
+            for i in range(10):
+                RateLimit('key/', 100, 100, True)
+
+            time.time.return_value = 4000000125
+            rlimit = RateLimit('key/', 100, 100, True)
+
+            assert rlimit.current == 1 + 7, rlimit.current
+            assert rlimit.remaining == 100 - 8, rlimit.remaining
+
+    def test_local_batch_defers_redis_writes(self):
+        """Test RateLimit with RATE_LIMIT_LOCAL_BATCH only sends the hits of
+        clients far below their limit in batches."""
+        from pybossa.ratelimit import RateLimit
+        with flask_app.test_request_context('/'), \
+                patch.dict(flask_app.config, {'RATE_LIMIT_LOCAL_BATCH': 5}), \
+                patch('pybossa.ratelimit._local_hits', {}):
+            for i in range(6):
+                rlimit = RateLimit('key/', 100, 1000, True)
+                assert rlimit.current == i + 1, rlimit.current
+
+            count = int(sentinel.master.get(rlimit.key))
+            assert count == 6, count
+
+    @patch('pybossa.ratelimit.current_user')
+    def test_admin_multiplier(self, user):
+        """Test RateLimit counts admins against the limit multiplied by
+        ADMIN_RATE_MULTIPLIER, capping their count at the base limit."""
+        from pybossa.ratelimit import RateLimit
+        user.is_anonymous.return_value = False
+        user.admin = True
+        with flask_app.test_request_context('/'), \
+                patch.dict(flask_app.config, {'ADMIN_RATE_MULTIPLIER': 2}):
+            for i in range(15):
+                rlimit = RateLimit('key/', 10, 1000, True)
+
+            assert rlimit.limit == 20, rlimit.limit
+            assert rlimit.current == 10, rlimit.current
+            assert not rlimit.over_limit
+
+    def test_request_counted_as_several_hits(self):
+        """Test RateLimit counts a request as the number of hits given, as
+        the bulk endpoints do."""
+        from pybossa.ratelimit import RateLimit
+        with flask_app.test_request_context('/'):
+            rlimit = RateLimit('key/', 10, 1000, True, hits=4)
+            assert rlimit.current == 4, rlimit.current
+            rlimit = RateLimit('key/', 10, 1000, True, hits=7)
+            assert rlimit.current == 10, rlimit.current
+            assert rlimit.over_limit
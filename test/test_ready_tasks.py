@@ -0,0 +1,158 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+
+from redis import StrictRedis
+from pybossa.ready_tasks import ReadyTaskQueue
+
+
+class TestReadyTaskQueue(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.queue = ReadyTaskQueue(self.connection)
+
+    def test_not_built_by_default(self):
+        assert not self.queue.is_built(1)
+
+    def test_rebuild_orders_by_priority_and_id(self):
+        self.queue.rebuild(1, [(3, 0.5, 1), (1, 0, 2), (2, 0.5, 1),
+                               (4, 1, 1)])
+
+        assert self.queue.is_built(1)
+        assert self.queue.get_task_ids(1, 0, 10) == [4, 2, 3, 1]
+
+    def test_rebuild_skips_tasks_without_remaining_answers(self):
+        self.queue.rebuild(1, [(1, 0, 0), (2, 0, 1)])
+
+        assert self.queue.get_task_ids(1, 0, 10) == [2]
+
+    def test_get_task_ids_window(self):
+        self.queue.rebuild(1, [(i, 0, 1) for i in range(1, 6)])
+
+        assert self.queue.get_task_ids(1, 2, 2) == [3, 4]
+
+    def test_add_only_updates_built_queue(self):
+        assert not self.queue.add(1, 1, 0, 1)
+        assert not self.connection.exists(ReadyTaskQueue.QUEUE_KEY.format(1))
+
+        self.queue.rebuild(1, [])
+        assert self.queue.add(1, 1, 0, 1)
+        assert self.queue.get_task_ids(1) == [1]
+
+    def test_answer_removes_task_without_remaining_answers(self):
+        self.queue.rebuild(1, [(1, 0, 2), (2, 0, 1)])
+
+        self.queue.answer(1, 1)
+        assert self.queue.get_task_ids(1) == [1, 2]
+        self.queue.answer(1, 1)
+        assert self.queue.get_task_ids(1) == [2]
+
+    def test_answer_ignores_unknown_task(self):
+        self.queue.rebuild(1, [(1, 0, 1)])
+
+        assert not self.queue.answer(1, 2)
+
+    def test_remove(self):
+        self.queue.rebuild(1, [(1, 0, 1), (2, 0, 1)])
+
+        self.queue.remove(1, 1)
+
+        assert self.queue.get_task_ids(1) == [2]
+
+    def test_invalidate(self):
+        self.queue.rebuild(1, [(1, 0, 1)])
+
+        self.queue.invalidate(1)
+
+        assert not self.queue.is_built(1)
+        assert self.queue.get_task_ids(1) == []
+
+    def test_acquire_rebuild_only_once(self):
+        assert self.queue.acquire_rebuild(1)
+        assert not self.queue.acquire_rebuild(1)
+
+        self.queue.rebuild(1, [])
+        assert self.queue.acquire_rebuild(1)
+
+    def test_rebuild_refreshes_tasks_written_to_meanwhile(self):
+        assert self.queue.acquire_rebuild(1)
+        # Committed after the snapshot below was read
+        self.queue.add(1, 3, 0, 1)
+        self.queue.answer(1, 1)
+
+        refreshed = []
+
+        def refresh(task_ids):
+            refreshed.append(sorted(task_ids))
+            return [(1, 0, 1), (3, 0, 1)]
+
+        assert self.queue.rebuild(1, [(1, 0, 2), (2, 0, 1)], refresh)
+        assert refreshed == [[1, 3]]
+        assert self.queue.get_task_ids(1) == [1, 2, 3]
+        self.queue.answer(1, 1)
+        assert self.queue.get_task_ids(1) == [2, 3]
+
+    def test_rebuild_replaces_previous_queue(self):
+        self.queue.rebuild(1, [(1, 0, 1)])
+
+        self.queue.rebuild(1, [(2, 0, 1)])
+
+        assert self.queue.get_task_ids(1) == [2]
+
+    def test_rebuild_dropped_if_invalidated_meanwhile(self):
+        assert self.queue.acquire_rebuild(1)
+        self.queue.invalidate(1)
+
+        assert not self.queue.rebuild(1, [(1, 0, 1)], lambda ids: [])
+
+        assert not self.queue.is_built(1)
+        assert self.queue.acquire_rebuild(1)
+
+    def test_rebuild_with_acquired_token(self):
+        token = self.queue.acquire_rebuild(1)
+
+        assert self.queue.rebuild(1, [(1, 0, 1)], token=token)
+        assert self.queue.get_task_ids(1) == [1]
+
+    def test_rebuild_dropped_if_lock_lost(self):
+        token = self.queue.acquire_rebuild(1)
+        self.connection.delete(ReadyTaskQueue.REBUILD_LOCK_KEY.format(1))
+        other = self.queue.acquire_rebuild(1)
+
+        assert not self.queue.rebuild(1, [(1, 0, 1)], token=token)
+
+        assert not self.queue.is_built(1)
+        assert self.connection.get(
+            ReadyTaskQueue.REBUILD_LOCK_KEY.format(1)) == other
+
+    def test_rebuild_keeps_lock_while_writing_batches(self):
+        self.queue.BATCH_SIZE = 2
+        token = self.queue.acquire_rebuild(1)
+        lock_key = ReadyTaskQueue.REBUILD_LOCK_KEY.format(1)
+        ttls = []
+
+        def tasks():
+            for task_id in range(1, 6):
+                ttls.append(self.connection.ttl(lock_key))
+                self.connection.expire(lock_key, 1)
+                yield task_id, 0, 1
+
+        assert self.queue.rebuild(1, tasks(), token=token)
+        assert self.queue.get_task_ids(1) == [1, 2, 3, 4, 5]
+        assert [ttl > 1 for ttl in ttls] == [True, False, True, False, True]
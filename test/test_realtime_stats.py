@@ -0,0 +1,73 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime, timedelta
+from redis import StrictRedis
+from pybossa.realtime_stats import RealtimeStats
+
+
+class TestRealtimeStats(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.stats = RealtimeStats(self.connection)
+
+    def ago(self, **kwargs):
+        return (datetime.utcnow() - timedelta(**kwargs)).isoformat()
+
+    def test_top_projects_and_users(self):
+        self.stats.record([(1, 10, None, self.ago(hours=3)),
+                           (2, 10, None, self.ago(minutes=1)),
+                           (2, 11, None, None),
+                           (2, None, '127.0.0.1', None)])
+
+        assert self.stats.top_projects() == [(2, 3), (1, 1)]
+        assert self.stats.top_users(1) == [(10, 2)]
+
+    def test_old_answers_are_not_counted(self):
+        self.stats.record([(1, 10, None, self.ago(days=2))])
+
+        assert self.stats.top_projects() == []
+        assert self.stats.top_users() == []
+        assert self.stats.n_active_users() == 0
+
+    def test_answers_of_current_minute_are_read_live(self):
+        self.stats.record([(1, 10, None, self.ago(hours=1))])
+        assert self.stats.top_projects() == [(1, 1)]
+
+        self.stats.record([(1, 11, None, None)])
+        assert self.stats.top_projects() == [(1, 2)]
+
+    def test_n_active_users(self):
+        self.stats.record([(1, 10, None, None), (2, 10, None, None),
+                           (1, None, '127.0.0.1', self.ago(hours=2)),
+                           (1, None, '127.0.0.2', None)])
+
+        assert self.stats.n_active_users() == 3
+
+    def test_n_task_runs_is_only_incremented_once_seeded(self):
+        self.stats.record([(1, 10, None, None)])
+        assert self.stats.n_task_runs() is None
+
+        self.stats.seed_task_runs(5)
+        self.stats.seed_task_runs(1)
+        self.stats.record([(1, 10, None, None),
+                           (1, 10, None, self.ago(days=2))])
+
+        assert self.stats.n_task_runs() == 7
@@ -0,0 +1,92 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+
+from time import time
+from redis import StrictRedis
+from pybossa.redis_lock import LockManager
+
+
+class TestLockManager(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.lock_manager = LockManager(self.connection, 60)
+
+    def test_acquire_lock_grants_lock_under_limit(self):
+        assert self.lock_manager.acquire_lock('task:1', 'user1', 1)
+
+        assert self.lock_manager.has_lock('task:1', 'user1')
+
+    def test_acquire_lock_refuses_lock_over_limit(self):
+        self.lock_manager.acquire_lock('task:1', 'user1', 1)
+
+        assert not self.lock_manager.acquire_lock('task:1', 'user2', 1)
+        assert not self.lock_manager.has_lock('task:1', 'user2')
+
+    def test_acquire_lock_is_granted_again_to_holder(self):
+        self.lock_manager.acquire_lock('task:1', 'user1', 1)
+
+        assert self.lock_manager.acquire_lock('task:1', 'user1', 1)
+
+    def test_acquire_lock_releases_expired_locks(self):
+        self.connection.hset('task:1', 'user1', time() - 1)
+
+        assert self.lock_manager.acquire_lock('task:1', 'user2', 1)
+        assert not self.connection.hexists('task:1', 'user1')
+
+    def test_acquire_lock_sets_expiration(self):
+        self.lock_manager.acquire_lock('task:1', 'user1', 1)
+
+        assert 0 < self.connection.ttl('task:1') <= 60
+
+    def test_acquire_any_lock_returns_first_available(self):
+        self.lock_manager.acquire_lock('task:1', 'user1', 1)
+
+        key = self.lock_manager.acquire_any_lock(
+            ['task:1', 'task:2', 'task:3'], 'user2', [1, 1, 1])
+
+        assert key == 'task:2', key
+        assert not self.connection.exists('task:3')
+
+    def test_acquire_any_lock_returns_none_if_all_taken(self):
+        self.lock_manager.acquire_lock('task:1', 'user1', 1)
+
+        key = self.lock_manager.acquire_any_lock(
+            ['task:1', 'task:2'], 'user2', [1, 0])
+
+        assert key is None, key
+
+    def test_acquire_any_lock_empty_candidates(self):
+        assert self.lock_manager.acquire_any_lock([], 'user1', []) is None
+
+    def test_acquire_locks_returns_up_to_count(self):
+        self.lock_manager.acquire_lock('task:2', 'user1', 1)
+
+        keys = self.lock_manager.acquire_locks(
+            ['task:1', 'task:2', 'task:3', 'task:4'], 'user2', [1, 1, 1, 1], 2)
+
+        assert keys == ['task:1', 'task:3'], keys
+        assert not self.connection.exists('task:4')
+
+    def test_acquire_locks_returns_available(self):
+        keys = self.lock_manager.acquire_locks(
+            ['task:1', 'task:2'], 'user1', [1, 0], 5)
+
+        assert keys == ['task:1'], keys
+        assert self.lock_manager.acquire_locks([], 'user1', [], 5) == []
@@ -17,12 +17,14 @@
 # along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
 # Cache global variables for timeouts
 
+import json
 from default import Test, db, with_context
 from nose.tools import assert_raises
 from factories import TaskFactory, TaskRunFactory, ProjectFactory
 from pybossa.repositories import TaskRepository, ProjectRepository
 from pybossa.exc import WrongObjectError, DBIntegrityError
 from pybossa.model.task import Task
+from pybossa.model.counter import Counter
 
 project_repo = ProjectRepository(db)
 
@@ -67,6 +69,35 @@ class TestTaskRepositoryForTaskQueries(Test):
                                               project_id=project.id)[0][0]
         assert task == task2, (task.fav_user_ids, task2.fav_user_ids)
 
+    @with_context
+    def test_orderby_timestamp_follows_time_order(self):
+        """Test ordering and paging by a timestamp follows the time order
+        for the ISO 8601 strings written by make_timestamp, also when
+        isoformat drops zero microseconds."""
+        project = ProjectFactory.create()
+        created = ['2017-09-11T15:42:08.000001', '2017-09-11T15:42:08',
+                   '2017-09-11T15:42:09.5', '2017-09-11T09:00:00.999999']
+        tasks = [TaskFactory.create(project=project, created=value)
+                 for value in created]
+        expected = [tasks[3], tasks[1], tasks[0], tasks[2]]
+
+        ordered = self.task_repo.filter_tasks_by(orderby='created',
+                                                 project_id=project.id)
+        assert ordered == expected, [t.created for t in ordered]
+
+        first = self.task_repo.filter_tasks_by(orderby='created', limit=2,
+                                               project_id=project.id)
+        cursor = (first[-1].created, first[-1].id)
+        rest = self.task_repo.filter_tasks_by(orderby='created', limit=2,
+                                              cursor=cursor,
+                                              project_id=project.id)
+        assert first + rest == expected, [t.created for t in first + rest]
+
+        descending = self.task_repo.filter_tasks_by(orderby='created',
+                                                    desc=True,
+                                                    project_id=project.id)
+        assert descending == expected[::-1], [t.created for t in descending]
+
     @with_context
     def test_handle_info_json_plain_text(self):
         """Test handle info in JSON as plain text works."""
@@ -592,6 +623,49 @@ class TestTaskRepositorySaveDeleteUpdate(Test):
         assert_raises(WrongObjectError, self.task_repo.save, bad_object)
 
 
+    @with_context
+    def test_save_tasks_saves_tasks_with_counters(self):
+        """Test save_tasks persists a batch of Task instances and their
+        counters"""
+
+        project = ProjectFactory.create()
+        tasks = [Task(project_id=project.id, info={'n': i}) for i in range(3)]
+
+        task_ids = self.task_repo.save_tasks(project.id, tasks)
+
+        assert len(task_ids) == 3, task_ids
+        saved = self.task_repo.filter_tasks_by(project_id=project.id)
+        assert sorted(t.id for t in saved) == sorted(task_ids)
+        assert all(t.state == 'ongoing' and t.n_answers == 1 for t in saved)
+        counters = db.session.query(Counter).filter(
+            Counter.task_id.in_(task_ids)).all()
+        assert len(counters) == 3, counters
+
+
+    @with_context
+    def test_save_tasks_only_saves_tasks(self):
+        """Test save_tasks raises a WrongObjectError when an object which is
+        not a Task instance is saved"""
+
+        assert_raises(WrongObjectError, self.task_repo.save_tasks, 1, [dict()])
+
+
+    @with_context
+    def test_find_duplicates(self):
+        """Test find_duplicates returns the infos of existing ongoing tasks"""
+
+        project = ProjectFactory.create()
+        TaskFactory.create(project=project, info={'question': 'one'})
+        TaskFactory.create(project=project, info={'question': 'two'},
+                           state='completed')
+
+        duplicates = self.task_repo.find_duplicates(
+            project.id, [{'question': 'one'}, {'question': 'two'},
+                         {'question': 'three'}])
+
+        assert duplicates == set([json.dumps({'question': 'one'})]), duplicates
+
+
     @with_context
     def test_update_task(self):
         """Test update persists the changes made to Task instances"""
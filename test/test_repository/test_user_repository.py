@@ -308,3 +308,27 @@ class TestUserRepository(Test):
         bad_object = dict()
 
         assert_raises(WrongObjectError, self.user_repo.update, bad_object)
+
+
+    @with_context
+    def test_delete(self):
+        """Test delete removes the user and the cached owner of its API
+        key"""
+        from pybossa.cache.users import get_api_key_owner
+        user = UserFactory.create()
+        assert get_api_key_owner(user.api_key) is not None
+
+        self.user_repo.delete(user)
+
+        assert self.user_repo.get(user.id) is None
+        assert get_api_key_owner(user.api_key) is None
+
+
+    @with_context
+    def test_delete_only_deletes_users(self):
+        """Test delete raises a WrongObjectError when an object which is not
+        a User instance is deleted"""
+
+        bad_object = dict()
+
+        assert_raises(WrongObjectError, self.user_repo.delete, bad_object)
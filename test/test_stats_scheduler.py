@@ -0,0 +1,66 @@
+# -*- coding: utf8 -*-
+# This file is part of PYBOSSA.
+#
+# Copyright (C) 2017 Scifabric LTD.
+#
+# PYBOSSA is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# PYBOSSA is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with PYBOSSA.  If not, see <http://www.gnu.org/licenses/>.
+
+from redis import StrictRedis
+from pybossa.stats_scheduler import DirtyProjects
+
+
+class TestDirtyProjects(object):
+
+    def setUp(self):
+        self.connection = StrictRedis()
+        self.connection.flushall()
+        self.dirty = DirtyProjects(self.connection)
+
+    def test_dirty_projects_ordered_by_activity(self):
+        self.dirty.mark(1)
+        self.dirty.mark(2, 3)
+        self.dirty.mark(1)
+
+        dirty = self.dirty.get_dirty()
+
+        assert [(p, n) for p, n, _ in dirty] == [(2, 3), (1, 2)], dirty
+        assert all(since is not None for _, _, since in dirty)
+        assert len(self.dirty.get_dirty(1)) == 1
+
+    def test_claim_deduplicates_jobs(self):
+        self.dirty.mark(1)
+
+        assert self.dirty.claim(1)
+        assert self.dirty.get_dirty() == []
+
+        self.dirty.mark(1)
+        assert not self.dirty.claim(1)
+        assert [p for p, _, _ in self.dirty.get_dirty()] == [1]
+
+        self.dirty.release(1)
+        assert self.dirty.claim(1)
+
+    def test_remove(self):
+        self.dirty.mark(1)
+        self.dirty.remove(1)
+
+        assert self.dirty.get_dirty() == []
+
+    def test_mark_many(self):
+        self.dirty.mark(1)
+        self.dirty.mark_many({1: 2, 2: 1})
+
+        dirty = self.dirty.get_dirty()
+
+        assert [(p, n) for p, n, _ in dirty] == [(1, 3), (2, 1)], dirty
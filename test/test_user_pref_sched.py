@@ -188,6 +188,24 @@ class TestSched(sched.Helper):
         tasks = get_user_pref_task(1, 500)
         assert not tasks
 
+    @with_context
+    def test_limit_locks_several_tasks(self):
+        """
+        Up to limit tasks are locked and returned in scheduling order
+        """
+        owner = UserFactory.create(id=500)
+        project = ProjectFactory.create(owner=owner)
+        tasks = TaskFactory.create_batch(3, project=project, n_answers=1)
+        tasks[2].priority_0 = 1
+        task_repo.save(tasks[2])
+
+        first = get_user_pref_task(project.id, 500, limit=2)
+        assert [t.id for t in first] == [tasks[2].id, tasks[0].id], first
+
+        UserFactory.create(id=501)
+        second = get_user_pref_task(project.id, 501, limit=2)
+        assert [t.id for t in second] == [tasks[1].id], second
+
 
 class TestNTaskAvailable(sched.Helper):
 
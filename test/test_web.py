@@ -255,7 +255,7 @@ class TestWeb(web.Helper):
         assert announcement0['id'] == 1
 
     @with_context
-    @patch('pybossa.cache.project_stats.pygeoip', autospec=True)
+    @patch('pybossa.geolocation.pygeoip', autospec=True)
     def test_project_stats(self, mock1):
         """Test WEB project stats page works"""
         res = self.register()
@@ -301,7 +301,7 @@ class TestWeb(web.Helper):
             assert "GeoLite" in res.data, res.data
 
     @with_context
-    @patch('pybossa.cache.project_stats.pygeoip', autospec=True)
+    @patch('pybossa.geolocation.pygeoip', autospec=True)
     def test_project_stats_json(self, mock1):
         """Test WEB project stats page works JSON"""
         res = self.register()